@@ -7,131 +7,31 @@ AI聊天API模块
 import json
 import logging
 import base64
+import uuid
 from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, validator
 
 from .config import ai_settings
-from .core.graph_builder import build_graph
+from .core.conversation_summary import conversation_summarizer
+from .core.fast_serializer import serialize_langchain_object
+from .core.graph_registry import graph_registry
+from .core.interrupt_payload import build_interrupt_event
+from .core.message_delta import MessageDeltaTracker, FullStateRebuilder
+from .core.stream_bridge import graph_stream_bridge
+from .core.tool_executor import tool_executor
 from .core.tool_load import import_tools_from_directory
 from .core.system_prompt_builder import system_prompt_builder
+from services.json_codec import dumps_bytes
 from services.websocket_manager import websocket_manager
+from file.managers.file_tree_events import file_tree_events
 
 # 导入LangChain相关类型用于类型检查
-from langgraph.types import StateSnapshot, Interrupt
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, ToolMessage
-LANGCHAIN_IMPORTS_AVAILABLE = True
+from langchain_core.messages import AIMessageChunk
 
 logger = logging.getLogger(__name__)
 
-# 自定义JSON序列化器，用于处理LangChain消息对象
-def serialize_langchain_object(obj):
-    """序列化LangChain对象为JSON可序列化的格式"""
-    try:
-        result = {}
-        
-        # 处理Stream对象 - 优先处理，避免后续尝试调用model_dump()
-        if hasattr(obj, '__class__') and obj.__class__.__name__ == 'Stream':
-            return {
-                'type': 'stream',
-                'content': str(obj),
-                'class_name': obj.__class__.__name__
-            }
-        
-        # 处理StateSnapshot对象 - 这是主要的返回对象
-        if LANGCHAIN_IMPORTS_AVAILABLE and isinstance(obj, StateSnapshot):
-            result.update({
-                'type': 'state_snapshot',
-                'values': serialize_langchain_object(getattr(obj, 'values', {})),
-                'next': getattr(obj, 'next', None),
-                'config': getattr(obj, 'config', {}),
-                'metadata': getattr(obj, 'metadata', {}),
-                'created_at': getattr(obj, 'created_at', None),
-                'parent_config': getattr(obj, 'parent_config', None),
-                'tasks': serialize_langchain_object(getattr(obj, 'tasks', [])),
-                'interrupts': serialize_langchain_object(getattr(obj, 'interrupts', [])),
-            })
-        
-        # 处理各种消息类型
-        if LANGCHAIN_IMPORTS_AVAILABLE and isinstance(obj, (SystemMessage, HumanMessage, AIMessage, ToolMessage)):
-            message_data = {
-                'type': obj.__class__.__name__.lower(),
-                'content': getattr(obj, 'content', ''),
-                'additional_kwargs': serialize_langchain_object(getattr(obj, 'additional_kwargs', {})),
-                'response_metadata': serialize_langchain_object(getattr(obj, 'response_metadata', {})),
-                'id': getattr(obj, 'id', '')
-            }
-            
-            # 处理AIMessage特有的字段
-            if isinstance(obj, AIMessage):
-                message_data.update({
-                    'tool_calls': serialize_langchain_object(getattr(obj, 'tool_calls', [])),
-                    'usage_metadata': serialize_langchain_object(getattr(obj, 'usage_metadata', {})),
-                    'refusal': getattr(obj, 'refusal', None)
-                })
-            
-            # 处理ToolMessage特有的字段
-            if isinstance(obj, ToolMessage):
-                message_data.update({
-                    'tool_call_id': getattr(obj, 'tool_call_id', '')
-                })
-            
-            result.update(message_data)
-        
-        # 处理Interrupt对象
-        if LANGCHAIN_IMPORTS_AVAILABLE and isinstance(obj, Interrupt):
-            result.update({
-                'type': 'interrupt',
-                'value': getattr(obj, 'value', ''),
-                'id': getattr(obj, 'id', '')
-            })
-        
-        # 处理PregelTask对象（使用字符串检查作为备用）
-        if hasattr(obj, '__class__') and obj.__class__.__name__ == 'PregelTask':
-            result.update({
-                'type': 'pregel_task',
-                'id': getattr(obj, 'id', ''),
-                'name': getattr(obj, 'name', ''),
-                'path': serialize_langchain_object(getattr(obj, 'path', ())),
-                'error': getattr(obj, 'error', None),
-                'interrupts': serialize_langchain_object(getattr(obj, 'interrupts', ())),
-                'state': getattr(obj, 'state', None),
-                'result': getattr(obj, 'result', None)
-            })
-        
-        # 如果已经处理了特定类型，直接返回结果
-        if result:
-            return result
-        
-        # 处理字典、列表、元组等基础数据结构
-        if isinstance(obj, dict):
-            return {k: serialize_langchain_object(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [serialize_langchain_object(item) for item in obj]
-        elif isinstance(obj, tuple):
-            return [serialize_langchain_object(item) for item in obj]
-        elif isinstance(obj, (str, int, float, bool, type(None))):
-            # 基础类型直接返回
-            return obj
-        else:
-            # 对于其他无法序列化的对象，尝试获取其属性
-            try:
-                # 检查是否有model_dump方法（Pydantic模型）
-                if hasattr(obj, 'model_dump') and callable(getattr(obj, 'model_dump')):
-                    return serialize_langchain_object(obj.model_dump())
-                # 尝试获取对象的可序列化属性
-                elif hasattr(obj, '__dict__'):
-                    return serialize_langchain_object(obj.__dict__)
-                else:
-                    # 最后尝试字符串表示
-                    return str(obj)
-            except Exception as inner_e:
-                logger.warning(f"Fallback serialization failed for {type(obj)}: {inner_e}")
-                return repr(obj)
-    except Exception as e:
-        logger.error(f"Serialization error for object {type(obj)}: {e}")
-        return {"type": "serialization_error", "error": str(e)}
 router = APIRouter(prefix="/api/chat", tags=["AI Chat"])
 
 # 全局工具实例
@@ -155,20 +55,16 @@ def initialize_tools(mode: str = None):
         raise
 
 def create_graph(mode: str = None):
-    """创建新的图实例
+    """获取图实例，配置未变化时复用已编译的图
     
     Args:
         mode: 模式名称，如果提供则只加载该模式启用的工具
     """
     try:
-        # 根据模式加载工具
-        tools = import_tools_from_directory('tool', mode)
-        
-        # 构建图实例，使用统一的数据库连接管理
-        from langgraph.checkpoint.sqlite import SqliteSaver
-        from .history_api import get_db_connection
+        # 使用统一的检查点存储，保证缓存的图实例可以复用
+        from .history_api import get_memory_storage
         
-        memory = SqliteSaver(get_db_connection())
+        memory = get_memory_storage(mode)
         
         # 使用 SystemPromptBuilder 构建完整的系统提示词
         import asyncio
@@ -185,20 +81,185 @@ def create_graph(mode: str = None):
             # 没有运行中的循环，可以安全创建新循环
             current_prompt = asyncio.run(system_prompt_builder.build_system_prompt(mode=mode, include_persistent_memory=True))
         
-        graph = build_graph(tools, memory, system_prompt=current_prompt, mode=mode)
-        
-        logger.info(f"Graph created successfully for mode '{mode}': {len(tools)} tools bound")
+        # 模式、模型、工具集和提示词都未变化时直接复用缓存的图
+        graph = graph_registry.get_or_build(
+            mode, current_prompt, memory,
+            lambda m: import_tools_from_directory('tool', m)
+        )
         return graph
     except Exception as e:
         logger.error(f"Failed to create graph: {e}")
         raise
 
+# 流式协议版本
+# legacy: 每个更新都发送节点返回的完整状态（默认，兼容现有前端）
+# delta: 只发送相对上一事件新增/删除的消息，带消息ID和序号
+STREAM_PROTOCOL_LEGACY = "legacy"
+STREAM_PROTOCOL_DELTA = "delta"
+STREAM_PROTOCOLS = (STREAM_PROTOCOL_LEGACY, STREAM_PROTOCOL_DELTA)
+
+# 逐token推送模型输出的节点（总结节点的输出不推送）
+TOKEN_STREAM_NODES = ("call_llm",)
+
+# SSE 数据编码
+# base64: JSON 再做 Base64 编码（默认，兼容现有前端）
+# json: 直接发送 UTF-8 JSON（orjson 编码），省去 Base64 的编码开销和约 1/3 的体积
+SSE_ENCODING_BASE64 = "base64"
+SSE_ENCODING_JSON = "json"
+SSE_ENCODINGS = (SSE_ENCODING_BASE64, SSE_ENCODING_JSON)
+
+def encode_sse_event(data: Any, encoding: str = SSE_ENCODING_BASE64) -> str:
+    """将事件数据编码为SSE数据行，默认使用Base64编码避免JSON解析问题"""
+    if encoding == SSE_ENCODING_JSON:
+        # JSON 字符串中的换行都会被转义，可以直接放在一个 data 行中
+        return f"data: {dumps_bytes(data).decode('utf-8')}\n\n"
+    json_str = json.dumps(data, ensure_ascii=False)
+    encoded_data = base64.b64encode(json_str.encode('utf-8')).decode('utf-8')
+    return f"data: {encoded_data}\n\n"
+
+def build_token_event(message_chunk: Any, metadata: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """将 stream_mode="messages" 的一个增量转换为 token 事件，没有可推送内容时返回 None
+
+    Args:
+        message_chunk: 模型流式输出的消息块
+        metadata: LangGraph 附带的元数据（包含 langgraph_node 等）
+    """
+    node = metadata.get('langgraph_node')
+    if node not in TOKEN_STREAM_NODES or not isinstance(message_chunk, AIMessageChunk):
+        return None
+
+    content = message_chunk.content if isinstance(message_chunk.content, str) else ''
+    tool_call_chunks = [
+        {
+            'index': tc.get('index'),
+            'id': tc.get('id'),
+            'name': tc.get('name'),
+            'args': tc.get('args'),
+        }
+        for tc in (message_chunk.tool_call_chunks or [])
+    ]
+    if not content and not tool_call_chunks:
+        return None
+
+    event = {'type': 'token', 'node': node, 'message_id': message_chunk.id, 'content': content}
+    if tool_call_chunks:
+        event['tool_call_chunks'] = tool_call_chunks
+    return event
+
+async def stream_graph_events(graph, graph_input, config: Dict[str, Any],
+                              protocol: str = STREAM_PROTOCOL_LEGACY,
+                              resync: bool = False,
+                              initial_messages: Optional[List[Any]] = None,
+                              input_messages: Optional[List[Any]] = None,
+                              stream_tokens: bool = False,
+                              mode: Optional[str] = None,
+                              encoding: str = SSE_ENCODING_BASE64):
+    """运行图并产出SSE事件，最后发送中断信息（如有）和完成标记
+
+    Args:
+        graph: 已编译的图实例
+        graph_input: 图输入（状态或 Command）
+        config: 运行配置
+        protocol: 流式协议版本
+        resync: delta 协议下是否先发送完整快照
+        initial_messages: 请求开始前的消息列表，作为增量计算和完整列表重建的基准
+        input_messages: 本次请求追加的消息（如用户消息），图的 updates 中不会包含它们
+        stream_tokens: 是否在节点更新之外逐token推送模型输出（内容和工具调用参数增量）
+        mode: 对话模式，本轮结束后按该模式的上下文上限检查是否需要自动总结
+        encoding: SSE 数据编码，base64 或 json
+    """
+    tracker = None
+    rebuilder = None
+    if protocol == STREAM_PROTOCOL_DELTA:
+        tracker = MessageDeltaTracker(serialize_langchain_object, initial_messages)
+        if resync:
+            yield encode_sse_event(tracker.snapshot(initial_messages or []), encoding)
+        if input_messages:
+            yield encode_sse_event(tracker.apply('__input__', input_messages), encoding)
+    else:
+        # 节点只返回增量，旧协议按归约规则重建完整消息列表
+        rebuilder = FullStateRebuilder((initial_messages or []) + (input_messages or []))
+
+    # token 模式同时订阅 messages 流：模型调用检测到流式回调后会以流式方式请求网关
+    stream_mode = ["updates", "messages"] if stream_tokens else "updates"
+
+    # 流式处理：图在工作线程中执行，不阻塞事件循环
+    interrupts = []
+    async for item in graph_stream_bridge.stream(graph, graph_input, config, stream_mode=stream_mode):
+        if stream_tokens:
+            stream_kind, chunk = item
+            if stream_kind == "messages":
+                token_event = build_token_event(*chunk)
+                if token_event is not None:
+                    yield encode_sse_event(token_event, encoding)
+                continue
+        else:
+            chunk = item
+
+        if isinstance(chunk, dict) and chunk.get('__interrupt__'):
+            interrupts.extend(chunk['__interrupt__'])
+
+        if tracker is None:
+            # 序列化chunk对象，处理LangChain消息
+            yield encode_sse_event(serialize_langchain_object(rebuilder.rebuild_chunk(chunk)), encoding)
+        else:
+            for event in tracker.encode_chunk(chunk):
+                yield encode_sse_event(event, encoding)
+
+    # 中断通过 updates 流中的 __interrupt__ 获得，不需要再读取完整状态
+    if interrupts:
+        thread_id = str(config["configurable"]["thread_id"])
+        for interrupt in interrupts:
+            logger.info(f"工具中断: {interrupt.value}")
+
+        pending = tool_executor.pending(thread_id)
+        if pending is None:
+            # 不是并行工具执行器发出的中断（如服务重启前遗留的会话），从状态中取最后一条AI消息的工具调用
+            final_state = await graph_stream_bridge.run(graph.get_state, config)
+            last = final_state.values.get("messages", [])[-1:]
+            pending = {
+                "node": (final_state.next or (None,))[0],
+                "tool_calls": list(getattr(last[0], "tool_calls", None) or []) if last else [],
+            }
+
+        # 只发送审批需要的信息，完整状态通过 GET /api/chat/state/{thread_id} 获取
+        interrupt_data = await graph_stream_bridge.run(
+            build_interrupt_event, interrupts, pending["tool_calls"], thread_id
+        )
+        if tracker is not None:
+            interrupt_data['seq'] = tracker.next_seq()
+            interrupt_data['next'] = [pending["node"]] if pending["node"] else []
+        yield encode_sse_event(interrupt_data, encoding)
+    else:
+        # 本轮完整结束，历史过长时在后台折叠旧消息，下一轮直接使用总结
+        conversation_summarizer.schedule(graph, config, mode)
+
+    # 发送完成标记，delta 协议附带序号和消息数量，客户端可据此校验是否需要重新同步
+    done_data = {'type': 'done'}
+    if tracker is not None:
+        done_data.update({'seq': tracker.next_seq(), 'message_count': tracker.message_count})
+    yield encode_sse_event(done_data, encoding)
+
+def validate_stream_protocol(v):
+    if v not in STREAM_PROTOCOLS:
+        raise ValueError(f'不支持的流式协议: {v}，可选值: {", ".join(STREAM_PROTOCOLS)}')
+    return v
+
+def validate_sse_encoding(v):
+    if v not in SSE_ENCODINGS:
+        raise ValueError(f'不支持的SSE编码: {v}，可选值: {", ".join(SSE_ENCODINGS)}')
+    return v
+
 # 数据模型
 class ChatMessageRequest(BaseModel):
     """聊天消息请求模型"""
     message: str
     thread_id: str = "default"
     mode: str = "outline"
+    stream_protocol: str = STREAM_PROTOCOL_LEGACY  # legacy=完整状态, delta=增量消息
+    resync: bool = False  # delta 协议下先发送完整消息快照
+    stream_tokens: bool = False  # 额外逐token推送模型输出
+    sse_encoding: str = SSE_ENCODING_BASE64  # base64=Base64编码的JSON, json=直接发送UTF-8 JSON
     
     @validator('message')
     def validate_message(cls, v):
@@ -206,12 +267,24 @@ class ChatMessageRequest(BaseModel):
             raise ValueError('消息不能为空')
         return v
 
+    _validate_stream_protocol = validator('stream_protocol', allow_reuse=True)(validate_stream_protocol)
+    _validate_sse_encoding = validator('sse_encoding', allow_reuse=True)(validate_sse_encoding)
+
 class InterruptResponseRequest(BaseModel):
     """中断响应请求模型"""
     interrupt_id: str
     choice: str  # '1'=恢复, '2'=取消
     additional_data: str = ""
     thread_id: str = "default"
+    stream_protocol: str = STREAM_PROTOCOL_LEGACY  # legacy=完整状态, delta=增量消息
+    resync: bool = False  # delta 协议下先发送完整消息快照
+    stream_tokens: bool = False  # 额外逐token推送模型输出
+    sse_encoding: str = SSE_ENCODING_BASE64  # base64=Base64编码的JSON, json=直接发送UTF-8 JSON
+    # 同一轮多个工具调用合并确认时，按 tool_call_id 分别指定选择，如 {"call_1": {"choice": "2"}}；未指定的使用 choice
+    tool_decisions: Optional[Dict[str, Dict[str, str]]] = None
+
+    _validate_stream_protocol = validator('stream_protocol', allow_reuse=True)(validate_stream_protocol)
+    _validate_sse_encoding = validator('sse_encoding', allow_reuse=True)(validate_sse_encoding)
 
 # API端点
 @router.post("/message", summary="发送聊天消息")
@@ -222,14 +295,17 @@ async def send_chat_message(request: ChatMessageRequest):
     - **message**: 用户消息内容
     - **thread_id**: 会话ID，用于隔离不同用户的对话
     - **mode**: 对话模式 (outline/writing/adjustment)
+    - **stream_protocol**: 流式协议，legacy 发送完整状态，delta 只发送新增/删除的消息
+    - **resync**: delta 协议下先发送一次完整消息快照
+    - **stream_tokens**: 逐token推送模型输出（token 事件），节点更新、中断和完成事件照常发送
     """
     try:
         # 记录模式变化（仅用于日志记录）
         if request.mode != ai_settings.CURRENT_MODE:
             logger.info(f"Mode changed to: {request.mode}")
         
-        # 每次请求都创建新的graph实例，确保使用最新的模型配置和工具
-        graph = create_graph(request.mode)
+        # 获取图实例（模型配置、工具或提示词变化时会自动重建），构建过程在工作线程中执行
+        graph = await graph_stream_bridge.run(create_graph, request.mode)
         
         # 流式响应
         async def generate():
@@ -237,58 +313,30 @@ async def send_chat_message(request: ChatMessageRequest):
                 config = {"configurable": {"thread_id": request.thread_id}}
                 
                 # 获取当前状态
-                current_state = graph.get_state(config)
+                current_state = await graph_stream_bridge.run(graph.get_state, config)
                 current_messages = current_state.values.get("messages", [])
                 
-                # 添加用户消息
+                # 只提交新的用户消息，归约器会把它追加到已有历史之后
                 from langchain_core.messages import HumanMessage
-                updated_messages = current_messages + [HumanMessage(content=request.message)]
+                new_messages = [HumanMessage(content=request.message, id=str(uuid.uuid4()))]
                 
                 # 创建输入状态
                 from ai_agent.config import State
-                input_state = State(messages=updated_messages)
-                
-                # 流式处理
-                for chunk in graph.stream(input_state, config, stream_mode="updates"):
-                    # 序列化chunk对象，处理LangChain消息
-                    serialized_chunk = serialize_langchain_object(chunk)
-                    # 使用Base64编码避免JSON解析问题
-                    json_str = json.dumps(serialized_chunk, ensure_ascii=False)
-                    encoded_data = base64.b64encode(json_str.encode('utf-8')).decode('utf-8')
-                    yield f"data: {encoded_data}\n\n"
-                
-                # 获取最终状态检查是否有工具中断
-                final_state = graph.get_state(config)
+                input_state = State(messages=new_messages)
                 
-                # 检查是否有工具中断，如果有则发送中断信息给前端
-                if hasattr(final_state, 'interrupts') and final_state.interrupts:
-                    logger.info(f"工具中断: {final_state}")
-                    for interrupt in final_state.interrupts:
-                        logger.info(f"中断信息: {interrupt.value}")
-                    
-                    # 发送中断信息给前端
-                    interrupt_data = {
-                        'type': 'interrupt',
-                        'interrupts': serialize_langchain_object(final_state.interrupts),
-                        'state': serialize_langchain_object(final_state)
-                    }
-                    # 使用Base64编码避免JSON解析问题
-                    json_str = json.dumps(interrupt_data, ensure_ascii=False)
-                    encoded_data = base64.b64encode(json_str.encode('utf-8')).decode('utf-8')
-                    yield f"data: {encoded_data}\n\n"
-                
-                # 发送完成标记
-                done_data = {'type': 'done'}
-                json_str = json.dumps(done_data, ensure_ascii=False)
-                encoded_data = base64.b64encode(json_str.encode('utf-8')).decode('utf-8')
-                yield f"data: {encoded_data}\n\n"
+                async for event in stream_graph_events(graph, input_state, config,
+                                                       protocol=request.stream_protocol,
+                                                       resync=request.resync,
+                                                       initial_messages=current_messages,
+                                                       input_messages=new_messages,
+                                                       stream_tokens=request.stream_tokens,
+                                                       encoding=request.sse_encoding,
+                                                       mode=request.mode):
+                    yield event
                 
             except Exception as e:
                 logger.error(f"Stream generation error: {e}")
-                error_data = {'error': str(e)}
-                json_str = json.dumps(error_data, ensure_ascii=False)
-                encoded_data = base64.b64encode(json_str.encode('utf-8')).decode('utf-8')
-                yield f"data: {encoded_data}\n\n"
+                yield encode_sse_event({'error': str(e)}, request.sse_encoding)
         
         return StreamingResponse(
             generate(),
@@ -312,69 +360,55 @@ async def send_interrupt_response(request: InterruptResponseRequest):
     - **choice**: 用户选择 ('1'=恢复, '2'=取消)
     - **additional_data**: 附加信息
     - **thread_id**: 会话ID
+    - **stream_protocol**: 流式协议，legacy 发送完整状态，delta 只发送新增/删除的消息
+    - **resync**: delta 协议下先发送一次完整消息快照
+    - **stream_tokens**: 逐token推送模型输出（token 事件），节点更新、中断和完成事件照常发送
     """
     try:
         logger.info(f"Interrupt response received: interrupt_id={request.interrupt_id}, choice={request.choice}")
         
-        # 每次请求都创建新的graph实例，确保使用最新的模型配置和工具
+        # 获取图实例，模型配置、工具或提示词变化时会自动重建
         # 中断响应需要从当前状态获取模式信息
         from .config import ai_settings
         current_mode = ai_settings.CURRENT_MODE
-        graph = create_graph(current_mode)
+        graph = await graph_stream_bridge.run(create_graph, current_mode)
         
         # 构建中断响应
         from langgraph.types import Command
-        human_response = Command(
-            resume= {
-                "choice_action": request.choice,
-                "choice_data": request.additional_data
+        resume = {
+            "choice_action": request.choice,
+            "choice_data": request.additional_data
+        }
+        if request.tool_decisions:
+            resume["decisions"] = {
+                call_id: {
+                    "choice_action": decision.get("choice", request.choice),
+                    "choice_data": decision.get("additional_data", request.additional_data)
+                }
+                for call_id, decision in request.tool_decisions.items()
             }
-        )
+        human_response = Command(resume=resume)
         config = {"configurable": {"thread_id": request.thread_id}}
         
         # 流式处理中断响应
         async def generate_interrupt_response():
             try:
-                for chunk in graph.stream(human_response, config, stream_mode="updates"):
-                    # 序列化chunk对象，处理LangChain消息
-                    serialized_chunk = serialize_langchain_object(chunk)
-                    # 使用Base64编码避免JSON解析问题
-                    json_str = json.dumps(serialized_chunk, ensure_ascii=False)
-                    encoded_data = base64.b64encode(json_str.encode('utf-8')).decode('utf-8')
-                    yield f"data: {encoded_data}\n\n"
-                
-                # 获取最终状态检查是否有再次中断
-                final_state = graph.get_state(config)
-                
-                # 检查是否有再次中断，如果有则发送中断信息给前端
-                if hasattr(final_state, 'interrupts') and final_state.interrupts:
-                    logger.info(f"工具中断: {final_state}")
-                    for interrupt in final_state.interrupts:
-                        logger.info(f"中断信息: {interrupt.value}")
-                    
-                    # 发送中断信息给前端
-                    interrupt_data = {
-                        'type': 'interrupt',
-                        'interrupts': serialize_langchain_object(final_state.interrupts),
-                        'state': serialize_langchain_object(final_state)
-                    }
-                    # 使用Base64编码避免JSON解析问题
-                    json_str = json.dumps(interrupt_data, ensure_ascii=False)
-                    encoded_data = base64.b64encode(json_str.encode('utf-8')).decode('utf-8')
-                    yield f"data: {encoded_data}\n\n"
+                # 以中断时的消息列表作为增量计算和完整列表重建的基准
+                current_state = await graph_stream_bridge.run(graph.get_state, config)
+                initial_messages = current_state.values.get("messages", [])
                 
-                # 发送完成标记
-                done_data = {'type': 'done'}
-                json_str = json.dumps(done_data, ensure_ascii=False)
-                encoded_data = base64.b64encode(json_str.encode('utf-8')).decode('utf-8')
-                yield f"data: {encoded_data}\n\n"
+                async for event in stream_graph_events(graph, human_response, config,
+                                                       protocol=request.stream_protocol,
+                                                       resync=request.resync,
+                                                       initial_messages=initial_messages,
+                                                       stream_tokens=request.stream_tokens,
+                                                       encoding=request.sse_encoding,
+                                                       mode=current_mode):
+                    yield event
                 
             except Exception as e:
                 logger.error(f"Interrupt response stream error: {e}")
-                error_data = {'error': str(e)}
-                json_str = json.dumps(error_data, ensure_ascii=False)
-                encoded_data = base64.b64encode(json_str.encode('utf-8')).decode('utf-8')
-                yield f"data: {encoded_data}\n\n"
+                yield encode_sse_event({'error': str(e)}, request.sse_encoding)
         
         return StreamingResponse(
             generate_interrupt_response(),
@@ -389,6 +423,26 @@ async def send_interrupt_response(request: InterruptResponseRequest):
         logger.error(f"Interrupt response processing error: {e}")
         raise HTTPException(status_code=500, detail=f"处理中断响应时出错: {str(e)}")
 
+@router.get("/state/{thread_id}", summary="获取会话完整状态")
+async def get_thread_state(thread_id: str, mode: Optional[str] = None):
+    """
+    获取会话的完整状态快照（消息、配置、元数据、待执行任务和中断）
+
+    中断事件只携带审批所需的信息，需要完整状态时调用此接口
+    """
+    try:
+        graph = await graph_stream_bridge.run(create_graph, mode or ai_settings.CURRENT_MODE)
+        config = {"configurable": {"thread_id": thread_id}}
+        state = await graph_stream_bridge.run(graph.get_state, config)
+        return {
+            "success": True,
+            "message": "获取会话状态成功",
+            "data": serialize_langchain_object(state)
+        }
+    except Exception as e:
+        logger.error(f"获取会话状态失败: {e}")
+        raise HTTPException(status_code=500, detail=f"获取会话状态失败: {str(e)}")
+
 # WebSocket端点
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -412,6 +466,10 @@ async def websocket_endpoint(websocket: WebSocket):
                 event_types = message.get("event_types", [])
                 logger.info(f"Client unsubscribed from events: {event_types}")
                 
+            elif message.get("type") == "file_tree_sync":
+                # 客户端发现漏掉了文件树版本，补发增量或完整文件树
+                await file_tree_events.sync_client(websocket, message.get("version"))
+                
     except WebSocketDisconnect:
         websocket_manager.disconnect(websocket)
     except Exception as e:
@@ -1,10 +1,12 @@
-import json
 from pathlib import Path
-from typing import Optional, Dict, Any, TypedDict
+from typing import Optional, Dict, Any, TypedDict, Annotated
 import sys
 import os
 sys.path.append(os.path.dirname(__file__))
 from prompts import sys_prompts
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from services.config_store import config_store
+from .core.message_reducer import merge_messages
 
 class AISettings:
     """
@@ -13,7 +15,7 @@ class AISettings:
     
     def __init__(self):
         # 从ai_agent目录向上找到config目录
-        self._config_file = Path(__file__).parent.parent / "config" / "store.json"
+        self._config_file = config_store.config_file
         
         # AI模型配置,超时暂时调大一点
         self.model: str = "deepseek-chat"
@@ -36,15 +38,8 @@ class AISettings:
         self.ENABLE_KIMI: bool = True
     
     def _load_config(self) -> Dict[str, Any]:
-        """从 store.json 加载配置"""
-        if not self._config_file.exists():
-            return {}
-        
-        try:
-            with open(self._config_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, Exception):
-            return {}
+        """从 store.json 加载配置（共享快照，只读）"""
+        return config_store.snapshot()
     
     def _get_config(self, key: str, default: Any = None) -> Any:
         """获取配置值"""
@@ -136,6 +131,36 @@ class AISettings:
         """Ollama服务地址（动态加载）"""
         return self._get_config("ollamaBaseUrl", "http://127.0.0.1:11434")
     
+    @property
+    def CHECKPOINT_RETENTION(self) -> Dict[str, Any]:
+        """检查点保留策略（动态加载），未配置的字段使用默认值"""
+        value = self._get_config("checkpointRetention", {})
+        return value if isinstance(value, dict) else {}
+    
+    @property
+    def CHECKPOINT_COMPRESSION(self) -> Dict[str, Any]:
+        """检查点压缩配置（动态加载），未配置的字段使用默认值"""
+        value = self._get_config("checkpointCompression", {})
+        return value if isinstance(value, dict) else {}
+    
+    @property
+    def AUTO_SUMMARY(self) -> Dict[str, Any]:
+        """自动总结配置（动态加载），未配置的字段使用默认值"""
+        value = self._get_config("autoSummary", {})
+        return value if isinstance(value, dict) else {}
+    
+    @property
+    def TOKEN_ESTIMATOR(self) -> Dict[str, Any]:
+        """token 估算参数（动态加载），未配置的字段使用默认值"""
+        value = self._get_config("tokenEstimator", {})
+        return value if isinstance(value, dict) else {}
+    
+    @property
+    def TOOL_CONCURRENCY(self) -> Dict[str, Any]:
+        """工具并发上限（动态加载），键为工具名或 default"""
+        value = self._get_config("toolConcurrency", {})
+        return value if isinstance(value, dict) else {}
+    
     @property
     def CURRENT_MODE(self) -> str:
         """当前模式（动态加载）"""
@@ -180,10 +205,17 @@ class AISettings:
         return self.max_tokens
 
 # 定义状态类型
+def merge_names(left: Optional[list], right: Optional[list]) -> list:
+    """按名称去重追加"""
+    merged = list(left or [])
+    merged.extend(name for name in (right or []) if name not in merged)
+    return merged
+
 class State(TypedDict):
     """包含消息和总结的状态"""
-    messages: list  # 移除 add_messages 注解，完全手动管理
+    messages: Annotated[list, merge_messages]  # 按消息ID追加/替换/删除，节点只返回增量
     summary: str  # 对话总结
+    approved_tools: Annotated[list, merge_names]  # 本会话中已确认过的工具（once 审批策略）
 
 # 创建全局AI设置实例
 ai_settings = AISettings()
\ No newline at end of file
@@ -4,12 +4,13 @@ AI配置API模块
 包括API密钥管理、模型选择、提供商配置、提示词配置等
 """
 
-import json
 import logging
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
+from services.config_store import config_store
+
 logger = logging.getLogger(__name__)
 
 # 创建API路由器
@@ -51,15 +52,16 @@ class DefaultPromptsResponse(BaseModel):
     data: Optional[Dict[str, str]] = None
 
 def load_store_config():
-    """加载存储配置"""
+    """加载存储配置（副本，可修改后保存）"""
     try:
-        with open("config/store.json", "r", encoding="utf-8") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        logger.warning("配置文件不存在，创建默认配置")
-        default_config = {}
-        save_store_config(default_config)
-        return default_config
+        if not config_store.config_file.exists():
+            logger.warning("配置文件不存在，创建默认配置")
+            default_config = {}
+            save_store_config(default_config)
+            return default_config
+        return config_store.load()
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"加载配置文件失败: {e}")
         raise HTTPException(status_code=500, detail=f"加载配置文件失败: {str(e)}")
@@ -67,8 +69,15 @@ def load_store_config():
 def save_store_config(config: Dict[str, Any]):
     """保存存储配置"""
     try:
-        with open("config/store.json", "w", encoding="utf-8") as f:
-            json.dump(config, f, ensure_ascii=False, indent=2)
+        config_store.save(config)
+    except Exception as e:
+        logger.error(f"保存配置文件失败: {e}")
+        raise HTTPException(status_code=500, detail=f"保存配置文件失败: {str(e)}")
+
+def update_store_config(mutator: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+    """串行化地读取-修改-保存存储配置，并发写入不会互相覆盖"""
+    try:
+        return config_store.update(mutator)
     except Exception as e:
         logger.error(f"保存配置文件失败: {e}")
         raise HTTPException(status_code=500, detail=f"保存配置文件失败: {str(e)}")
@@ -136,10 +145,10 @@ async def set_selected_model(request: SelectedModelRequest):
     - **selectedProvider**: 选中的提供商ID
     """
     try:
-        config = load_store_config()
-        config["selectedModel"] = request.selectedModel
-        config["selectedProvider"] = request.selectedProvider
-        save_store_config(config)
+        update_store_config(lambda config: config.update(
+            selectedModel=request.selectedModel,
+            selectedProvider=request.selectedProvider
+        ))
         
         selected_model_data = {
             "selectedModel": request.selectedModel,
@@ -0,0 +1,361 @@
+"""
+检查点压缩序列化器
+检查点里反复出现整章正文（read_file 的结果、章节草稿、previousChapter 持久记忆），
+这里包装 LangGraph 的序列化器，超过阈值的数据块用 zstd（未安装时用 zlib）压缩后再写入 checkpoints.db。
+
+- 压缩方式记录在 type 列中（如 msgpack+zstd、msgpack+zstd:<字典ID>、msgpack+zlib），
+  未压缩的旧数据原样读取，graph.get_state 等接口无需改动
+- 可选的 zstd 共享字典用已有会话训练，对短消息也能明显提高压缩率::
+
+    python -m ai_agent.core.checkpoint_compression train --db checkpoints.db
+    python -m ai_agent.core.checkpoint_compression recompress --db checkpoints.db
+
+- 字典文件放在数据库所在目录：dictionaryPath 是当前用于压缩的字典，另外每个字典按ID保存一份
+  checkpoint_zstd.<字典ID>.dict。启动时注册目录中的全部字典，重新训练后用旧字典压缩的数据仍可读取
+
+- 直接读取原始 msgpack 的代码（如检查点摘要）先调用 decompress_blob 还原
+"""
+
+import argparse
+import glob
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+try:
+    import zstandard
+except ImportError:  # 未安装 zstandard 时退回 zlib
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# 默认压缩配置，可在 store.json 的 checkpointCompression 中覆盖
+DEFAULT_COMPRESSION_OPTIONS: Dict[str, Any] = {
+    "enabled": True,
+    "threshold": 4096,  # 小于该字节数的数据块不压缩
+    "level": 3,  # zstd 压缩级别（zlib 时映射为 6）
+    "dictionaryPath": "checkpoint_zstd.dict",  # 当前使用的 zstd 共享字典（相对路径相对于数据库所在目录），文件不存在时不使用
+}
+
+ZSTD = "zstd"
+ZLIB = "zlib"
+
+# 已加载的 zstd 字典，按字典ID索引，解压时根据 type 中的字典ID查找
+_dictionaries: Dict[int, Any] = {}
+_dictionaries_lock = threading.Lock()
+
+
+# 按ID保存的字典文件名
+DICTIONARY_ARCHIVE = "checkpoint_zstd.{dict_id}.dict"
+
+
+def database_path(conn: Optional[sqlite3.Connection]) -> Optional[str]:
+    """连接对应的数据库文件路径，内存数据库或没有连接时返回 None"""
+    if conn is None:
+        return None
+    row = conn.execute("PRAGMA database_list").fetchone()
+    return row[2] if row and row[2] else None
+
+
+def dictionary_dir(db_path: Optional[str] = None) -> str:
+    """字典文件所在目录：数据库所在目录，不知道数据库路径时为当前目录"""
+    return os.path.dirname(os.path.abspath(db_path)) if db_path else os.getcwd()
+
+
+def _write_file(path: str, data: bytes):
+    """临时文件 + rename 原子写入"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _register(dictionary) -> bool:
+    """注册字典，返回是否为新注册"""
+    with _dictionaries_lock:
+        if dictionary.dict_id() in _dictionaries:
+            return False
+        _dictionaries[dictionary.dict_id()] = dictionary
+        return True
+
+
+def load_dictionary(path: str) -> Optional[Any]:
+    """加载 zstd 共享字典并注册，文件不存在或未安装 zstandard 时返回 None
+
+    同目录下还没有按ID保存的副本时补存一份，之后替换 path 指向的字典也不会丢失这个字典
+    """
+    if zstandard is None or not path or not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        data = f.read()
+    dictionary = zstandard.ZstdCompressionDict(data)
+    archive = os.path.join(os.path.dirname(os.path.abspath(path)),
+                           DICTIONARY_ARCHIVE.format(dict_id=dictionary.dict_id()))
+    if not os.path.exists(archive):
+        try:
+            _write_file(archive, data)
+        except OSError as e:
+            logger.warning(f"保存检查点压缩字典副本失败 {archive}: {e}")
+    if _register(dictionary):
+        logger.info(f"已加载检查点压缩字典 {path} (ID {dictionary.dict_id()})")
+    return dictionary
+
+
+def load_dictionaries(directory: str) -> int:
+    """注册目录中按ID保存的全部字典（读取旧数据用），返回新注册的数量"""
+    if zstandard is None:
+        return 0
+    loaded = 0
+    for path in sorted(glob.glob(os.path.join(glob.escape(directory), DICTIONARY_ARCHIVE.format(dict_id="*")))):
+        try:
+            with open(path, "rb") as f:
+                dictionary = zstandard.ZstdCompressionDict(f.read())
+        except (OSError, zstandard.ZstdError) as e:
+            logger.warning(f"加载检查点压缩字典失败 {path}: {e}")
+            continue
+        if _register(dictionary):
+            loaded += 1
+            logger.info(f"已加载检查点压缩字典 {path} (ID {dictionary.dict_id()})")
+    return loaded
+
+
+def _split_type(type_: str) -> Tuple[str, Optional[str], Optional[int]]:
+    """拆分 type 列：(原始类型, 压缩算法, 字典ID)"""
+    if "+" not in type_:
+        return type_, None, None
+    base, codec = type_.rsplit("+", 1)
+    dict_id = None
+    if ":" in codec:
+        codec, raw_id = codec.split(":", 1)
+        dict_id = int(raw_id)
+    if codec not in (ZSTD, ZLIB):
+        return type_, None, None
+    return base, codec, dict_id
+
+
+class _ZstdCodecs(threading.local):
+    """zstd 压缩/解压对象不是线程安全的，每个线程各自缓存一份"""
+
+    def __init__(self):
+        self.compressors: Dict[Tuple[int, int], Any] = {}
+        self.decompressors: Dict[int, Any] = {}
+
+
+_codecs = _ZstdCodecs()
+
+
+def _zstd_compressor(level: int, dictionary) -> Any:
+    key = (level, dictionary.dict_id() if dictionary is not None else 0)
+    compressor = _codecs.compressors.get(key)
+    if compressor is None:
+        compressor = zstandard.ZstdCompressor(level=level, dict_data=dictionary)
+        _codecs.compressors[key] = compressor
+    return compressor
+
+
+def _zstd_decompressor(dict_id: int) -> Any:
+    decompressor = _codecs.decompressors.get(dict_id)
+    if decompressor is None:
+        dictionary = None
+        if dict_id:
+            with _dictionaries_lock:
+                dictionary = _dictionaries.get(dict_id)
+            if dictionary is None:
+                raise ValueError(f"缺少检查点压缩字典 (ID {dict_id})，请确认字典文件未被删除")
+        decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+        _codecs.decompressors[dict_id] = decompressor
+    return decompressor
+
+
+def decompress_blob(type_: str, blob: bytes) -> Tuple[str, bytes]:
+    """还原压缩过的数据块，返回 (原始类型, 原始字节)，未压缩的数据原样返回"""
+    base, codec, dict_id = _split_type(type_)
+    if codec is None:
+        return type_, blob
+    if codec == ZLIB:
+        return base, zlib.decompress(blob)
+    if zstandard is None:
+        raise RuntimeError("检查点使用 zstd 压缩，但未安装 zstandard，请执行 pip install zstandard")
+    return base, _zstd_decompressor(dict_id or 0).decompress(blob)
+
+
+class CompressedSerializer(SerializerProtocol):
+    """对超过阈值的检查点数据块进行压缩的序列化器包装"""
+
+    def __init__(self, serde: Optional[SerializerProtocol] = None, *, enabled: bool = True,
+                 threshold: int = 4096, level: int = 3, dictionary=None, codec: Optional[str] = None):
+        self.serde = serde or JsonPlusSerializer()
+        self.enabled = enabled
+        self.threshold = threshold
+        self.level = level
+        self.codec = codec or (ZSTD if zstandard is not None else ZLIB)
+        self.dictionary = dictionary if self.codec == ZSTD else None
+        if self.dictionary is not None:
+            with _dictionaries_lock:
+                _dictionaries.setdefault(self.dictionary.dict_id(), self.dictionary)
+
+    def compress(self, type_: str, data: bytes) -> Tuple[str, bytes]:
+        """按配置压缩数据块，压缩后没有变小时保留原始数据"""
+        if not self.enabled or len(data) < self.threshold:
+            return type_, data
+        if self.codec == ZSTD:
+            compressed = _zstd_compressor(self.level, self.dictionary).compress(data)
+            tag = f"{ZSTD}:{self.dictionary.dict_id()}" if self.dictionary is not None else ZSTD
+        else:
+            compressed = zlib.compress(data, 6)
+            tag = ZLIB
+        if len(compressed) >= len(data):
+            return type_, data
+        return f"{type_}+{tag}", compressed
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        return self.compress(*self.serde.dumps_typed(obj))
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        return self.serde.loads_typed(decompress_blob(*data))
+
+
+def create_checkpoint_serializer(options: Optional[Dict[str, Any]] = None,
+                                 db_path: Optional[str] = None) -> CompressedSerializer:
+    """根据配置创建检查点序列化器
+
+    即使关闭压缩也返回 CompressedSerializer，保证之前压缩过的检查点仍然可以读取
+
+    Args:
+        db_path: 检查点数据库路径，字典文件在其所在目录中查找
+    """
+    if options is None:
+        from ai_agent.config import ai_settings
+        options = ai_settings.CHECKPOINT_COMPRESSION
+    merged = dict(DEFAULT_COMPRESSION_OPTIONS)
+    merged.update(options or {})
+    directory = dictionary_dir(db_path)
+    load_dictionaries(directory)
+    path = merged.get("dictionaryPath")
+    return CompressedSerializer(
+        enabled=bool(merged["enabled"]),
+        threshold=int(merged["threshold"]),
+        level=int(merged["level"]),
+        dictionary=load_dictionary(os.path.join(directory, path) if path else None),
+    )
+
+
+def iter_raw_blobs(conn: sqlite3.Connection, limit: Optional[int] = None) -> Iterator[bytes]:
+    """遍历检查点和 writes 中的原始 msgpack 数据（已解压），用于训练字典"""
+    sql = """
+        SELECT type, checkpoint FROM checkpoints
+        UNION ALL
+        SELECT type, value FROM writes WHERE type IS NOT NULL
+    """
+    count = 0
+    for type_, blob in conn.execute(sql):
+        if blob is None:
+            continue
+        try:
+            base, raw = decompress_blob(type_, blob)
+        except Exception as e:
+            logger.warning(f"跳过无法解压的数据块: {e}")
+            continue
+        if base != "msgpack":
+            continue
+        yield raw
+        count += 1
+        if limit is not None and count >= limit:
+            return
+
+
+def train_dictionary(samples: List[bytes], dict_size: int = 112640) -> Any:
+    """用消息样本训练 zstd 共享字典"""
+    if zstandard is None:
+        raise RuntimeError("训练压缩字典需要安装 zstandard")
+    return zstandard.train_dictionary(dict_size, samples)
+
+
+def recompress_database(conn: sqlite3.Connection, serializer: CompressedSerializer, batch_size: int = 200) -> Dict[str, int]:
+    """用当前配置重新压缩已有检查点（未压缩或使用其他字典的数据块）
+
+    Returns:
+        统计信息：处理行数和压缩前后字节数
+    """
+    stats = {"rows": 0, "bytes_before": 0, "bytes_after": 0}
+    for table, column, key_columns in (
+        ("checkpoints", "checkpoint", ("thread_id", "checkpoint_ns", "checkpoint_id")),
+        ("writes", "value", ("thread_id", "checkpoint_ns", "checkpoint_id", "task_id", "idx")),
+    ):
+        keys = ", ".join(key_columns)
+        where = " AND ".join(f"{col} = ?" for col in key_columns)
+        # 先取主键，再逐行读取数据块，避免一次把整张表读进内存
+        row_keys = conn.execute(f"SELECT {keys} FROM {table} WHERE type IS NOT NULL").fetchall()
+        updates = []
+        for key in row_keys:
+            row = conn.execute(f"SELECT type, {column} FROM {table} WHERE {where}", key).fetchone()
+            if row is None or row[1] is None:
+                continue
+            type_, blob = row
+            new_type, new_blob = serializer.compress(*decompress_blob(type_, blob))
+            if new_type == type_:
+                continue
+            updates.append((new_type, new_blob, *key))
+            stats["rows"] += 1
+            stats["bytes_before"] += len(blob)
+            stats["bytes_after"] += len(new_blob)
+            if len(updates) >= batch_size:
+                with conn:
+                    conn.executemany(f"UPDATE {table} SET type = ?, {column} = ? WHERE {where}", updates)
+                updates = []
+        if updates:
+            with conn:
+                conn.executemany(f"UPDATE {table} SET type = ?, {column} = ? WHERE {where}", updates)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查点压缩工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train", help="用已有检查点训练 zstd 共享字典")
+    train.add_argument("--db", default="checkpoints.db")
+    train.add_argument("--out", help="字典文件路径，默认为数据库所在目录中的 dictionaryPath")
+    train.add_argument("--size", type=int, default=112640, help="字典大小（字节）")
+    train.add_argument("--samples", type=int, default=5000, help="最多使用的样本数")
+    recompress = sub.add_parser("recompress", help="按当前配置重新压缩已有检查点")
+    recompress.add_argument("--db", default="checkpoints.db")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.command == "train":
+            from ai_agent.config import ai_settings
+            # 注册已有字典，训练样本需要解压用它们压缩的数据
+            load_dictionaries(dictionary_dir(args.db))
+            out = args.out or os.path.join(
+                dictionary_dir(args.db),
+                {**DEFAULT_COMPRESSION_OPTIONS, **(ai_settings.CHECKPOINT_COMPRESSION or {})}["dictionaryPath"]
+            )
+            # 被替换的字典先按ID保存一份，用它压缩的数据仍可读取
+            load_dictionary(out)
+            samples = list(iter_raw_blobs(conn, args.samples))
+            dictionary = train_dictionary(samples, args.size)
+            data = dictionary.as_bytes()
+            archive = os.path.join(os.path.dirname(os.path.abspath(out)),
+                                   DICTIONARY_ARCHIVE.format(dict_id=dictionary.dict_id()))
+            _write_file(archive, data)
+            _write_file(out, data)
+            print(f"字典已保存到 {out}（ID {dictionary.dict_id()}，样本 {len(samples)} 个）")
+        else:
+            stats = recompress_database(conn, create_checkpoint_serializer(db_path=args.db))
+            print(f"重新压缩 {stats['rows']} 行，{stats['bytes_before'] / 1024 / 1024:.1f} MB -> "
+                  f"{stats['bytes_after'] / 1024 / 1024:.1f} MB")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
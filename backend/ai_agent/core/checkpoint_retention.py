@@ -0,0 +1,411 @@
+"""
+检查点保留与压缩
+checkpoints.db 默认保留每个超步的完整检查点，这里按保留策略清理旧检查点并回收磁盘空间：
+
+- 每个会话只保留最近 keep_last 个检查点
+- 被命名存档点（save_points 表）引用的检查点永远保留
+- 删除不再对应任何检查点的 writes 记录，以及不再被引用的消息存储记录
+- 清理后执行增量 VACUUM 和 WAL 检查点，把空闲页归还给文件系统
+
+清理会删除回档用的历史检查点，默认不自动执行：在 store.json 的 checkpointRetention 中设置 "enabled": true 后，
+后台线程按 intervalMinutes 定期执行。也可以通过管理接口或命令行手动触发::
+
+    python -m ai_agent.core.checkpoint_retention --db checkpoints.db --keep-last 200
+
+增量 VACUUM 要求数据库已启用 auto_vacuum=INCREMENTAL。旧数据库的转换需要一次完整 VACUUM（重写整个文件、
+期间独占写连接），不会在定期任务中自动执行，由管理员通过 POST /maintenance/db/incremental-vacuum 或命令行触发::
+
+    python -m ai_agent.core.checkpoint_retention --db checkpoints.db --enable-incremental-vacuum
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from .message_store import gc_message_store
+
+logger = logging.getLogger(__name__)
+
+# 默认保留策略，可在 store.json 的 checkpointRetention 中覆盖
+DEFAULT_RETENTION_POLICY: Dict[str, Any] = {
+    "enabled": False,  # 是否定期自动清理，需要用户显式开启（升级后不会删除已有的回档历史）
+    "keepLast": 200,  # 每个会话保留的最近检查点数量
+    "intervalMinutes": 60,  # 后台执行间隔
+    "vacuum": "incremental",  # incremental / full / off
+    "vacuumPages": 0,  # 每次增量回收的页数，0 表示回收全部空闲页
+}
+
+VACUUM_MODES = ("incremental", "full", "off")
+
+# PRAGMA auto_vacuum 的取值
+_AUTO_VACUUM_INCREMENTAL = 2
+
+_SAVE_POINT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS save_points (
+    thread_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    created_at TEXT,
+    PRIMARY KEY (thread_id, name)
+);
+CREATE INDEX IF NOT EXISTS idx_save_points_checkpoint ON save_points(thread_id, checkpoint_id);
+"""
+
+
+def ensure_save_points(conn: sqlite3.Connection):
+    """创建命名存档点表"""
+    conn.executescript(_SAVE_POINT_SCHEMA)
+
+
+def add_save_point(conn: sqlite3.Connection, thread_id: str, name: str, checkpoint_id: str) -> Dict[str, Any]:
+    """创建或覆盖命名存档点，被引用的检查点不会被保留策略清理
+
+    在 CheckpointDatabase.write 中调用，由写线程统一提交
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = '' AND checkpoint_id = ?",
+        (thread_id, checkpoint_id),
+    ).fetchone()
+    if exists is None:
+        raise ValueError(f"检查点不存在: {checkpoint_id}")
+    created_at = datetime.now(timezone.utc).isoformat()
+    conn.execute(
+        "INSERT OR REPLACE INTO save_points (thread_id, name, checkpoint_id, created_at) VALUES (?, ?, ?, ?)",
+        (thread_id, name, checkpoint_id, created_at),
+    )
+    return {"thread_id": thread_id, "name": name, "checkpoint_id": checkpoint_id, "created_at": created_at}
+
+
+def list_save_points(conn: sqlite3.Connection, thread_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """列出命名存档点"""
+    sql = "SELECT thread_id, name, checkpoint_id, created_at FROM save_points"
+    params: List[Any] = []
+    if thread_id is not None:
+        sql += " WHERE thread_id = ?"
+        params.append(thread_id)
+    sql += " ORDER BY thread_id, checkpoint_id DESC"
+    return [
+        {"thread_id": row[0], "name": row[1], "checkpoint_id": row[2], "created_at": row[3]}
+        for row in conn.execute(sql, params).fetchall()
+    ]
+
+
+def delete_save_points(conn: sqlite3.Connection, thread_id: str, name: Optional[str] = None) -> int:
+    """删除命名存档点，不传 name 时删除该会话的全部存档点"""
+    if name is None:
+        cursor = conn.execute("DELETE FROM save_points WHERE thread_id = ?", (thread_id,))
+    else:
+        cursor = conn.execute("DELETE FROM save_points WHERE thread_id = ? AND name = ?", (thread_id, name))
+    return cursor.rowcount
+
+
+def load_retention_policy(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """读取保留策略：默认值 < store.json 配置 < 调用方覆盖"""
+    from ai_agent.config import ai_settings
+
+    policy = dict(DEFAULT_RETENTION_POLICY)
+    policy.update(ai_settings.CHECKPOINT_RETENTION)
+    policy.update({k: v for k, v in (overrides or {}).items() if v is not None})
+    policy["keepLast"] = max(1, int(policy["keepLast"]))
+    if policy["vacuum"] not in VACUUM_MODES:
+        logger.warning(f"未知的 vacuum 模式 {policy['vacuum']}，使用 incremental")
+        policy["vacuum"] = "incremental"
+    return policy
+
+
+def _storage_size(conn: sqlite3.Connection, db_path: str) -> Dict[str, int]:
+    """数据库文件、WAL 文件大小和空闲页数量"""
+    wal_path = f"{db_path}-wal"
+    return {
+        "db_bytes": os.path.getsize(db_path) if os.path.exists(db_path) else 0,
+        "wal_bytes": os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+        "freelist_pages": conn.execute("PRAGMA freelist_count").fetchone()[0],
+    }
+
+
+def _prune_thread(conn: sqlite3.Connection, thread_id: str, keep_last: int) -> int:
+    """删除单个会话中超出保留数量、且没有被存档点引用的检查点"""
+    cursor = conn.execute(
+        """
+        DELETE FROM checkpoints
+        WHERE rowid IN (
+            SELECT rowid FROM (
+                SELECT rowid, thread_id, checkpoint_id,
+                       ROW_NUMBER() OVER (PARTITION BY checkpoint_ns ORDER BY checkpoint_id DESC) AS rank
+                FROM checkpoints
+                WHERE thread_id = ?
+            ) AS ranked
+            WHERE ranked.rank > ?
+              AND NOT EXISTS (
+                  SELECT 1 FROM save_points sp
+                  WHERE sp.thread_id = ranked.thread_id AND sp.checkpoint_id = ranked.checkpoint_id
+              )
+        )
+        """,
+        (thread_id, keep_last),
+    )
+    return cursor.rowcount
+
+
+def _delete_orphan_writes(conn: sqlite3.Connection) -> int:
+    """删除对应检查点已不存在的 writes 记录"""
+    cursor = conn.execute(
+        """
+        DELETE FROM writes
+        WHERE NOT EXISTS (
+            SELECT 1 FROM checkpoints c
+            WHERE c.thread_id = writes.thread_id
+              AND c.checkpoint_ns = writes.checkpoint_ns
+              AND c.checkpoint_id = writes.checkpoint_id
+        )
+        """
+    )
+    return cursor.rowcount
+
+
+def _vacuum(conn: sqlite3.Connection, mode: str, pages: int) -> str:
+    """回收空闲页，返回实际执行的操作"""
+    if mode == "off":
+        return "off"
+    if mode == "full":
+        conn.execute("VACUUM")
+        return "full"
+
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != _AUTO_VACUUM_INCREMENTAL:
+        # 转换需要完整 VACUUM，只由管理员显式执行（enable_incremental_vacuum）
+        logger.info("数据库未启用 auto_vacuum=INCREMENTAL，跳过增量回收；可通过管理接口或命令行开启")
+        return "not_incremental"
+
+    if pages > 0:
+        conn.execute(f"PRAGMA incremental_vacuum({int(pages)})")
+    else:
+        conn.execute("PRAGMA incremental_vacuum")
+    return "incremental"
+
+
+def _enable_incremental_vacuum(conn: sqlite3.Connection) -> bool:
+    """开启 auto_vacuum=INCREMENTAL，返回是否执行了转换"""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == _AUTO_VACUUM_INCREMENTAL:
+        return False
+    # auto_vacuum 只在 VACUUM 重写数据库时生效
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return True
+
+
+def enable_incremental_vacuum(db_path: str, db=None) -> Dict[str, Any]:
+    """把数据库转换为 auto_vacuum=INCREMENTAL（一次完整 VACUUM，期间独占写线程）
+
+    Args:
+        db: CheckpointDatabase 实例，None 时为 db_path 临时创建一个（命令行使用）
+
+    Returns:
+        转换报告：是否执行了转换、转换前后大小和耗时
+    """
+    from .db_access import CheckpointDatabase
+
+    start = time.perf_counter()
+    if not os.path.exists(db_path):
+        return {"converted": False, "reclaimed_bytes": 0, "duration_ms": 0.0}
+
+    owned = db is None
+    if owned:
+        db = CheckpointDatabase(db_path, readers=1)
+    try:
+        before = db.read(lambda conn: _storage_size(conn, db_path))
+        converted = db.write(_enable_incremental_vacuum, transaction=False)
+        after = db.read(lambda conn: _storage_size(conn, db_path))
+    finally:
+        if owned:
+            db.close()
+
+    report = {
+        "converted": converted,
+        "size_before": before,
+        "size_after": after,
+        "reclaimed_bytes": (before["db_bytes"] + before["wal_bytes"]) - (after["db_bytes"] + after["wal_bytes"]),
+        "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+    if converted:
+        logger.info(f"已开启 auto_vacuum=INCREMENTAL，耗时 {report['duration_ms']} ms")
+    return report
+
+
+def run_retention(db_path: str, policy: Optional[Dict[str, Any]] = None, db=None) -> Dict[str, Any]:
+    """按保留策略清理检查点并回收空间
+
+    所有写操作都提交给检查点数据库的写线程：每个会话的清理是一个普通写操作，和对话的检查点写入交替执行；
+    消息清理和 VACUUM 在批次之间独占执行
+
+    Args:
+        db: CheckpointDatabase 实例，None 时为 db_path 临时创建一个（命令行使用）
+
+    Returns:
+        清理报告：删除数量、回收空间和耗时
+    """
+    from .db_access import CheckpointDatabase
+
+    policy = policy or load_retention_policy()
+    start = time.perf_counter()
+    report: Dict[str, Any] = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "policy": policy,
+        "threads_scanned": 0,
+        "threads_pruned": 0,
+        "checkpoints_deleted": 0,
+        "writes_deleted": 0,
+        "messages_deleted": 0,
+    }
+    if not os.path.exists(db_path):
+        report.update({"vacuum": "skipped", "reclaimed_bytes": 0, "duration_ms": 0.0})
+        return report
+
+    owned = db is None
+    if owned:
+        db = CheckpointDatabase(db_path, readers=1)
+    try:
+        before = db.read(lambda conn: _storage_size(conn, db_path))
+
+        keep_last = policy["keepLast"]
+        candidates = db.read(lambda conn: conn.execute(
+            "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING COUNT(*) > ?", (keep_last,)
+        ).fetchall())
+        report["threads_scanned"] = db.read(
+            lambda conn: conn.execute("SELECT COUNT(DISTINCT thread_id) FROM checkpoints").fetchone()[0]
+        )
+        pruned_threads = []
+        for (thread_id,) in candidates:
+            deleted = db.write(lambda conn: _prune_thread(conn, thread_id, keep_last))
+            if deleted:
+                pruned_threads.append(thread_id)
+                report["threads_pruned"] += 1
+                report["checkpoints_deleted"] += deleted
+        report["writes_deleted"] = db.write(_delete_orphan_writes)
+        # 检查点引用已由触发器删除，这里清理不再被引用的消息（每个会话一个 BEGIN IMMEDIATE 事务）
+        report["messages_deleted"] = db.write(lambda conn: gc_message_store(conn, pruned_threads), transaction=False)
+
+        def vacuum(conn: sqlite3.Connection) -> str:
+            mode = _vacuum(conn, policy["vacuum"], int(policy.get("vacuumPages") or 0))
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            return mode
+
+        report["vacuum"] = db.write(vacuum, transaction=False)
+        after = db.read(lambda conn: _storage_size(conn, db_path))
+    finally:
+        if owned:
+            db.close()
+
+    report["size_before"] = before
+    report["size_after"] = after
+    report["reclaimed_bytes"] = (before["db_bytes"] + before["wal_bytes"]) - (after["db_bytes"] + after["wal_bytes"])
+    report["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    logger.info(
+        f"检查点保留策略执行完成: 删除检查点 {report['checkpoints_deleted']} 个、writes {report['writes_deleted']} 条，"
+        f"回收 {report['reclaimed_bytes'] / 1024 / 1024:.1f} MB，耗时 {report['duration_ms']} ms"
+    )
+    return report
+
+
+class CheckpointRetentionScheduler:
+    """后台定期执行检查点保留策略"""
+
+    def __init__(self, db_path: str = "checkpoints.db"):
+        self.db_path = db_path
+        self.last_report: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动后台线程（重复调用无副作用）"""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="checkpoint-retention", daemon=True)
+        self._thread.start()
+        logger.info("检查点保留任务已启动")
+
+    def stop(self):
+        """停止后台线程"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def run_now(self, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """立即执行一次，已有任务在执行时等待其完成"""
+        with self._run_lock:
+            try:
+                from .db_access import checkpoint_db
+                db = checkpoint_db if os.path.abspath(checkpoint_db.db_path) == os.path.abspath(self.db_path) else None
+                report = run_retention(self.db_path, load_retention_policy(overrides), db)
+            except Exception as e:
+                self.last_error = str(e)
+                raise
+            self.last_report = report
+            self.last_error = None
+            return report
+
+    def enable_incremental_vacuum(self) -> Dict[str, Any]:
+        """开启增量回收，与保留任务互斥"""
+        with self._run_lock:
+            from .db_access import checkpoint_db
+            db = checkpoint_db if os.path.abspath(checkpoint_db.db_path) == os.path.abspath(self.db_path) else None
+            return enable_incremental_vacuum(self.db_path, db)
+
+    def _loop(self):
+        while True:
+            policy = load_retention_policy()
+            if self._stop.wait(max(1.0, float(policy["intervalMinutes"]) * 60)):
+                return
+            if not load_retention_policy()["enabled"]:
+                continue
+            try:
+                self.run_now()
+            except Exception as e:
+                logger.error(f"检查点保留任务执行失败: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "policy": load_retention_policy(),
+            "last_report": self.last_report,
+            "last_error": self.last_error,
+        }
+
+
+# 创建全局检查点保留任务实例
+checkpoint_retention = CheckpointRetentionScheduler()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按保留策略清理检查点")
+    parser.add_argument("--db", default="checkpoints.db")
+    parser.add_argument("--keep-last", type=int, default=None)
+    parser.add_argument("--vacuum", choices=VACUUM_MODES, default=None)
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="先把数据库转换为 auto_vacuum=INCREMENTAL（完整 VACUUM）")
+    args = parser.parse_args()
+
+    if args.enable_incremental_vacuum:
+        report = enable_incremental_vacuum(args.db)
+        print("已开启增量回收" if report["converted"] else "数据库已启用增量回收，无需转换")
+
+    report = run_retention(args.db, load_retention_policy({"keepLast": args.keep_last, "vacuum": args.vacuum}))
+    print(f"删除检查点 {report['checkpoints_deleted']} 个，writes {report['writes_deleted']} 条")
+    print(f"回收空间 {report['reclaimed_bytes'] / 1024 / 1024:.1f} MB，耗时 {report['duration_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
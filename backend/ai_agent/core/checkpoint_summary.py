@@ -0,0 +1,199 @@
+"""
+检查点摘要读取器
+存档点列表只需要检查点ID、下一步节点和最后一条消息的摘要，这里直接按主键分页读取检查点行，
+只解析 msgpack 外层结构，最后一条消息之外的消息不会被反序列化为 LangChain 对象
+（消息引用存储的检查点只按最后一个哈希读取一条消息）。
+检查点写入后不会再变化，摘要按 checkpoint_id 缓存。
+"""
+
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import msgpack
+
+from .checkpoint_compression import decompress_blob
+from .message_store import MESSAGE_REFS, load_messages, load_refs, split_refs
+
+logger = logging.getLogger(__name__)
+
+# 图入口对应的触发通道
+_START_CHANNEL = "__start__"
+# 普通节点的触发通道前缀
+_BRANCH_PREFIX = "branch:to:"
+
+
+def _version_key(version: Any):
+    """通道版本号比较键（SqliteSaver 的版本是 "序号.0.随机数" 形式的字符串）"""
+    if isinstance(version, str):
+        try:
+            return int(version.split(".", 1)[0])
+        except ValueError:
+            return 0
+    return version or 0
+
+
+def pending_nodes(checkpoint: Dict[str, Any]) -> Tuple[str, ...]:
+    """根据触发通道的值和版本推算该检查点之后要执行的节点（与 StateSnapshot.next 一致）"""
+    channel_values = checkpoint.get("channel_values") or {}
+    channel_versions = checkpoint.get("channel_versions") or {}
+    versions_seen = checkpoint.get("versions_seen") or {}
+    nodes = []
+    for channel, version in channel_versions.items():
+        # 触发通道是一次性的，被节点消费后会从 channel_values 中移除
+        if channel not in channel_values:
+            continue
+        if channel == _START_CHANNEL:
+            node = _START_CHANNEL
+        elif channel.startswith(_BRANCH_PREFIX):
+            node = channel[len(_BRANCH_PREFIX):]
+        else:
+            continue
+        seen = (versions_seen.get(node) or {}).get(channel)
+        if _version_key(version) > _version_key(seen):
+            nodes.append(node)
+    return tuple(nodes)
+
+
+class CheckpointSummaryReader:
+    """按页读取检查点摘要，带 checkpoint_id 级别的 LRU 缓存"""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _cache_get(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            summary = self._cache.get(key)
+            if summary is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            return summary
+
+    def _cache_put(self, key: Tuple[str, str], summary: Dict[str, Any]):
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = summary
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, thread_id: Optional[str] = None):
+        """清除缓存（删除会话后调用）"""
+        with self._lock:
+            if thread_id is None:
+                self._cache.clear()
+            else:
+                for key in [k for k in self._cache if k[0] == thread_id]:
+                    del self._cache[key]
+
+    def _summarize(self, conn: sqlite3.Connection, serde, thread_id: str, checkpoint_id: str,
+                   type_: str, blob: bytes) -> Dict[str, Any]:
+        """解析一个检查点行，只反序列化最后一条消息"""
+        type_, blob = decompress_blob(type_, blob)
+        raw = msgpack.unpackb(blob, raw=False, strict_map_key=False)
+        messages = (raw.get("channel_values") or {}).get("messages") or []
+        last_message = None
+        if messages == MESSAGE_REFS:
+            # 消息保存在消息存储中，只按最后一个哈希读取一条
+            refs = load_refs(conn, thread_id, checkpoint_id) or b""
+            digests = split_refs(refs)
+            message_count = len(digests)
+            if digests:
+                last_message = load_messages(conn, serde, thread_id, digests[-1:])[0]
+        else:
+            message_count = len(messages)
+            if messages:
+                last = messages[-1]
+                if isinstance(last, msgpack.ExtType):
+                    last = serde.loads_typed((type_, msgpack.packb(last)))
+                last_message = last
+
+        summary = {
+            "next": pending_nodes(raw),
+            "ts": raw.get("ts"),
+            "message_count": message_count,
+            "last_message_type": "unknown",
+            "last_message_content": "",
+            "tool_calls": None,
+        }
+        if last_message is not None:
+            msg_type = getattr(last_message, "type", None) or (
+                last_message.get("type") if isinstance(last_message, dict) else None
+            )
+            content = getattr(last_message, "content", None)
+            if content is None and isinstance(last_message, dict):
+                content = last_message.get("content", "")
+            summary["last_message_type"] = msg_type or "unknown"
+            summary["last_message_content"] = content if isinstance(content, str) else str(content)
+
+            # 如果是工具调用，显示工具信息
+            tool_calls = getattr(last_message, "tool_calls", None)
+            if summary["last_message_type"] == "ai" and tool_calls:
+                tool_names = [tc.get("name", "unknown") for tc in tool_calls]
+                summary["tool_calls"] = tool_names
+                summary["last_message_content"] = f"工具调用: {', '.join(tool_names)}"
+        return summary
+
+    def iter_summaries(self, conn: sqlite3.Connection, serde, thread_id: str,
+                       before: Optional[str] = None, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """从新到旧逐个产出检查点摘要
+
+        Args:
+            conn: 检查点数据库连接
+            serde: 检查点序列化器（用于解码最后一条消息）
+            thread_id: 会话ID
+            before: 游标，只返回比该 checkpoint_id 更早的检查点
+            limit: 最多返回的数量，None 表示全部
+        """
+        params: List[Any] = [thread_id]
+        where = "thread_id = ? AND checkpoint_ns = ''"
+        if before:
+            where += " AND checkpoint_id < ?"
+            params.append(before)
+        sql = f"SELECT checkpoint_id FROM checkpoints WHERE {where} ORDER BY checkpoint_id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        checkpoint_ids = [row[0] for row in conn.execute(sql, params).fetchall()]
+
+        for checkpoint_id in checkpoint_ids:
+            key = (thread_id, checkpoint_id)
+            summary = self._cache_get(key)
+            if summary is None:
+                row = conn.execute(
+                    "SELECT type, checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = '' AND checkpoint_id = ?",
+                    (thread_id, checkpoint_id),
+                ).fetchone()
+                if row is None:
+                    continue
+                try:
+                    summary = self._summarize(conn, serde, thread_id, checkpoint_id, row[0], row[1])
+                except Exception as e:
+                    logger.warning(f"解析检查点摘要失败 {thread_id}/{checkpoint_id}: {e}")
+                    summary = {"next": (), "ts": None, "message_count": 0, "last_message_type": "unknown",
+                               "last_message_content": "", "tool_calls": None}
+                self._cache_put(key, summary)
+            yield {"checkpoint_id": checkpoint_id, **summary}
+
+    def count_newer(self, conn: sqlite3.Connection, thread_id: str, before: Optional[str]) -> int:
+        """游标之前（更新）的检查点数量，用于计算分页结果在完整历史中的索引"""
+        if not before:
+            return 0
+        return conn.execute(
+            "SELECT COUNT(*) FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = '' AND checkpoint_id >= ?",
+            (thread_id, before),
+        ).fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+# 创建全局检查点摘要读取器实例
+checkpoint_summary_reader = CheckpointSummaryReader()
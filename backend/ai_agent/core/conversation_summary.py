@@ -0,0 +1,248 @@
+"""
+对话自动总结
+历史消息超过模式上下文上限（get_max_tokens_for_mode）的一定比例时，在本轮对话结束后于后台线程中
+把较早的消息折叠进 summary，下一轮 call_llm 直接使用"总结 + 最近消息"，不需要等待总结调用。
+
+- 增量总结：只把尚未被 summary 覆盖的旧消息连同已有总结发给模型，不重复发送整个历史
+- 折叠点总是落在用户消息处，最近几轮完整保留，不会拆开工具调用和工具结果
+- 写入时持有会话锁（与对话、回档共用），确认没有等待中的中断、总结期间只追加了新消息后再更新状态，
+  被折叠的消息用删除标记移除
+
+配置见 store.json 的 autoSummary（enabled、triggerRatio、keepRatio、maxSummaryTokens）
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from .message_reducer import remove_messages
+from .token_counter import TokenCounter, token_counter
+
+logger = logging.getLogger(__name__)
+
+# 默认自动总结配置，可在 store.json 的 autoSummary 中覆盖
+DEFAULT_AUTO_SUMMARY_OPTIONS: Dict[str, Any] = {
+    "enabled": True,
+    "triggerRatio": 0.8,  # 历史超过上下文上限的该比例时触发总结
+    "keepRatio": 0.4,  # 总结后保留的最近消息不超过上下文上限的该比例
+    "maxSummaryTokens": 1024,  # 总结本身的最大输出长度
+}
+
+# 折叠消息渲染为总结输入时，单条消息保留的最大字符数（工具返回的整章正文只需要概要）
+MESSAGE_CHAR_LIMIT = 2000
+
+SUMMARY_INSTRUCTION = (
+    "你负责维护小说创作对话的滚动总结。请把新的对话内容合并进已有总结，"
+    "保留人物、设定、情节进展、用户的要求和尚未完成的任务，省略寒暄和重复内容，直接输出更新后的总结。"
+)
+
+# 写入总结前等待会话锁的最长时间（秒）
+SUMMARY_LOCK_TIMEOUT = 600.0
+
+# 写入总结时使用的节点身份：该节点之后直接结束，不会触发模型调用
+SUMMARY_AS_NODE = "custom_delete"
+
+
+def load_auto_summary_options(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """读取自动总结配置：默认值 < store.json 配置 < 调用方覆盖"""
+    from ai_agent.config import ai_settings
+
+    options = dict(DEFAULT_AUTO_SUMMARY_OPTIONS)
+    options.update(ai_settings.AUTO_SUMMARY)
+    options.update({k: v for k, v in (overrides or {}).items() if v is not None})
+    return options
+
+
+def summary_message(summary: str) -> SystemMessage:
+    """call_llm 调用模型时放在系统提示词之后的总结消息（不写入状态）"""
+    return SystemMessage(content=f"以下是之前对话的总结，较早的消息已折叠进该总结:\n{summary}")
+
+
+def plan_summary(messages: List[Any], max_tokens: int, trigger_ratio: float, keep_ratio: float,
+                 counter: Optional[TokenCounter] = None) -> List[Any]:
+    """选出需要折叠进总结的旧消息，未达到触发阈值时返回空列表
+
+    从最新消息向前按轮次累计，保留不超过 keep_ratio * max_tokens 的最近消息，折叠点落在用户消息上；
+    最近一轮本身就超过保留预算时，折叠到最后一条用户消息之前
+    """
+    if not messages:
+        return []
+    counts = (counter or token_counter).message_counts(messages)
+    # 前缀和：prefix[i] 为前 i 条消息的 token 数，任意区间求和 O(1)
+    prefix = [0.0]
+    for tokens in counts:
+        prefix.append(prefix[-1] + tokens)
+    total = prefix[-1]
+    if total < trigger_ratio * max_tokens:
+        return []
+
+    keep_budget = keep_ratio * max_tokens
+    human_indices = [i for i, msg in enumerate(messages) if isinstance(msg, HumanMessage)]
+    if not human_indices:
+        return []
+
+    cut = human_indices[-1]
+    # 按轮次向前扩展保留范围，直到超出预算
+    for start in reversed(human_indices[:-1]):
+        if total - prefix[start] > keep_budget:
+            break
+        cut = start
+    return messages[:cut]
+
+
+def render_messages(messages: List[Any]) -> str:
+    """把待折叠的消息渲染为总结模型的输入文本"""
+    lines = []
+    for msg in messages:
+        content = msg.content if isinstance(msg.content, str) else str(msg.content)
+        if len(content) > MESSAGE_CHAR_LIMIT:
+            content = content[:MESSAGE_CHAR_LIMIT] + "...（已截断）"
+        if isinstance(msg, HumanMessage):
+            lines.append(f"用户: {content}")
+        elif isinstance(msg, AIMessage):
+            calls = ", ".join(call["name"] for call in (msg.tool_calls or []))
+            if calls:
+                content = f"{content}（调用工具: {calls}）" if content else f"（调用工具: {calls}）"
+            lines.append(f"AI: {content}")
+        elif isinstance(msg, ToolMessage):
+            lines.append(f"工具结果: {content}")
+        elif not isinstance(msg, SystemMessage):
+            lines.append(f"{msg.type}: {content}")
+    return "\n".join(lines)
+
+
+def summarize_incrementally(model, summary: str, messages: List[Any]) -> str:
+    """把新消息合并进已有总结，只发送已有总结和待折叠的消息"""
+    prompt = f"已有总结:\n{summary}\n\n" if summary else ""
+    prompt += f"新的对话内容:\n{render_messages(messages)}\n\n请输出更新后的总结:"
+    response = model.invoke([SystemMessage(content=SUMMARY_INSTRUCTION), HumanMessage(content=prompt)])
+    return response.content if isinstance(response.content, str) else str(response.content)
+
+
+class ConversationSummarizer:
+    """对话结束后在后台线程中执行自动总结，每个会话同一时间最多一个任务"""
+
+    def __init__(self, max_workers: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="summarizer")
+        self._lock = threading.Lock()
+        self._running: Dict[str, bool] = {}  # thread_id -> 任务执行期间是否又有新的触发
+        self._stats = {"scheduled": 0, "completed": 0, "skipped": 0, "failed": 0, "messages_folded": 0}
+        self.last_error: Optional[str] = None
+
+    def schedule(self, graph, config: Dict[str, Any], mode: Optional[str] = None,
+                 model_factory: Optional[Callable[[int], Any]] = None) -> bool:
+        """本轮对话结束后调用，需要总结时提交后台任务
+
+        Args:
+            graph: 已编译的图实例
+            config: 会话配置（包含 thread_id）
+            mode: 对话模式，用于读取上下文上限
+            model_factory: 根据最大输出长度创建总结模型，默认使用 graph_builder.create_llm
+
+        Returns:
+            是否提交了任务（同一会话已有任务时只标记，由该任务结束后再检查一次）
+        """
+        options = load_auto_summary_options()
+        if not options["enabled"]:
+            return False
+        thread_id = str(config["configurable"]["thread_id"])
+        with self._lock:
+            if thread_id in self._running:
+                self._running[thread_id] = True
+                return False
+            self._running[thread_id] = False
+            self._stats["scheduled"] += 1
+        self._executor.submit(self._run, graph, {"configurable": {"thread_id": thread_id}}, mode, model_factory)
+        return True
+
+    def _run(self, graph, config: Dict[str, Any], mode: Optional[str], model_factory):
+        thread_id = config["configurable"]["thread_id"]
+        while True:
+            try:
+                folded = self.summarize_thread(graph, config, mode, model_factory)
+                with self._lock:
+                    if folded:
+                        self._stats["completed"] += 1
+                        self._stats["messages_folded"] += folded
+                    else:
+                        self._stats["skipped"] += 1
+            except Exception as e:
+                logger.error(f"自动总结失败 {thread_id}: {e}")
+                with self._lock:
+                    self._stats["failed"] += 1
+                    self.last_error = str(e)
+            with self._lock:
+                if not self._running.get(thread_id):
+                    self._running.pop(thread_id, None)
+                    return
+                # 执行期间又结束了一轮对话，再检查一次
+                self._running[thread_id] = False
+
+    def summarize_thread(self, graph, config: Dict[str, Any], mode: Optional[str] = None,
+                         model_factory: Optional[Callable[[int], Any]] = None) -> int:
+        """检查会话并在需要时折叠旧消息，返回折叠的消息数量"""
+        from ai_agent.config import ai_settings
+        from .stream_bridge import graph_stream_bridge
+
+        options = load_auto_summary_options()
+        thread_id = config["configurable"]["thread_id"]
+        state = graph.get_state(config)
+        if state.next:
+            # 等待中断响应或执行中的会话不处理，下一轮结束后再检查
+            return 0
+        messages = state.values.get("messages", [])
+        fold = plan_summary(
+            messages,
+            ai_settings.get_max_tokens_for_mode(mode),
+            float(options["triggerRatio"]),
+            float(options["keepRatio"]),
+        )
+        if not fold:
+            return 0
+
+        if model_factory is None:
+            from .graph_builder import create_llm
+            model_factory = create_llm
+        model = model_factory(int(options["maxSummaryTokens"]))
+        # 记录总结所基于的检查点、已有总结和消息，写入前确认期间只追加了新消息
+        base_checkpoint_id = state.config["configurable"].get("checkpoint_id")
+        base_summary = state.values.get("summary", "")
+        base_messages = [(msg.id, msg.content) for msg in messages]
+        # 总结调用耗时较长，期间用户可以继续对话
+        summary = summarize_incrementally(model, base_summary, fold)
+
+        # 读取最新状态和写入总结之间不能插入新一轮对话或回档，否则总结会覆盖该轮的检查点
+        lock = graph_stream_bridge.thread_lock(thread_id)
+        if not lock.acquire(timeout=SUMMARY_LOCK_TIMEOUT):
+            logger.warning(f"会话 {thread_id} 长时间有对话在执行，放弃本次总结")
+            return 0
+        try:
+            latest = graph.get_state(config)
+            if latest.next:
+                return 0
+            latest_messages = latest.values.get("messages", [])
+            # 期间的手动 /summarize、回档或删除消息会改变已有总结或已有消息，基于旧状态的总结不能写入，
+            # 下一轮对话结束后按新状态重新检查；正常的新一轮对话只在末尾追加消息，不影响本次总结
+            if latest.values.get("summary", "") != base_summary or (
+                latest.config["configurable"].get("checkpoint_id") != base_checkpoint_id
+                and [(msg.id, msg.content) for msg in latest_messages[:len(base_messages)]] != base_messages
+            ):
+                logger.info(f"会话 {thread_id} 在总结期间被修改，放弃本次总结")
+                return 0
+            folded = fold
+            graph.update_state(config, {"summary": summary, "messages": remove_messages(folded)}, as_node=SUMMARY_AS_NODE)
+        finally:
+            lock.release()
+        logger.info(f"会话 {thread_id} 自动总结完成: 折叠 {len(folded)} 条消息")
+        return len(folded)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "running": len(self._running), "last_error": self.last_error}
+
+
+# 创建全局对话总结实例
+conversation_summarizer = ConversationSummarizer()
@@ -0,0 +1,477 @@
+"""
+检查点数据库访问层
+checkpoints.db 只有一个写连接，由专用写线程持有：所有写操作进入队列，写线程把同一时刻排队的操作
+合并到一个事务中提交（每个操作一个 SAVEPOINT，单个操作失败不影响同批其他操作）。
+读操作从只读 WAL 连接池借用连接，多个会话的读取不再互相等待，也不会阻塞写入。
+
+- CheckpointDatabase.write(func)：在写线程中执行 func(conn)，等待所在批次提交后返回结果
+- CheckpointDatabase.write(func, transaction=False)：独占执行（VACUUM 等不能在事务中运行的维护操作）
+- CheckpointDatabase.reader()：借用只读连接，连接池耗尽时最多等待 reader_timeout 秒，超时抛出 TimeoutError
+- PooledSessionSaver：检查点写入走写线程，读取走连接池的 SessionIndexedSaver
+- metrics()：写队列深度、批次大小、写入延迟、读连接池使用情况和连接健康状态
+"""
+
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .checkpoint_compression import create_checkpoint_serializer
+from .checkpoint_retention import ensure_save_points
+from .message_store import ensure_message_store
+from .session_index import SessionIndexedSaver, ensure_session_index
+
+logger = logging.getLogger(__name__)
+
+# 写线程停止标记
+_STOP = object()
+
+# 延迟统计保留的样本数
+_LATENCY_SAMPLES = 1000
+
+# 等待只读连接的默认超时（秒）
+DEFAULT_READER_TIMEOUT = 10.0
+
+
+class _WriteJob:
+    """写队列中的一个操作"""
+
+    __slots__ = ("func", "future", "submitted", "transaction")
+
+    def __init__(self, func: Callable[[sqlite3.Connection], Any], transaction: bool):
+        self.func = func
+        self.future: Future = Future()
+        self.submitted = time.perf_counter()
+        self.transaction = transaction
+
+
+def _percentile(samples: List[float], ratio: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+class CheckpointDatabase:
+    """单写线程 + 只读连接池的 SQLite 访问层"""
+
+    def __init__(self, db_path: str = "checkpoints.db", readers: int = 4, max_batch: int = 64,
+                 reader_timeout: float = DEFAULT_READER_TIMEOUT):
+        self.db_path = db_path
+        self.max_readers = readers
+        self.reader_timeout = reader_timeout
+        self.max_batch = max_batch
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_conn: Optional[sqlite3.Connection] = None
+        self._ready = threading.Event()
+        self._start_error: Optional[BaseException] = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+
+        self._readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._reader_count = 0
+        self._readers_in_use = 0
+        self._reader_lock = threading.Lock()
+
+        # 当前线程绑定的连接（写线程始终绑定写连接，读线程在借用期间绑定只读连接）
+        self._local = threading.local()
+
+        self._stats_lock = threading.Lock()
+        self._write_latency: deque = deque(maxlen=_LATENCY_SAMPLES)
+        self._commit_time: deque = deque(maxlen=_LATENCY_SAMPLES)
+        self._reader_wait: deque = deque(maxlen=_LATENCY_SAMPLES)
+        self._reader_timeouts = 0
+        self._jobs = 0
+        self._failed_jobs = 0
+        self._batches = 0
+        self._max_batch_seen = 0
+        self._last_error: Optional[str] = None
+
+    # ---- 生命周期 ----
+
+    @property
+    def running(self) -> bool:
+        return self._writer is not None and self._writer.is_alive()
+
+    def start(self):
+        """启动写线程并初始化表结构（重复调用无副作用）"""
+        with self._start_lock:
+            if self.running:
+                return
+            if self._closed:
+                raise RuntimeError("系统正在关闭，无法获取数据库连接")
+            self._ready.clear()
+            self._start_error = None
+            self._writer = threading.Thread(target=self._writer_loop, name="checkpoint-writer", daemon=True)
+            self._writer.start()
+            self._ready.wait()
+            if self._start_error is not None:
+                raise self._start_error
+            logger.info(f"数据库写线程已启动: {self.db_path}")
+
+    def close(self):
+        """等待队列中的写操作完成，执行 WAL 检查点并关闭所有连接"""
+        with self._start_lock:
+            self._closed = True
+            if self.running:
+                self._queue.put(_STOP)
+                self._writer.join(timeout=30)
+            self._writer = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._reader_lock:
+            self._reader_count = 0
+        logger.info("数据库连接已安全关闭")
+
+    def reopen(self):
+        """关闭后重新允许使用（测试和迁移工具使用）"""
+        self._closed = False
+
+    def _open_writer(self) -> sqlite3.Connection:
+        # isolation_level=None：事务由写线程显式管理
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout = 30000")
+        # 只对尚未建表的新数据库生效，已有数据库需要显式转换（见 checkpoint_retention.enable_incremental_vacuum）
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        # 表结构只在写连接上创建一次，只读连接和批量事务中都不再执行 DDL
+        initialize_schema(conn)
+        return conn
+
+    def _open_reader(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{os.path.abspath(self.db_path)}?mode=ro", uri=True, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout = 30000")
+        return conn
+
+    # ---- 连接绑定 ----
+
+    def bound_connection(self) -> Optional[sqlite3.Connection]:
+        """当前线程绑定的连接（写线程中为写连接，借用读连接期间为只读连接）"""
+        return getattr(self._local, "conn", None)
+
+    @property
+    def in_writer(self) -> bool:
+        return threading.current_thread() is self._writer
+
+    # ---- 写操作 ----
+
+    def write(self, func: Callable[[sqlite3.Connection], Any], transaction: bool = True) -> Any:
+        """在写线程中执行 func(conn)，返回其结果
+
+        Args:
+            func: 写操作，不能自行 commit（由所在批次统一提交）
+            transaction: False 时在批次之间独占执行，func 自己管理事务（VACUUM、批量维护等）
+        """
+        if self.in_writer:
+            # 写操作内部嵌套调用时直接执行
+            return func(self._writer_conn)
+        self.start()
+        job = _WriteJob(func, transaction)
+        self._queue.put(job)
+        return job.future.result()
+
+    def _writer_loop(self):
+        try:
+            self._writer_conn = self._open_writer()
+            self._local.conn = self._writer_conn
+        except BaseException as e:
+            self._start_error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        pending = None
+        while True:
+            job = pending if pending is not None else self._queue.get()
+            pending = None
+            if job is _STOP:
+                break
+            if not job.transaction:
+                self._run_exclusive(job)
+                continue
+
+            # 取出当前已排队的全部事务操作合并为一批，不额外等待
+            batch = [job]
+            while len(batch) < self.max_batch:
+                try:
+                    nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP or not nxt.transaction:
+                    pending = nxt
+                    break
+                batch.append(nxt)
+            self._run_batch(batch)
+
+        try:
+            self._writer_conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except sqlite3.Error as e:
+            logger.error(f"关闭前执行 WAL 检查点失败: {e}")
+        self._writer_conn.close()
+        self._writer_conn = None
+        self._local.conn = None
+
+    def _run_batch(self, batch: List[_WriteJob]):
+        conn = self._writer_conn
+        results = []
+        commit_start = None
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for job in batch:
+                conn.execute("SAVEPOINT write_job")
+                try:
+                    result = job.func(conn)
+                    conn.execute("RELEASE write_job")
+                    results.append((job, result, None))
+                except BaseException as e:
+                    conn.execute("ROLLBACK TO write_job")
+                    conn.execute("RELEASE write_job")
+                    results.append((job, None, e))
+            commit_start = time.perf_counter()
+            conn.execute("COMMIT")
+        except BaseException as e:
+            logger.error(f"写入批次提交失败: {e}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            results = [(job, None, e) for job in batch]
+        self._finish(results, commit_start)
+
+    def _run_exclusive(self, job: _WriteJob):
+        try:
+            result, error = job.func(self._writer_conn), None
+        except BaseException as e:
+            result, error = None, e
+            if self._writer_conn.in_transaction:
+                self._writer_conn.execute("ROLLBACK")
+        self._finish([(job, result, error)], None)
+
+    def _finish(self, results, commit_start: Optional[float]):
+        now = time.perf_counter()
+        with self._stats_lock:
+            self._batches += 1
+            self._max_batch_seen = max(self._max_batch_seen, len(results))
+            if commit_start is not None:
+                self._commit_time.append(now - commit_start)
+            for job, _, error in results:
+                self._jobs += 1
+                self._write_latency.append(now - job.submitted)
+                if error is not None:
+                    self._failed_jobs += 1
+                    self._last_error = str(error)
+        for job, result, error in results:
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+
+    # ---- 读操作 ----
+
+    @contextmanager
+    def reader(self, bind: bool = True) -> Iterator[sqlite3.Connection]:
+        """借用一个只读连接
+
+        Args:
+            bind: 借用期间绑定到当前线程；在生成器中跨线程使用连接时传 False
+        """
+        self.start()
+        start = time.perf_counter()
+        conn = None
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._reader_lock:
+                if self._reader_count < self.max_readers:
+                    self._reader_count += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = self._open_reader()
+                except BaseException:
+                    with self._reader_lock:
+                        self._reader_count -= 1
+                    raise
+            else:
+                try:
+                    conn = self._readers.get(timeout=self.reader_timeout)
+                except queue.Empty:
+                    with self._stats_lock:
+                        self._reader_timeouts += 1
+                    raise TimeoutError(
+                        f"等待只读连接超时（{self.reader_timeout} 秒），{self.max_readers} 个连接均在使用中"
+                    ) from None
+        with self._stats_lock:
+            self._reader_wait.append(time.perf_counter() - start)
+        with self._reader_lock:
+            self._readers_in_use += 1
+
+        previous = self.bound_connection()
+        if bind:
+            self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            if bind:
+                self._local.conn = previous
+            with self._reader_lock:
+                self._readers_in_use -= 1
+            self._readers.put(conn)
+
+    def read(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        """用只读连接执行 func(conn)"""
+        with self.reader() as conn:
+            return func(conn)
+
+    # ---- 监控 ----
+
+    def health(self) -> Dict[str, Any]:
+        """检查写连接和只读连接是否可用"""
+        status = {"writer": False, "reader": False}
+        try:
+            status["writer"] = self.write(lambda conn: conn.execute("SELECT 1").fetchone()[0] == 1, transaction=False)
+        except Exception as e:
+            status["writer_error"] = str(e)
+        try:
+            status["reader"] = self.read(lambda conn: conn.execute("SELECT 1").fetchone()[0] == 1)
+        except Exception as e:
+            status["reader_error"] = str(e)
+        return status
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            latency = list(self._write_latency)
+            commit = list(self._commit_time)
+            wait = list(self._reader_wait)
+            reader_timeouts = self._reader_timeouts
+            counters = {
+                "jobs": self._jobs,
+                "failed_jobs": self._failed_jobs,
+                "batches": self._batches,
+                "avg_batch_size": round(self._jobs / self._batches, 2) if self._batches else 0.0,
+                "max_batch_size": self._max_batch_seen,
+                "last_error": self._last_error,
+            }
+        with self._reader_lock:
+            readers = {
+                "size": self._reader_count,
+                "max": self.max_readers,
+                "in_use": self._readers_in_use,
+            }
+        readers["wait_ms_p95"] = round(_percentile(wait, 0.95) * 1000, 3)
+        readers["timeouts"] = reader_timeouts
+        return {
+            "db_path": self.db_path,
+            "writer_running": self.running,
+            "queue_depth": self._queue.qsize(),
+            "write": {
+                **counters,
+                "latency_ms_avg": round(sum(latency) / len(latency) * 1000, 3) if latency else 0.0,
+                "latency_ms_p50": round(_percentile(latency, 0.5) * 1000, 3),
+                "latency_ms_p95": round(_percentile(latency, 0.95) * 1000, 3),
+                "latency_ms_max": round(max(latency) * 1000, 3) if latency else 0.0,
+                "commit_ms_p95": round(_percentile(commit, 0.95) * 1000, 3),
+            },
+            "readers": readers,
+        }
+
+
+def initialize_schema(conn: sqlite3.Connection):
+    """创建检查点、会话索引、消息存储和存档点相关的全部表"""
+    SessionIndexedSaver(conn).setup()
+    ensure_message_store(conn)
+    ensure_session_index(conn)
+    ensure_save_points(conn)
+
+
+class PooledSessionSaver(SessionIndexedSaver):
+    """通过 CheckpointDatabase 访问数据库的 SessionIndexedSaver
+
+    写操作（put / put_writes / delete_thread）整体在写线程中执行，读取使用只读连接池，
+    父类中所有 self.cursor() / self.conn 的访问都会落到当前线程绑定的连接上
+    """
+
+    def __init__(self, db: CheckpointDatabase, *, serde=None, mode: Optional[str] = None):
+        self.db = db
+        db.start()
+        super().__init__(None, serde=serde or create_checkpoint_serializer(db_path=db.db_path), mode=mode)
+        # 表结构已由写线程创建
+        self.is_setup = True
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = self.db.bound_connection()
+        if conn is None:
+            raise RuntimeError("PooledSessionSaver 只能在写线程或借用的读连接中访问数据库")
+        return conn
+
+    @conn.setter
+    def conn(self, value):
+        # SqliteSaver.__init__ 会赋值 self.conn，连接改由 CheckpointDatabase 管理
+        pass
+
+    @contextmanager
+    def cursor(self, transaction: bool = True) -> Iterator[sqlite3.Cursor]:
+        conn = self.db.bound_connection()
+        if conn is not None:
+            # 写线程中不单独提交，由所在批次统一提交
+            cur = conn.cursor()
+            try:
+                yield cur
+            finally:
+                cur.close()
+            return
+        if transaction:
+            raise RuntimeError("写操作必须通过 CheckpointDatabase.write 在写线程中执行")
+        with self.db.reader() as conn:
+            cur = conn.cursor()
+            try:
+                yield cur
+            finally:
+                cur.close()
+
+    @contextmanager
+    def _bound_reader(self) -> Iterator[None]:
+        """读取期间绑定一个只读连接，父类中直接访问 self.conn 的代码也使用该连接"""
+        if self.db.bound_connection() is not None:
+            yield
+            return
+        with self.db.reader():
+            yield
+
+    def get_tuple(self, config):
+        with self._bound_reader():
+            return super().get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        # 在同一个只读连接上取出全部结果，迭代期间不占用连接池
+        with self._bound_reader():
+            tuples = list(super().list(config, filter=filter, before=before, limit=limit))
+        yield from tuples
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        parent = super(PooledSessionSaver, self).put
+        return self.db.write(lambda conn: parent(config, checkpoint, metadata, new_versions))
+
+    def put_writes(self, config, writes, task_id, task_path: str = ""):
+        parent = super(PooledSessionSaver, self).put_writes
+        return self.db.write(lambda conn: parent(config, writes, task_id, task_path))
+
+    def delete_thread(self, thread_id: str) -> None:
+        parent = super(PooledSessionSaver, self).delete_thread
+        return self.db.write(lambda conn: parent(thread_id))
+
+
+# 创建全局检查点数据库访问实例
+checkpoint_db = CheckpointDatabase("checkpoints.db")
@@ -0,0 +1,171 @@
+"""
+LangChain 对象序列化
+把流式事件中的 StateSnapshot、消息、中断、任务等对象转换为可 JSON 编码的结构，输出与原来逐个
+hasattr/isinstance 判断的递归实现完全一致（前端 legacy 协议按此格式解析）。
+
+- 按类型分派：每个类第一次出现时确定处理函数并缓存，之后只需一次字典查找
+- 消息对象直接读取字段构造结果，不经过 model_dump
+- 字典和列表中的字符串、数字等基础类型直接复制，不再递归调用
+"""
+
+import logging
+from typing import Any, Callable, Dict
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langgraph.types import Interrupt, StateSnapshot
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Any], Any]
+
+# 类 -> 处理函数
+_HANDLERS: Dict[type, Handler] = {}
+
+_PRIMITIVES = (str, int, float, bool, type(None))
+_MESSAGE_TYPES = (SystemMessage, HumanMessage, AIMessage, ToolMessage)
+
+
+def serialize_langchain_object(obj: Any) -> Any:
+    """序列化LangChain对象为JSON可序列化的格式"""
+    handler = _HANDLERS.get(obj.__class__)
+    if handler is None:
+        handler = _resolve(obj.__class__)
+    try:
+        return handler(obj)
+    except Exception as e:
+        logger.error(f"Serialization error for object {type(obj)}: {e}")
+        return {"type": "serialization_error", "error": str(e)}
+
+
+def _identity(obj: Any) -> Any:
+    return obj
+
+
+def _value(obj: Any) -> Any:
+    """序列化容器中的一个元素，基础类型直接返回"""
+    handler = _HANDLERS.get(obj.__class__)
+    if handler is _identity:
+        return obj
+    return serialize_langchain_object(obj)
+
+
+def _serialize_dict(obj: Dict[Any, Any]) -> Dict[Any, Any]:
+    return {k: _value(v) for k, v in obj.items()}
+
+
+def _serialize_sequence(obj: Any) -> list:
+    return [_value(item) for item in obj]
+
+
+def _serialize_stream(obj: Any) -> Dict[str, Any]:
+    return {
+        'type': 'stream',
+        'content': str(obj),
+        'class_name': obj.__class__.__name__
+    }
+
+
+def _serialize_snapshot(obj: StateSnapshot) -> Dict[str, Any]:
+    return {
+        'type': 'state_snapshot',
+        'values': serialize_langchain_object(obj.values),
+        'next': obj.next,
+        'config': obj.config,
+        'metadata': obj.metadata,
+        'created_at': obj.created_at,
+        'parent_config': obj.parent_config,
+        'tasks': serialize_langchain_object(obj.tasks),
+        'interrupts': serialize_langchain_object(obj.interrupts),
+    }
+
+
+def _message_handler(cls: type) -> Handler:
+    """为消息类生成处理函数，类型名和特有字段在生成时确定"""
+    type_name = cls.__name__.lower()
+    is_ai = issubclass(cls, AIMessage)
+    is_tool = issubclass(cls, ToolMessage)
+
+    def handler(obj: Any) -> Dict[str, Any]:
+        additional_kwargs = obj.additional_kwargs
+        response_metadata = obj.response_metadata
+        data = {
+            'type': type_name,
+            'content': obj.content,
+            'additional_kwargs': _serialize_dict(additional_kwargs) if additional_kwargs else {},
+            'response_metadata': _serialize_dict(response_metadata) if response_metadata else {},
+            'id': obj.id
+        }
+        if is_ai:
+            tool_calls = obj.tool_calls
+            usage_metadata = obj.usage_metadata
+            data['tool_calls'] = _serialize_sequence(tool_calls) if tool_calls else []
+            data['usage_metadata'] = _value(usage_metadata) if usage_metadata is not None else None
+            data['refusal'] = getattr(obj, 'refusal', None)
+        if is_tool:
+            data['tool_call_id'] = obj.tool_call_id
+        return data
+
+    return handler
+
+
+def _serialize_interrupt(obj: Interrupt) -> Dict[str, Any]:
+    return {
+        'type': 'interrupt',
+        'value': obj.value,
+        'id': obj.id
+    }
+
+
+def _serialize_task(obj: Any) -> Dict[str, Any]:
+    return {
+        'type': 'pregel_task',
+        'id': getattr(obj, 'id', ''),
+        'name': getattr(obj, 'name', ''),
+        'path': serialize_langchain_object(getattr(obj, 'path', ())),
+        'error': getattr(obj, 'error', None),
+        'interrupts': serialize_langchain_object(getattr(obj, 'interrupts', ())),
+        'state': getattr(obj, 'state', None),
+        'result': getattr(obj, 'result', None)
+    }
+
+
+def _serialize_other(obj: Any) -> Any:
+    """其他对象：Pydantic 模型使用 model_dump，普通对象使用 __dict__，都没有时使用字符串表示"""
+    try:
+        if hasattr(obj, 'model_dump') and callable(getattr(obj, 'model_dump')):
+            return serialize_langchain_object(obj.model_dump())
+        elif hasattr(obj, '__dict__'):
+            return serialize_langchain_object(obj.__dict__)
+        else:
+            return str(obj)
+    except Exception as inner_e:
+        logger.warning(f"Fallback serialization failed for {type(obj)}: {inner_e}")
+        return repr(obj)
+
+
+def _resolve(cls: type) -> Handler:
+    """确定类的处理函数并缓存，判断顺序与原递归实现一致"""
+    if cls.__name__ == 'Stream':
+        handler = _serialize_stream
+    elif issubclass(cls, StateSnapshot):
+        handler = _serialize_snapshot
+    elif issubclass(cls, _MESSAGE_TYPES):
+        handler = _message_handler(cls)
+    elif issubclass(cls, Interrupt):
+        handler = _serialize_interrupt
+    elif cls.__name__ == 'PregelTask':
+        handler = _serialize_task
+    elif issubclass(cls, dict):
+        handler = _serialize_dict
+    elif issubclass(cls, (list, tuple)):
+        handler = _serialize_sequence
+    elif issubclass(cls, _PRIMITIVES):
+        handler = _identity
+    else:
+        handler = _serialize_other
+    _HANDLERS[cls] = handler
+    return handler
+
+
+for _cls in _PRIMITIVES:
+    _HANDLERS[_cls] = _identity
@@ -2,16 +2,37 @@ from typing_extensions import TypedDict
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import tools_condition
-from langchain_core.messages import ToolMessage, AIMessage, SystemMessage, HumanMessage
-from langchain_core.messages.utils import (
-    trim_messages,
-    count_tokens_approximately
-)
+from langchain_core.messages import ToolMessage, AIMessage, SystemMessage, HumanMessage, RemoveMessage
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+from langchain_core.runnables import RunnableConfig
 import sys
 import os
+import uuid
 # 添加父目录到路径，确保可以导入ai_agent模块
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from ..config import ai_settings, State
+from .message_reducer import remove_messages
+from .conversation_summary import load_auto_summary_options, summarize_incrementally, summary_message
+from .token_counter import token_counter
+from .tool_executor import tool_executor
+from .tool_config_manager import tool_config_manager, APPROVAL_ASK, APPROVAL_AUTO, APPROVAL_ONCE
+
+def create_llm(max_tokens: int = None):
+    """按当前配置创建模型实例（通过liteLLM网关）
+
+    Args:
+        max_tokens: 最大输出长度，不传则使用全局配置
+    """
+    # 使用ChatOpenAI，连接liteLLM网关
+    return ChatOpenAI(
+        openai_api_base="http://127.0.0.1:4000",
+        api_key="sk-123",  # 添加API密钥
+        model=ai_settings.DEFAULT_MODEL,
+        temperature=ai_settings.temperature,
+        max_tokens=max_tokens or ai_settings.max_tokens,
+        timeout=ai_settings.timeout,
+        stream_usage=True,  # 流式输出（token 模式）时同样返回用量统计
+    )
 
 def build_graph(tool, memory, system_prompt=None, mode=None):
     """构建并返回图实例
@@ -43,15 +64,7 @@ def build_graph(tool, memory, system_prompt=None, mode=None):
     # 获取对应提供商的API密钥
     api_key = ai_settings.get_api_key_for_provider(selected_provider)
     
-    # 使用ChatOpenAI，连接liteLLM网关
-    llm = ChatOpenAI(
-        openai_api_base="http://127.0.0.1:4000",
-        api_key="sk-123",  # 添加API密钥
-        model=selected_model,
-        temperature=ai_settings.temperature,
-        max_tokens=ai_settings.max_tokens,
-        timeout=ai_settings.timeout,
-    )
+    llm = create_llm()
     
     # 绑定工具到模型
     if tool:
@@ -61,60 +74,82 @@ def build_graph(tool, memory, system_prompt=None, mode=None):
         llm_with_tools = llm
         print(f"[WARNING] 没有可用的工具绑定到模型")
     
+    # 同一模型和工具集的调用中，工具定义等固定开销相同，token 校准按此分组
+    observe_key = (selected_provider, selected_model, tuple(sorted(tool)) if tool else ())
+    
     # 创建总结模型（限制token数）
-    summarization_model = llm.bind(max_tokens=128)
+    summarization_model = llm.bind(max_tokens=load_auto_summary_options()["maxSummaryTokens"])
     # 创建模型节点
     def call_llm(state: State):
         """调用LLM生成响应"""
         # 获取当前消息列表
-        current_messages = state.get("messages", [])
+        state_messages = state.get("messages", [])
+        # 较早的消息已由自动总结折叠进 summary
+        summary = state.get("summary", "")
+        summary_messages = [summary_message(summary)] if summary else []
         
         # 获取模式特定的最大token数
         mode_max_tokens = ai_settings.get_max_tokens_for_mode(mode)
         print(f"最大tokens数被设置为{mode_max_tokens}")
-        # 修剪消息历史，避免超出上下文限制
-        current_messages = trim_messages(
-            current_messages,
-            strategy="last",  # 保留最新的消息
-            token_counter=count_tokens_approximately,
-            max_tokens=mode_max_tokens,  # 使用模式特定的最大token数
-            start_on="human",  # 从human消息开始保留
-            end_on=("human", "tool"),  # 在human或tool消息结束
+        # 修剪消息历史，避免超出上下文限制（总结未及时完成时的兜底）
+        # 每条消息的 token 数只估算一次，从最新消息向前累加，从human消息开始、在human或tool消息结束
+        current_messages = token_counter.trim(
+            state_messages,
+            max_tokens=max(1, mode_max_tokens - token_counter.count(summary_messages)),  # 为总结预留空间
         )
         
-        # 如果有系统提示词，更新系统消息
+        # 如果有系统提示词，只在调用时放到开头，不写入状态（旧检查点中的系统消息一并移除）
         if system_prompt:
-            # 过滤掉现有的系统消息
-            filtered_messages = [msg for msg in current_messages if not isinstance(msg, SystemMessage)]
-            # 添加新的系统消息到开头
-            current_messages = [SystemMessage(content=system_prompt)] + filtered_messages
+            current_messages = [msg for msg in current_messages if not isinstance(msg, SystemMessage)]
+            llm_input = [SystemMessage(content=system_prompt)] + summary_messages + current_messages
+        else:
+            llm_input = summary_messages + current_messages
         
         # 调用模型生成响应
-        response = llm_with_tools.invoke(current_messages)
-        # 手动将新消息添加到现有消息列表中
-        updated_messages = current_messages + [response]
+        response = llm_with_tools.invoke(llm_input)
+        # 用实际输入 token 数校准估算值
+        token_counter.observe(
+            llm_input, (getattr(response, "usage_metadata", None) or {}).get("input_tokens"), key=observe_key
+        )
         
-        return {"messages": updated_messages}
+        # 开启自动总结时被修剪的消息保留在状态中，由后台总结折叠进 summary 后再删除
+        if load_auto_summary_options()["enabled"]:
+            return {"messages": [response]}
+        
+        # 只返回增量：被修剪掉的消息的删除标记 + 新的响应
+        kept_ids = {msg.id for msg in current_messages}
+        dropped = [msg for msg in state_messages if msg.id not in kept_ids]
+        return {"messages": remove_messages(dropped) + [response]}
     # 创建工具字典
     tools_by_name = {tool.name: tool for tool in tool.values()}
 
     # 自定义工具节点
-    def tool_node(state: State):
-        """执行工具调用"""
-        # 获取当前消息列表
-        current_messages = state.get("messages", [])
-        
-        result = []
-        # 处理最后一条消息中的工具调用
-        for tool_call in state["messages"][-1].tool_calls:
-            tool = tools_by_name[tool_call["name"]]
-            observation = tool.invoke(tool_call["args"])
-            result.append(ToolMessage(content=observation, tool_call_id=tool_call["id"]))
-        
-        # 手动将工具消息添加到现有消息列表中
-        updated_messages = current_messages + result
-        
-        return {"messages": updated_messages}
+    def tool_node(state: State, config: RunnableConfig):
+        """执行工具调用：相互独立的调用并发执行，需要确认的调用合并成一次中断"""
+        # 按模式的审批策略自动批准只读工具，以及本会话中已确认过的 once 工具
+        policy = tool_config_manager.get_approval_policy(mode)
+        approved = set(state.get("approved_tools") or [])
+        newly_approved = []
+
+        def decide(tool_call, value):
+            rule = policy.get(tool_call["name"], APPROVAL_ASK)
+            if rule == APPROVAL_AUTO or (rule == APPROVAL_ONCE and tool_call["name"] in approved):
+                return {"choice_action": "1", "choice_data": "无附加信息"}
+            return None
+
+        def on_answer(tool_call, decision):
+            if policy.get(tool_call["name"]) == APPROVAL_ONCE and isinstance(decision, dict) \
+                    and decision.get("choice_action") == "1" and tool_call["name"] not in approved:
+                approved.add(tool_call["name"])
+                newly_approved.append(tool_call["name"])
+
+        results = tool_executor.run(tools_by_name, state["messages"][-1].tool_calls, config,
+                                    decide=decide, on_answer=on_answer)
+        # 只返回新的工具消息（按调用顺序），由归约器追加到历史之后
+        update = {"messages": results}
+        if newly_approved:
+            update["approved_tools"] = newly_approved
+        return update
 
     # 自定义删除节点 - 完全替换官方删除机制
     def custom_delete_messages(state: State):
@@ -145,8 +180,7 @@ def build_graph(tool, memory, system_prompt=None, mode=None):
                 # 删除所有消息
                 if "/delete all" in content.lower() or "删除所有" in content:
                     print("执行清空所有消息操作")
-                    remaining_messages = []  # 清空所有消息
-                    break
+                    return {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES)]}
                 
                 # 删除特定索引的消息
                 elif "/delete index" in content.lower() or "删除索引" in content:
@@ -167,37 +201,24 @@ def build_graph(tool, memory, system_prompt=None, mode=None):
             
             print(f"删除操作完成，剩余 {len(remaining_messages)} 条消息")
         
-        return {"messages": remaining_messages}
+        # 只返回删除标记（包括删除指令本身）
+        remaining_ids = {msg.id for msg in remaining_messages}
+        return {"messages": remove_messages([msg for msg in messages if msg.id not in remaining_ids])}
 
     # 创建总结节点
     def summarize_conversation(state: State):
-        """总结对话历史"""
-        # 获取现有总结
-        summary = state.get("summary", "")
-        
-        # 创建总结提示
-        if summary:
-            # 如果已有总结，扩展它
-            summary_message = (
-                f"这是到目前为止的对话总结: {summary}\n\n"
-                "请根据上面的新消息扩展这个总结:"
-            )
-        else:
-            # 如果是第一次总结，创建新总结
-            summary_message = "请为上面的对话创建一个总结:"
-        
-        # 添加总结提示到消息历史
-        messages = state["messages"] + [HumanMessage(content=summary_message)]
-        
-        # 调用总结模型
-        response = summarization_model.invoke(messages)
+        """总结对话历史（手动 /summarize 指令）"""
+        # 只把尚未折叠的消息和已有总结发给模型，总结指令本身不计入
+        messages = [msg for msg in state["messages"]
+                    if not (isinstance(msg, HumanMessage) and msg.content.startswith("/summarize"))]
         
         # 删除除最近2条消息外的所有消息
-        delete_messages = state["messages"][:-2]
+        delete_messages = messages[:-2]
+        summary = summarize_incrementally(summarization_model, state.get("summary", ""), delete_messages)
         
         return {
-            "summary": response.content,
-            "messages": state["messages"][-2:]  # 保留最近2条消息
+            "summary": summary,
+            "messages": remove_messages(delete_messages)  # 保留最近2条消息
         }
 
     # 构建工作流图
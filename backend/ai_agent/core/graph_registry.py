@@ -0,0 +1,116 @@
+"""
+图实例注册表
+缓存已编译的图实例，按 (模式, 模型, 启用工具集, 工具代码版本, 总结长度上限, 系统提示词指纹) 复用，避免每次请求重新编译
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from ..config import ai_settings
+from .conversation_summary import load_auto_summary_options
+from .graph_builder import build_graph
+from .tool_config_manager import tool_config_manager
+from .tool_load import tool_registry
+
+logger = logging.getLogger(__name__)
+
+
+class GraphRegistry:
+    """已编译图实例的LRU缓存"""
+
+    def __init__(self, max_size: int = 8):
+        self.max_size = max_size
+        self._graphs: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _prompt_fingerprint(system_prompt: Optional[str]) -> str:
+        """计算系统提示词指纹"""
+        return hashlib.sha256((system_prompt or "").encode("utf-8")).hexdigest()
+
+    def make_key(self, mode: Optional[str], system_prompt: Optional[str]) -> Tuple:
+        """根据当前配置生成缓存键
+
+        Args:
+            mode: 模式名称
+            system_prompt: 完整的系统提示词
+        """
+        selected_model = ai_settings.DEFAULT_MODEL
+        selected_provider = ai_settings._get_config("selectedProvider", "deepseek")
+        enabled_tools = tuple(sorted(tool_config_manager.get_tools_for_mode(mode))) if mode else None
+        # 工具源文件修改后重新加载的模块只有重新构建图才会生效
+        tool_registry.refresh()
+        # 总结模型在构建图时绑定了 maxSummaryTokens
+        max_summary_tokens = load_auto_summary_options()["maxSummaryTokens"]
+        return (mode, selected_provider, selected_model, enabled_tools, tool_registry.version, max_summary_tokens,
+                self._prompt_fingerprint(system_prompt))
+
+    def get_or_build(self, mode: Optional[str], system_prompt: Optional[str], memory,
+                     tool_loader: Callable[[Optional[str]], Dict[str, Any]]):
+        """获取缓存的图实例，未命中时构建并缓存
+
+        Args:
+            mode: 模式名称
+            system_prompt: 完整的系统提示词
+            memory: 检查点存储，缓存的图必须绑定同一个存储实例
+            tool_loader: 按模式加载工具的函数，仅在未命中时调用
+        """
+        key = self.make_key(mode, system_prompt)
+
+        with self._lock:
+            entry = self._graphs.get(key)
+            if entry is not None and entry["memory"] is memory:
+                self._graphs.move_to_end(key)
+                self.hits += 1
+                return entry["graph"]
+
+        tools = tool_loader(mode)
+        graph = build_graph(tools, memory, system_prompt=system_prompt, mode=mode)
+
+        with self._lock:
+            self.misses += 1
+            # 同一模式的旧指纹已经失效，直接丢弃，不占用LRU容量
+            stale_keys = [k for k in self._graphs if k[0] == mode and k != key]
+            for stale_key in stale_keys:
+                del self._graphs[stale_key]
+            self._graphs[key] = {"graph": graph, "memory": memory}
+            self._graphs.move_to_end(key)
+            while len(self._graphs) > self.max_size:
+                evicted_key, _ = self._graphs.popitem(last=False)
+                logger.info(f"图实例缓存已满，淘汰模式 '{evicted_key[0]}' 的图实例")
+
+        logger.info(f"图实例已构建并缓存，模式: {mode}，工具数: {len(tools)}")
+        return graph
+
+    def invalidate(self, mode: Optional[str] = None):
+        """使缓存失效
+
+        Args:
+            mode: 模式名称，为空时清空全部缓存
+        """
+        with self._lock:
+            if mode is None:
+                self._graphs.clear()
+            else:
+                for key in [k for k in self._graphs if k[0] == mode]:
+                    del self._graphs[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            return {
+                "size": len(self._graphs),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "modes": [key[0] for key in self._graphs],
+            }
+
+
+# 创建全局图实例注册表
+graph_registry = GraphRegistry()
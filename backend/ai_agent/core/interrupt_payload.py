@@ -0,0 +1,126 @@
+"""
+中断事件内容
+工具中断时 SSE 只发送审批界面需要的信息：中断ID、提示、等待确认的工具名和参数，以及可选的修改预览，
+不再附带完整的 StateSnapshot，事件大小与对话长度无关。完整状态通过 GET /api/chat/state/{thread_id} 按需获取。
+"""
+
+import difflib
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from file.utils.path_validator import PathValidator
+
+# 单个字符串参数在中断事件中保留的最大字符数（write_file 的整章正文只需显示开头）
+MAX_ARG_CHARS = 2000
+
+# 修改预览保留的最大行数
+MAX_PREVIEW_LINES = 200
+
+# 会修改文件、需要生成预览的工具
+PREVIEW_TOOLS = ("write_file", "search_and_replace", "apply_diff", "insert_content")
+
+
+def compact_args(args: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+    """截断过长的字符串参数，返回 (参数, 是否截断)"""
+    compacted = {}
+    truncated = False
+    for key, value in (args or {}).items():
+        if isinstance(value, str) and len(value) > MAX_ARG_CHARS:
+            compacted[key] = value[:MAX_ARG_CHARS]
+            truncated = True
+        else:
+            compacted[key] = value
+    return compacted, truncated
+
+
+def _read_novel_file(path: str) -> Optional[str]:
+    """读取小说目录下的文件，路径不安全或文件不存在时返回 None"""
+    validator = PathValidator(settings.NOVEL_DIR)
+    clean_path = validator.normalize_path(path or "")
+    if not clean_path or not validator.is_safe_path(clean_path):
+        return None
+    full_path = validator.get_full_path(clean_path)
+    if not full_path.is_file():
+        return None
+    with open(full_path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _unified_diff(path: str, old: str, new: str) -> str:
+    lines = difflib.unified_diff(old.splitlines(), new.splitlines(), f"a/{path}", f"b/{path}", lineterm="")
+    return "\n".join(lines)
+
+
+def _limit_lines(text: str) -> str:
+    lines = text.split("\n")
+    if len(lines) <= MAX_PREVIEW_LINES:
+        return text
+    return "\n".join(lines[:MAX_PREVIEW_LINES]) + f"\n... 省略 {len(lines) - MAX_PREVIEW_LINES} 行"
+
+
+def diff_preview(tool_call: Dict[str, Any]) -> Optional[str]:
+    """生成文件修改工具的预览（统一 diff 格式），其他工具或无法生成时返回 None"""
+    name = tool_call.get("name")
+    args = tool_call.get("args") or {}
+    path = args.get("path", "")
+    try:
+        if name == "apply_diff":
+            preview = args.get("diff") or ""
+        elif name == "insert_content":
+            preview = f"@@ 第 {args.get('paragraph')} 段前插入 @@\n" + \
+                "\n".join("+" + line for line in (args.get("content") or "").split("\n"))
+        elif name == "write_file":
+            preview = _unified_diff(path, _read_novel_file(path) or "", args.get("content") or "")
+        elif name == "search_and_replace":
+            old = _read_novel_file(path)
+            if old is None:
+                return None
+            flags = re.IGNORECASE if args.get("ignore_case") else 0
+            search = args.get("search") or ""
+            if args.get("use_regex") or flags:
+                pattern = search if args.get("use_regex") else re.escape(search)
+                new = re.sub(pattern, args.get("replace") or "", old, flags=flags)
+            else:
+                new = old.replace(search, args.get("replace") or "")
+            preview = _unified_diff(path, old, new)
+        else:
+            return None
+    except (OSError, re.error, UnicodeDecodeError):
+        return None
+    return _limit_lines(preview) if preview else None
+
+
+def describe_tool_call(tool_call: Dict[str, Any], preview: bool = True) -> Dict[str, Any]:
+    """审批界面需要的单个工具调用信息"""
+    args, truncated = compact_args(tool_call.get("args") or {})
+    item = {"id": tool_call.get("id"), "name": tool_call.get("name"), "args": args}
+    if truncated:
+        item["args_truncated"] = True
+    if preview and tool_call.get("name") in PREVIEW_TOOLS:
+        item["preview"] = diff_preview(tool_call)
+    return item
+
+
+def build_interrupt_event(interrupts: List[Any], tool_calls: List[Dict[str, Any]], thread_id: str,
+                          preview: bool = True) -> Dict[str, Any]:
+    """构建精简的中断事件
+
+    Args:
+        interrupts: 本轮的 Interrupt 对象
+        tool_calls: 等待确认的工具调用
+        thread_id: 会话ID，前端可据此请求完整状态
+        preview: 是否为文件修改工具生成预览
+    """
+    items = [{"type": "interrupt", "id": item.id, "value": item.value} for item in interrupts]
+    event = {
+        "type": "interrupt",
+        "interrupts": items,
+        "tool_calls": [describe_tool_call(tool_call, preview) for tool_call in tool_calls],
+        "thread_id": thread_id,
+    }
+    if items:
+        # 顶层字段供只处理单个中断的客户端直接使用
+        event["id"] = items[0]["id"]
+        event["value"] = items[0]["value"]
+    return event
@@ -1,6 +1,7 @@
 from langgraph.types import Command
 from langchain_core.messages import HumanMessage
 from ai_agent.config import State
+from ai_agent.core.message_reducer import replace_all_messages
 
 
 def main_loop(graph,cleanup_function=None):
@@ -69,7 +70,7 @@ def main_loop(graph,cleanup_function=None):
                         new_messages = current_messages + [HumanMessage(content=user_rollback_update)]
             
                 # 用整个新状态替换原本的旧状态
-                new_config = graph.update_state(selected_state.config, values={"messages": new_messages})
+                new_config = graph.update_state(selected_state.config, values={"messages": replace_all_messages(new_messages)})
                 print(f"更新成功{new_config}")
                 # 触发回复
 
@@ -110,11 +111,10 @@ def main_loop(graph,cleanup_function=None):
                     if delete_ids_input.lower() == 'all':
                         # 使用自定义删除指令删除所有消息
                         delete_instruction = HumanMessage(content="/delete all")
-                        updated_messages = current_messages + [delete_instruction]
                         
                         # 调用图，条件边会自动路由到自定义删除节点
                         result = graph.invoke(
-                            {"messages": updated_messages},
+                            {"messages": [delete_instruction]},
                             config
                         )
                         print("已删除所有消息")
@@ -130,11 +130,10 @@ def main_loop(graph,cleanup_function=None):
                                 if 0 <= index < len(current_messages):
                                     # 使用自定义删除指令删除特定索引的消息
                                     delete_instruction = HumanMessage(content=f"/delete index {index}")
-                                    updated_messages = current_messages + [delete_instruction]
                                     
                                     # 调用图，条件边会自动路由到自定义删除节点
                                     result = graph.invoke(
-                                        {"messages": updated_messages},
+                                        {"messages": [delete_instruction]},
                                         config
                                     )
                                     current_messages = result["messages"]
@@ -148,9 +147,8 @@ def main_loop(graph,cleanup_function=None):
                 
                 # 进行对话
                 user_input = input("请输入对话文本: ")
-                # 将新消息添加到现有消息列表中
-                updated_messages = current_messages + [HumanMessage(content=user_input)]
-                input_state = State(messages=updated_messages)
+                # 只提交新消息，归约器会追加到现有消息列表之后
+                input_state = State(messages=[HumanMessage(content=user_input)])
             
                 # 使用流式传输处理对话响应
                 print("AI响应:")
@@ -207,8 +205,7 @@ def main_loop(graph,cleanup_function=None):
             
             # 使用总结指令触发总结
             summarize_instruction = HumanMessage(content="/summarize")
-            updated_messages = current_messages + [summarize_instruction]
-            input_state = State(messages=updated_messages)
+            input_state = State(messages=[summarize_instruction])
             print(input_state)
             print("正在生成对话总结...")
             # 使用流式传输处理总结响应
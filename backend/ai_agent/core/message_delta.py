@@ -0,0 +1,118 @@
+"""
+消息增量跟踪器
+节点返回的是消息增量（新增消息和 RemoveMessage 删除标记），这里按消息ID维护客户端持有的消息顺序，
+产出新增和删除事件；旧协议需要的完整列表也在这里按同样的归约规则重建
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.messages import RemoveMessage
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+
+from .message_reducer import merge_messages, message_keys
+
+
+class MessageDeltaTracker:
+    """按会话流跟踪已推送的消息，生成增量事件"""
+
+    def __init__(self, serializer: Callable[[Any], Any], initial_messages: Optional[List[Any]] = None):
+        """
+        Args:
+            serializer: 消息序列化函数
+            initial_messages: 客户端已持有的消息列表（请求开始前的状态）
+        """
+        self._serializer = serializer
+        self._keys: List[str] = message_keys(initial_messages or [])
+        self.seq = 0
+
+    @property
+    def message_count(self) -> int:
+        return len(self._keys)
+
+    def next_seq(self) -> int:
+        """分配下一个事件序号"""
+        self.seq += 1
+        return self.seq
+
+    def snapshot(self, messages: List[Any]) -> Dict[str, Any]:
+        """生成完整快照事件，客户端据此重建消息列表"""
+        self._keys = message_keys(messages)
+        return {
+            'type': 'snapshot',
+            'seq': self.next_seq(),
+            'messages': [
+                {'id': key, 'message': self._serializer(msg)}
+                for key, msg in zip(self._keys, messages)
+            ],
+        }
+
+    def apply(self, node: str, updates: List[Any]) -> Dict[str, Any]:
+        """应用节点返回的消息增量，生成增量事件
+
+        Args:
+            node: 产生更新的节点名称
+            updates: 节点返回的新增消息和删除标记
+        """
+        added = []
+        removed = []
+        for msg in updates or []:
+            msg_id = getattr(msg, 'id', None)
+            if isinstance(msg, RemoveMessage):
+                if msg_id == REMOVE_ALL_MESSAGES:
+                    removed.extend(self._keys)
+                    self._keys = []
+                elif msg_id in self._keys:
+                    self._keys.remove(msg_id)
+                    removed.append(msg_id)
+                continue
+
+            key = str(msg_id) if msg_id else message_keys([msg])[0]
+            if key in self._keys:
+                index = self._keys.index(key)
+            else:
+                index = len(self._keys)
+                self._keys.append(key)
+            added.append({'id': key, 'index': index, 'message': self._serializer(msg)})
+
+        return {
+            'type': 'delta',
+            'seq': self.next_seq(),
+            'node': node,
+            'added': added,
+            'removed': removed,
+            'message_count': len(self._keys),
+        }
+
+    def encode_chunk(self, chunk: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """将 stream_mode="updates" 的一个chunk转换为增量事件列表"""
+        events = []
+        for node, update in chunk.items():
+            if not isinstance(update, dict):
+                # 中断等非状态更新直接透传
+                events.append({'type': 'update', 'seq': self.next_seq(), 'node': node,
+                               'data': self._serializer(update)})
+                continue
+
+            event = self.apply(node, update.get('messages'))
+            values = {k: v for k, v in update.items() if k != 'messages'}
+            if values:
+                event['values'] = self._serializer(values)
+            events.append(event)
+        return events
+
+
+class FullStateRebuilder:
+    """为旧协议重建每次更新后的完整消息列表，保持原有的 chunk 结构"""
+
+    def __init__(self, initial_messages: Optional[List[Any]] = None):
+        self._messages: List[Any] = list(initial_messages or [])
+
+    def rebuild_chunk(self, chunk: Dict[str, Any]) -> Dict[str, Any]:
+        """将增量 chunk 转换为 {节点: {"messages": 完整列表, ...}} 的旧格式"""
+        rebuilt = {}
+        for node, update in chunk.items():
+            if isinstance(update, dict) and 'messages' in update:
+                self._messages = merge_messages(self._messages, update['messages'] or [])
+                update = {**update, 'messages': self._messages}
+            rebuilt[node] = update
+        return rebuilt
@@ -0,0 +1,107 @@
+"""
+消息状态归约器
+State.messages 按消息ID追加、替换和删除，节点只需要返回新增消息或 RemoveMessage 删除标记，
+检查点写入的增量不再随对话长度增长
+"""
+
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import RemoveMessage
+from langgraph.graph.message import REMOVE_ALL_MESSAGES, add_messages
+
+
+def message_key(message: Any, seen: Dict[str, int]) -> str:
+    """获取消息的稳定标识
+
+    优先使用消息ID；旧检查点中没有ID的消息使用 (类型, 内容, tool_call_id) 的哈希加出现次数，
+    同一列表每次计算的结果一致，归约器和流式增量跟踪器据此对齐
+
+    Args:
+        message: LangChain 消息对象
+        seen: 同一列表中已出现的匿名标识计数，用于区分内容相同的消息
+    """
+    msg_id = getattr(message, 'id', None)
+    if msg_id:
+        return str(msg_id)
+
+    content = getattr(message, 'content', '')
+    if not isinstance(content, str):
+        content = repr(content)
+    raw = f"{getattr(message, 'type', '')}\x00{content}\x00{getattr(message, 'tool_call_id', '')}"
+    digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+    count = seen.get(digest, 0)
+    seen[digest] = count + 1
+    return f"anon-{digest}-{count}"
+
+
+def message_keys(messages: List[Any]) -> List[str]:
+    """计算消息列表中每条消息的标识"""
+    seen: Dict[str, int] = {}
+    return [message_key(msg, seen) for msg in messages]
+
+
+def ensure_message_ids(messages: List[Any]) -> List[Any]:
+    """为旧检查点中没有ID的消息补充确定性ID（原地修改并返回原列表）"""
+    if not messages or all(getattr(msg, 'id', None) for msg in messages):
+        return messages
+    for msg, key in zip(messages, message_keys(messages)):
+        if not getattr(msg, 'id', None):
+            msg.id = key
+    return messages
+
+
+def merge_messages(left: List[Any], right: Any) -> List[Any]:
+    """State.messages 的归约函数
+
+    - 新消息按ID追加，ID已存在时原位替换
+    - RemoveMessage(id=...) 删除指定消息，RemoveMessage(id=REMOVE_ALL_MESSAGES) 清空之前的消息
+    - 旧检查点中没有ID的消息先补充确定性ID，之后的删除标记可以准确命中
+    """
+    return add_messages(ensure_message_ids(list(left or [])), right)
+
+
+def remove_messages(messages: List[Any]) -> List[RemoveMessage]:
+    """生成删除指定消息的标记列表"""
+    return [RemoveMessage(id=msg.id) for msg in messages if getattr(msg, 'id', None)]
+
+
+def replace_all_messages(messages: List[Any]) -> List[Any]:
+    """生成用新列表整体替换消息状态的更新（回档等场景使用）"""
+    return [RemoveMessage(id=REMOVE_ALL_MESSAGES)] + list(messages)
+
+
+def plan_message_removal(messages: List[Any], target_ids: Optional[List[str]] = None,
+                         target_indices: Optional[List[int]] = None) -> Tuple[List[RemoveMessage], List[Dict[str, Any]]]:
+    """根据消息ID或索引生成批量删除标记，并给出每个目标的处理结果
+
+    索引和ID都针对同一份消息列表解析，删除之间不会相互影响索引；
+    没有ID的旧消息按 message_key 的确定性标识匹配，与归约器补充的ID一致
+
+    Returns:
+        (删除标记列表, 结果列表)，结果中 status 为 deleted / not_found / duplicate
+    """
+    keys = message_keys(messages)
+    index_of = {key: index for index, key in enumerate(keys)}
+
+    targets: List[Tuple[str, Any, Optional[int]]] = []
+    for msg_id in target_ids or []:
+        targets.append(("id", msg_id, index_of.get(str(msg_id))))
+    for index in target_indices or []:
+        targets.append(("index", index, index if 0 <= index < len(keys) else None))
+
+    removed = set()
+    markers: List[RemoveMessage] = []
+    results: List[Dict[str, Any]] = []
+    for kind, target, index in targets:
+        result = {kind: target, "index": index, "status": "not_found"}
+        if index is not None:
+            result["id"] = keys[index]
+            if index in removed:
+                result["status"] = "duplicate"
+            else:
+                removed.add(index)
+                markers.append(RemoveMessage(id=keys[index]))
+                result["status"] = "deleted"
+        results.append(result)
+    return markers, results
@@ -0,0 +1,414 @@
+"""
+内容寻址消息存储
+SqliteSaver 的每个检查点都包含完整的消息列表，同一章正文会在一个会话里重复存储成百上千次。
+这里把消息拆到 message_store 表中按内容哈希只存一份，检查点只保存有序的哈希列表：
+
+- message_store：(thread_id, hash) -> 序列化后的消息，按会话隔离，删除会话时整体清理
+- checkpoint_message_refs：每个检查点一行，refs 为按顺序拼接的 16 字节哈希
+- 检查点中的 messages 通道写成占位符 MESSAGE_REFS，读取时由 MessageStoreSaver 还原
+
+数据库大小随新增内容线性增长；比较两个检查点的消息差异只需要比较哈希列表。
+已有的内联检查点可以原地转换::
+
+    python -m ai_agent.core.message_store --db checkpoints.db
+"""
+
+import argparse
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langgraph.checkpoint.base import CheckpointTuple
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from .checkpoint_compression import CompressedSerializer, create_checkpoint_serializer, database_path
+
+logger = logging.getLogger(__name__)
+
+# 检查点中 messages 通道的占位符，实际消息列表保存在 checkpoint_message_refs 中
+MESSAGE_REFS = "__message_refs__"
+
+# 消息状态所在的通道
+MESSAGES_CHANNEL = "messages"
+
+HASH_SIZE = 16
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS message_store (
+    thread_id TEXT NOT NULL,
+    hash BLOB NOT NULL,
+    message_id TEXT,
+    message_type TEXT,
+    type TEXT NOT NULL,
+    blob BLOB NOT NULL,
+    PRIMARY KEY (thread_id, hash)
+);
+CREATE TABLE IF NOT EXISTS checkpoint_message_refs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    refs BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TRIGGER IF NOT EXISTS trg_message_refs_checkpoint_delete AFTER DELETE ON checkpoints
+BEGIN
+    DELETE FROM checkpoint_message_refs
+    WHERE thread_id = OLD.thread_id AND checkpoint_ns = OLD.checkpoint_ns AND checkpoint_id = OLD.checkpoint_id;
+END;
+"""
+
+
+def ensure_message_store(conn: sqlite3.Connection):
+    """创建消息存储表和触发器（依赖 checkpoints 表）"""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'checkpoints'").fetchone() is None:
+        SqliteSaver(conn).setup()
+    conn.executescript(_SCHEMA)
+
+
+def split_refs(refs: bytes) -> List[bytes]:
+    """把拼接的哈希列表拆分为单个哈希"""
+    return [refs[i:i + HASH_SIZE] for i in range(0, len(refs), HASH_SIZE)]
+
+
+def _encode_message(serde, message: Any) -> Tuple[bytes, str, bytes]:
+    """序列化单条消息，返回 (内容哈希, type, 存储数据)
+
+    哈希基于未压缩的序列化结果，压缩配置变化不影响去重
+    """
+    if isinstance(serde, CompressedSerializer):
+        type_, raw = serde.serde.dumps_typed(message)
+        stored_type, stored = serde.compress(type_, raw)
+    else:
+        type_, raw = serde.dumps_typed(message)
+        stored_type, stored = type_, raw
+    digest = hashlib.blake2b(type_.encode("utf-8") + b"\x00" + raw, digest_size=HASH_SIZE).digest()
+    return digest, stored_type, stored
+
+
+class MessageDigestCache:
+    """消息对象到内容哈希的缓存，按会话保存，最近使用的 max_threads 个会话
+
+    一次运行中每个超步的检查点共享同一批消息对象，归约器按ID整体替换消息而不会原地修改，
+    因此同一ID对应的仍是同一个对象（is 比较）时可以直接复用哈希，每次写入只需序列化新增或被替换的消息。
+    每个ID最多保留 MAX_OBJECTS 个对象：上次写入的对象和之后读取检查点得到的对象（下一次运行从读取的对象继续）
+    """
+
+    MAX_OBJECTS = 2
+
+    def __init__(self, max_threads: int = 64):
+        self.max_threads = max_threads
+        self._threads: "OrderedDict[str, Dict[str, List[Tuple[Any, bytes]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, thread_id: str, messages: List[Any]) -> List[Optional[bytes]]:
+        """返回每条消息缓存的哈希，未命中为 None"""
+        digests: List[Optional[bytes]] = []
+        with self._lock:
+            entries = self._threads.get(thread_id)
+            if entries is None:
+                return [None] * len(messages)
+            self._threads.move_to_end(thread_id)
+            for message in messages:
+                digest = None
+                for cached, cached_digest in entries.get(getattr(message, "id", None) or "", ()):
+                    if cached is message:
+                        digest = cached_digest
+                        break
+                digests.append(digest)
+        return digests
+
+    def remember(self, thread_id: str, messages: List[Any], digests: List[bytes], replace: bool = True):
+        """记录消息的哈希
+
+        Args:
+            replace: True 时用这批消息替换会话的缓存（写入检查点）；False 时追加到已有对象之前（读取检查点）
+        """
+        with self._lock:
+            entries = None if replace else self._threads.get(thread_id)
+            if entries is None:
+                entries = self._threads[thread_id] = {}
+            for message, digest in zip(messages, digests):
+                msg_id = getattr(message, "id", None)
+                if not msg_id:
+                    continue
+                if replace:
+                    entries[msg_id] = [(message, digest)]
+                else:
+                    entries[msg_id] = [(message, digest)] + entries.get(msg_id, [])[:self.MAX_OBJECTS - 1]
+            self._threads.move_to_end(thread_id)
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+
+    def discard(self, thread_id: str):
+        with self._lock:
+            self._threads.pop(thread_id, None)
+
+
+def _existing_digests(cur, thread_id: str, digests: Iterable[bytes]) -> set:
+    """查询已存在于 message_store 中的哈希"""
+    digests = list(digests)
+    existing = set()
+    # 分批查询，避免超过 SQLite 参数数量限制
+    for start in range(0, len(digests), 500):
+        batch = digests[start:start + 500]
+        placeholders = ",".join("?" for _ in batch)
+        existing.update(row[0] for row in cur.execute(
+            f"SELECT hash FROM message_store WHERE thread_id = ? AND hash IN ({placeholders})",
+            (thread_id, *batch),
+        ).fetchall())
+    return existing
+
+
+def store_messages(cur, serde, thread_id: str, messages: List[Any],
+                   digest_cache: Optional[MessageDigestCache] = None) -> bytes:
+    """写入消息（已存在的内容跳过），返回拼接的哈希列表
+
+    Args:
+        digest_cache: 消息哈希缓存，命中且数据库中仍有对应记录的消息不再序列化
+            （记录可能已被清理或随失败的事务回滚，因此仍需确认存在）
+    """
+    digests = digest_cache.lookup(thread_id, messages) if digest_cache is not None else [None] * len(messages)
+    known = _existing_digests(cur, thread_id, {d for d in digests if d is not None})
+    rows = []
+    for index, message in enumerate(messages):
+        if digests[index] in known:
+            continue
+        digest, type_, blob = _encode_message(serde, message)
+        digests[index] = digest
+        rows.append((thread_id, digest, getattr(message, "id", None), getattr(message, "type", None), type_, blob))
+    if rows:
+        cur.executemany(
+            "INSERT OR IGNORE INTO message_store (thread_id, hash, message_id, message_type, type, blob) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+    if digest_cache is not None:
+        digest_cache.remember(thread_id, messages, digests)
+    return b"".join(digests)
+
+
+def load_refs(conn_or_cur, thread_id: str, checkpoint_id: str, checkpoint_ns: str = "") -> Optional[bytes]:
+    """读取检查点的哈希列表，没有记录（内联存储的旧检查点）时返回 None"""
+    row = conn_or_cur.execute(
+        "SELECT refs FROM checkpoint_message_refs WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+        (thread_id, checkpoint_ns, checkpoint_id),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def load_messages(conn_or_cur, serde, thread_id: str, digests: Iterable[bytes],
+                  cache: Optional[Dict[bytes, Any]] = None) -> List[Any]:
+    """按哈希顺序还原消息列表
+
+    Args:
+        cache: 哈希到消息对象的缓存，读取多个检查点时复用，同一条消息只反序列化一次
+    """
+    digests = list(digests)
+    cache = {} if cache is None else cache
+    missing = list({d for d in digests if d not in cache})
+    # 分批查询，避免超过 SQLite 参数数量限制
+    for start in range(0, len(missing), 500):
+        batch = missing[start:start + 500]
+        placeholders = ",".join("?" for _ in batch)
+        for digest, type_, blob in conn_or_cur.execute(
+            f"SELECT hash, type, blob FROM message_store WHERE thread_id = ? AND hash IN ({placeholders})",
+            (thread_id, *batch),
+        ).fetchall():
+            cache[digest] = serde.loads_typed((type_, blob))
+    absent = [d.hex() for d in digests if d not in cache]
+    if absent:
+        raise ValueError(f"会话 {thread_id} 缺少 {len(absent)} 条消息记录: {absent[:3]}")
+    return [cache[d] for d in digests]
+
+
+def hydrate_checkpoint(conn_or_cur, serde, thread_id: str, checkpoint_ns: str, checkpoint: Dict[str, Any],
+                       cache: Optional[Dict[bytes, Any]] = None) -> Dict[str, Any]:
+    """把检查点中的消息占位符还原为消息列表（原地修改并返回）"""
+    channel_values = checkpoint.get("channel_values") or {}
+    if channel_values.get(MESSAGES_CHANNEL) != MESSAGE_REFS:
+        return checkpoint
+    refs = load_refs(conn_or_cur, thread_id, checkpoint["id"], checkpoint_ns)
+    if refs is None:
+        raise ValueError(f"检查点 {thread_id}/{checkpoint['id']} 缺少消息引用")
+    channel_values[MESSAGES_CHANNEL] = load_messages(conn_or_cur, serde, thread_id, split_refs(refs), cache)
+    return checkpoint
+
+
+def diff_refs(old_refs: bytes, new_refs: bytes) -> Dict[str, Any]:
+    """比较两个检查点的消息哈希列表
+
+    Returns:
+        removed: 旧列表中不再存在的哈希；added: 新列表中新增的 (位置, 哈希)；common_prefix: 相同前缀长度
+    """
+    old, new = split_refs(old_refs), split_refs(new_refs)
+    prefix = 0
+    while prefix < min(len(old), len(new)) and old[prefix] == new[prefix]:
+        prefix += 1
+    new_set, old_set = set(new), set(old)
+    return {
+        "common_prefix": prefix,
+        "removed": [d for d in old if d not in new_set],
+        "added": [(i, d) for i, d in enumerate(new) if d not in old_set],
+        "old_count": len(old),
+        "new_count": len(new),
+    }
+
+
+def gc_message_store(conn: sqlite3.Connection, thread_ids: Optional[Iterable[str]] = None) -> int:
+    """删除不再被任何检查点引用的消息
+
+    Args:
+        thread_ids: 只清理这些会话，None 表示全部会话
+
+    Returns:
+        删除的消息数量
+    """
+    if thread_ids is None:
+        thread_ids = [row[0] for row in conn.execute("SELECT DISTINCT thread_id FROM message_store").fetchall()]
+    deleted = 0
+    for thread_id in thread_ids:
+        # 在写事务中统计和删除，避免与并发写入的新引用交错
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            referenced = set()
+            for (refs,) in conn.execute("SELECT refs FROM checkpoint_message_refs WHERE thread_id = ?", (thread_id,)):
+                referenced.update(split_refs(refs))
+            stored = [row[0] for row in conn.execute("SELECT hash FROM message_store WHERE thread_id = ?", (thread_id,))]
+            orphans = [(thread_id, digest) for digest in stored if digest not in referenced]
+            conn.executemany("DELETE FROM message_store WHERE thread_id = ? AND hash = ?", orphans)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        deleted += len(orphans)
+    return deleted
+
+
+class MessageStoreSaver(SqliteSaver):
+    """消息按内容哈希单独存储的 SqliteSaver，检查点只保存消息引用"""
+
+    def __init__(self, conn: sqlite3.Connection, *, serde=None):
+        super().__init__(conn, serde=serde or create_checkpoint_serializer(db_path=database_path(conn)))
+        self.digest_cache = MessageDigestCache()
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        ensure_message_store(self.conn)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        messages = checkpoint["channel_values"].get(MESSAGES_CHANNEL)
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        if not isinstance(messages, list) or checkpoint_ns:
+            return super().put(config, checkpoint, metadata, new_versions)
+
+        thread_id = str(config["configurable"]["thread_id"])
+        # 先写消息和引用，再写检查点，检查点存在时引用一定完整
+        with self.cursor() as cur:
+            refs = store_messages(cur, self.serde, thread_id, messages, self.digest_cache)
+            cur.execute(
+                "INSERT OR REPLACE INTO checkpoint_message_refs (thread_id, checkpoint_ns, checkpoint_id, refs) "
+                "VALUES (?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], refs),
+            )
+        stored = {**checkpoint, "channel_values": {**checkpoint["channel_values"], MESSAGES_CHANNEL: MESSAGE_REFS}}
+        return super().put(config, stored, metadata, new_versions)
+
+    def _hydrate(self, checkpoint_tuple: Optional[CheckpointTuple],
+                 cache: Optional[Dict[bytes, Any]] = None) -> Optional[CheckpointTuple]:
+        if checkpoint_tuple is None:
+            return None
+        configurable = checkpoint_tuple.config["configurable"]
+        with self.cursor(transaction=False) as cur:
+            hydrate_checkpoint(cur, self.serde, str(configurable["thread_id"]),
+                               configurable.get("checkpoint_ns", ""), checkpoint_tuple.checkpoint, cache)
+        return checkpoint_tuple
+
+    def get_tuple(self, config) -> Optional[CheckpointTuple]:
+        cache: Dict[bytes, Any] = {}
+        checkpoint_tuple = self._hydrate(super().get_tuple(config), cache)
+        if checkpoint_tuple is not None and cache:
+            # 运行从这个检查点继续时，消息对象不变，下一次写入无需重新序列化
+            messages = checkpoint_tuple.checkpoint["channel_values"][MESSAGES_CHANNEL]
+            digest_of = {id(message): digest for digest, message in cache.items()}
+            self.digest_cache.remember(
+                str(checkpoint_tuple.config["configurable"]["thread_id"]),
+                messages, [digest_of[id(message)] for message in messages], replace=False,
+            )
+        return checkpoint_tuple
+
+    def list(self, config, *, filter=None, before=None, limit=None) -> Iterator[CheckpointTuple]:
+        # 父类在迭代期间持有连接锁，先取出全部结果再还原消息；各检查点共享同一份消息缓存
+        tuples = list(super().list(config, filter=filter, before=before, limit=limit))
+        cache: Dict[bytes, Any] = {}
+        for checkpoint_tuple in tuples:
+            yield self._hydrate(checkpoint_tuple, cache)
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM message_store WHERE thread_id = ?", (str(thread_id),))
+        self.digest_cache.discard(str(thread_id))
+
+
+def normalize_database(conn: sqlite3.Connection, serde=None) -> Dict[str, int]:
+    """把内联保存消息的旧检查点转换为引用形式
+
+    Returns:
+        统计信息：转换的检查点数量和转换前后字节数
+    """
+    serde = serde or create_checkpoint_serializer(db_path=database_path(conn))
+    ensure_message_store(conn)
+    stats = {"checkpoints": 0, "bytes_before": 0, "bytes_after": 0}
+    keys = conn.execute(
+        "SELECT thread_id, checkpoint_id FROM checkpoints WHERE checkpoint_ns = '' ORDER BY thread_id, checkpoint_id"
+    ).fetchall()
+    for thread_id, checkpoint_id in keys:
+        type_, blob = conn.execute(
+            "SELECT type, checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = '' AND checkpoint_id = ?",
+            (thread_id, checkpoint_id),
+        ).fetchone()
+        checkpoint = serde.loads_typed((type_, blob))
+        messages = (checkpoint.get("channel_values") or {}).get(MESSAGES_CHANNEL)
+        if not isinstance(messages, list):
+            continue
+        checkpoint["channel_values"][MESSAGES_CHANNEL] = MESSAGE_REFS
+        new_type, new_blob = serde.dumps_typed(checkpoint)
+        with conn:
+            cur = conn.cursor()
+            refs = store_messages(cur, serde, thread_id, messages)
+            cur.execute(
+                "INSERT OR REPLACE INTO checkpoint_message_refs (thread_id, checkpoint_ns, checkpoint_id, refs) "
+                "VALUES (?, '', ?, ?)",
+                (thread_id, checkpoint_id, refs),
+            )
+            cur.execute(
+                "UPDATE checkpoints SET type = ?, checkpoint = ? WHERE thread_id = ? AND checkpoint_ns = '' AND checkpoint_id = ?",
+                (new_type, new_blob, thread_id, checkpoint_id),
+            )
+        stats["checkpoints"] += 1
+        stats["bytes_before"] += len(blob)
+        stats["bytes_after"] += len(new_blob)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把内联消息的检查点转换为内容寻址存储")
+    parser.add_argument("--db", default="checkpoints.db")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        stats = normalize_database(conn)
+        print(f"转换 {stats['checkpoints']} 个检查点，{stats['bytes_before'] / 1024 / 1024:.1f} MB -> "
+              f"{stats['bytes_after'] / 1024 / 1024:.1f} MB（消息另存于 message_store）")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
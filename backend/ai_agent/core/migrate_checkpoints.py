@@ -0,0 +1,91 @@
+"""
+检查点消息ID迁移工具
+
+State.messages 改为按消息ID归约后，旧 checkpoints.db 中的消息没有ID。归约器会在会话下一次写入时
+自动补充确定性ID（惰性迁移），这里提供一次性迁移所有会话的入口，迁移后删除和回档可以直接按ID定位消息。
+
+运行方式（在 backend 目录下）::
+
+    python -m ai_agent.core.migrate_checkpoints --mode outline
+"""
+
+import argparse
+import os
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+
+def _list_thread_ids(db_path: str) -> List[str]:
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT DISTINCT thread_id FROM checkpoints')
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def migrate_message_ids(graph, db_path: str = "checkpoints.db",
+                        thread_ids: Optional[List[str]] = None,
+                        dry_run: bool = False) -> Dict[str, Any]:
+    """为所有会话最新检查点中缺少ID的消息补充ID
+
+    写入一个空的消息增量，由归约器补充确定性ID并生成新的检查点；历史检查点保持不变。
+    处于中断等待中的会话跳过，它们会在恢复执行时由归约器惰性迁移。
+
+    Args:
+        graph: 使用同一检查点存储的图实例
+        db_path: 检查点数据库路径
+        thread_ids: 只迁移指定会话，默认全部
+        dry_run: 只统计不写入
+
+    Returns:
+        迁移统计
+    """
+    if not os.path.exists(db_path):
+        print("数据库文件不存在")
+        return {"migrated": [], "skipped_interrupted": [], "up_to_date": 0}
+
+    result = {"migrated": [], "skipped_interrupted": [], "up_to_date": 0}
+    for thread_id in thread_ids or _list_thread_ids(db_path):
+        config = {"configurable": {"thread_id": thread_id}}
+        state = graph.get_state(config)
+        messages = state.values.get("messages", [])
+        missing = sum(1 for msg in messages if not getattr(msg, 'id', None))
+
+        if missing == 0:
+            result["up_to_date"] += 1
+            continue
+        if state.next:
+            print(f"  - 会话 {thread_id} 正在等待中断响应，跳过（恢复后自动迁移）")
+            result["skipped_interrupted"].append(thread_id)
+            continue
+
+        if not dry_run:
+            # 以删除节点的身份写入空增量：该节点后续直接结束，不会触发模型调用
+            graph.update_state(config, {"messages": []}, as_node="custom_delete")
+        print(f"  - 会话 {thread_id}: {missing}/{len(messages)} 条消息补充ID")
+        result["migrated"].append(thread_id)
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="为旧检查点中的消息补充ID")
+    parser.add_argument("--mode", default=None, help="用于构建图实例的模式")
+    parser.add_argument("--db", default="checkpoints.db")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    from ai_agent.history_api import create_graph, close_db_connection
+    graph = create_graph(args.mode)
+    try:
+        result = migrate_message_ids(graph, args.db, dry_run=args.dry_run)
+    finally:
+        close_db_connection()
+    print(f"迁移完成: {len(result['migrated'])} 个会话已迁移，"
+          f"{len(result['skipped_interrupted'])} 个会话等待中断响应，{result['up_to_date']} 个会话无需迁移")
+
+
+if __name__ == "__main__":
+    main()
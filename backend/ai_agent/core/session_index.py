@@ -0,0 +1,247 @@
+"""
+会话索引表
+在 checkpoints.db 中维护 sessions 表（每个会话一行），会话列表接口直接查询该表，
+不再逐个会话统计和解码检查点。
+
+- checkpoint_count 由 checkpoints 表上的触发器维护，任何删除路径（删除会话、清理工具、保留策略）都会同步
+- created_at / last_accessed / preview / mode 在写入检查点时由 SessionIndexedSaver 更新
+- 已有数据库首次建表时自动回填，也可以手动重建::
+
+    python -m ai_agent.core.session_index --db checkpoints.db
+"""
+
+import argparse
+import logging
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from .checkpoint_compression import create_checkpoint_serializer, database_path
+from .message_store import MessageStoreSaver, hydrate_checkpoint
+
+logger = logging.getLogger(__name__)
+
+# 预览文本最大长度
+PREVIEW_LENGTH = 100
+
+# 会话列表允许的排序字段
+SESSION_SORT_FIELDS = ("last_accessed", "created_at", "checkpoint_count", "thread_id")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    thread_id TEXT PRIMARY KEY,
+    created_at TEXT,
+    last_accessed TEXT,
+    checkpoint_count INTEGER NOT NULL DEFAULT 0,
+    preview TEXT,
+    mode TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_last_accessed ON sessions(last_accessed);
+CREATE INDEX IF NOT EXISTS idx_sessions_created_at ON sessions(created_at);
+CREATE TRIGGER IF NOT EXISTS trg_sessions_checkpoint_insert AFTER INSERT ON checkpoints
+WHEN NEW.checkpoint_ns = ''
+BEGIN
+    INSERT INTO sessions (thread_id, checkpoint_count) VALUES (NEW.thread_id, 1)
+    ON CONFLICT(thread_id) DO UPDATE SET checkpoint_count = checkpoint_count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_sessions_checkpoint_delete AFTER DELETE ON checkpoints
+WHEN OLD.checkpoint_ns = ''
+BEGIN
+    UPDATE sessions SET checkpoint_count = checkpoint_count - 1 WHERE thread_id = OLD.thread_id;
+    DELETE FROM sessions WHERE thread_id = OLD.thread_id AND checkpoint_count <= 0;
+END;
+"""
+
+
+def _table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone()
+    return row is not None
+
+
+def extract_preview(checkpoint: Dict[str, Any]) -> Optional[str]:
+    """从检查点中提取最后一条有文本内容的消息作为预览"""
+    messages = (checkpoint.get("channel_values") or {}).get("messages") or []
+    for msg in reversed(messages):
+        content = msg.get("content") if isinstance(msg, dict) else getattr(msg, "content", None)
+        if isinstance(content, str) and content.strip():
+            if len(content) > PREVIEW_LENGTH:
+                return content[:PREVIEW_LENGTH] + "..."
+            return content
+    return None
+
+
+def ensure_session_index(conn: sqlite3.Connection, serde=None) -> bool:
+    """创建会话索引表和触发器，表首次创建且已有检查点时自动回填
+
+    Returns:
+        是否执行了回填
+    """
+    if not _table_exists(conn, "checkpoints"):
+        # 新数据库：先由 SqliteSaver 创建检查点表，触发器依赖它
+        SqliteSaver(conn).setup()
+
+    existed = _table_exists(conn, "sessions")
+    conn.executescript(_SCHEMA)
+    if existed:
+        return False
+
+    has_checkpoints = conn.execute("SELECT 1 FROM checkpoints LIMIT 1").fetchone() is not None
+    if has_checkpoints:
+        backfill_sessions(conn, serde)
+        return True
+    return False
+
+
+def backfill_sessions(conn: sqlite3.Connection, serde=None) -> int:
+    """根据现有检查点重建会话索引表
+
+    每个会话只解码最早和最新两个检查点，用于读取时间戳和预览
+
+    Returns:
+        回填的会话数量
+    """
+    serde = serde or create_checkpoint_serializer(db_path=database_path(conn))
+    rows = conn.execute("""
+        SELECT thread_id, COUNT(*), MIN(checkpoint_id), MAX(checkpoint_id)
+        FROM checkpoints
+        WHERE checkpoint_ns = ''
+        GROUP BY thread_id
+    """).fetchall()
+
+    def load(thread_id: str, checkpoint_id: str) -> Dict[str, Any]:
+        row = conn.execute(
+            "SELECT type, checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = '' AND checkpoint_id = ?",
+            (thread_id, checkpoint_id),
+        ).fetchone()
+        try:
+            return hydrate_checkpoint(conn, serde, thread_id, "", serde.loads_typed((row[0], row[1])))
+        except Exception as e:
+            logger.warning(f"回填会话索引时解码检查点失败 {thread_id}/{checkpoint_id}: {e}")
+            return {}
+
+    entries: List[Tuple] = []
+    for thread_id, count, first_id, last_id in rows:
+        first = load(thread_id, first_id)
+        last = first if last_id == first_id else load(thread_id, last_id)
+        entries.append((thread_id, first.get("ts"), last.get("ts"), count, extract_preview(last)))
+
+    with conn:
+        conn.execute("DELETE FROM sessions")
+        conn.executemany(
+            "INSERT INTO sessions (thread_id, created_at, last_accessed, checkpoint_count, preview) VALUES (?, ?, ?, ?, ?)",
+            entries,
+        )
+    logger.info(f"会话索引回填完成: {len(entries)} 个会话")
+    return len(entries)
+
+
+def query_sessions(conn: sqlite3.Connection, limit: Optional[int] = None, offset: int = 0,
+                   sort_by: str = "last_accessed", order: str = "desc") -> Tuple[int, List[Dict[str, Any]]]:
+    """分页查询会话列表
+
+    Args:
+        limit: 每页数量，None 表示返回全部
+        offset: 偏移量
+        sort_by: 排序字段，见 SESSION_SORT_FIELDS
+        order: asc 或 desc
+
+    Returns:
+        (会话总数, 当前页会话列表)
+    """
+    if sort_by not in SESSION_SORT_FIELDS:
+        raise ValueError(f"不支持的排序字段: {sort_by}")
+    direction = "ASC" if order.lower() == "asc" else "DESC"
+
+    total = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+    rows = conn.execute(
+        f"""
+        SELECT thread_id, created_at, last_accessed, checkpoint_count, preview, mode
+        FROM sessions
+        ORDER BY {sort_by} {direction}, thread_id {direction}
+        LIMIT ? OFFSET ?
+        """,
+        (limit if limit is not None else -1, offset),
+    ).fetchall()
+    return total, [_row_to_dict(row) for row in rows]
+
+
+def get_session_entry(conn: sqlite3.Connection, thread_id: str) -> Optional[Dict[str, Any]]:
+    """查询单个会话的索引信息"""
+    row = conn.execute(
+        "SELECT thread_id, created_at, last_accessed, checkpoint_count, preview, mode FROM sessions WHERE thread_id = ?",
+        (thread_id,),
+    ).fetchone()
+    return _row_to_dict(row) if row else None
+
+
+def _row_to_dict(row) -> Dict[str, Any]:
+    return {
+        "thread_id": row[0],
+        "created_at": row[1],
+        "last_accessed": row[2],
+        "checkpoint_count": row[3],
+        "preview": row[4],
+        "mode": row[5],
+    }
+
+
+class SessionIndexedSaver(MessageStoreSaver):
+    """写入检查点时同步更新会话索引表的 SqliteSaver（消息按内容寻址存储）"""
+
+    def __init__(self, conn: sqlite3.Connection, *, serde=None, mode: Optional[str] = None):
+        # 默认使用压缩序列化器，旧的未压缩检查点照常读取
+        super().__init__(conn, serde=serde or create_checkpoint_serializer(db_path=database_path(conn)))
+        self.mode = mode
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        ensure_session_index(self.conn, self.serde)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        if config["configurable"].get("checkpoint_ns", ""):
+            return next_config
+
+        # checkpoint_count 已由触发器更新，这里补充时间戳、预览和模式
+        with self.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE sessions
+                SET created_at = COALESCE(created_at, ?),
+                    last_accessed = ?,
+                    preview = COALESCE(?, preview),
+                    mode = COALESCE(?, mode)
+                WHERE thread_id = ?
+                """,
+                (
+                    checkpoint["ts"],
+                    checkpoint["ts"],
+                    extract_preview(checkpoint),
+                    self.mode,
+                    str(config["configurable"]["thread_id"]),
+                ),
+            )
+        return next_config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="重建会话索引表")
+    parser.add_argument("--db", default="checkpoints.db")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        ensure_session_index(conn)
+        count = backfill_sessions(conn)
+        print(f"会话索引重建完成: {count} 个会话")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
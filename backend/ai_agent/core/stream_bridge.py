@@ -0,0 +1,136 @@
+"""
+图执行桥接器
+在有界线程池中运行同步的图调用，并把流式结果异步地交还给事件循环，避免阻塞 uvicorn
+
+同一会话的图执行（对话、回档）和后台写入（自动总结）通过 thread_lock(thread_id) 串行化，
+"读取状态 -> 更新状态" 之间不会插入另一轮对话
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 工作线程结束标记
+_DONE = object()
+
+
+class _StreamError:
+    """工作线程中抛出的异常，交给事件循环侧重新抛出"""
+
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+class GraphStreamBridge:
+    """同步图执行与异步SSE生成器之间的桥接"""
+
+    def __init__(self, max_workers: int = 8):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="graph-worker")
+        self._active = 0
+        self._threads: Dict[str, int] = {}  # thread_id -> 正在执行的图调用数量
+        self._lock = threading.Lock()
+        # thread_id -> 会话锁，没有持有者时自动回收
+        self._thread_locks: "weakref.WeakValueDictionary[str, threading.RLock]" = weakref.WeakValueDictionary()
+
+    def _track(self, delta: int, thread_id: Optional[str] = None):
+        with self._lock:
+            self._active += delta
+            if thread_id is not None:
+                count = self._threads.get(thread_id, 0) + delta
+                if count > 0:
+                    self._threads[thread_id] = count
+                else:
+                    self._threads.pop(thread_id, None)
+
+    def thread_lock(self, thread_id: str) -> threading.RLock:
+        """获取会话锁：持有期间同一会话的其他图执行和状态更新等待"""
+        with self._lock:
+            lock = self._thread_locks.get(thread_id)
+            if lock is None:
+                lock = threading.RLock()
+                self._thread_locks[thread_id] = lock
+            return lock
+
+    def is_thread_active(self, thread_id: str) -> bool:
+        """会话是否有正在执行的图调用"""
+        with self._lock:
+            return thread_id in self._threads
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """在工作线程中执行同步调用（get_state、create_graph 等）"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def stream(self, graph, graph_input, config: Dict[str, Any], **stream_kwargs) -> AsyncIterator[Any]:
+        """在工作线程中运行 graph.stream，并逐块异步产出结果
+
+        Args:
+            graph: 已编译的图实例
+            graph_input: 图输入（状态或 Command）
+            config: 运行配置
+            stream_kwargs: 透传给 graph.stream 的参数，如 stream_mode
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def publish(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # 事件循环已关闭，客户端不会再读取
+                cancelled.set()
+
+        thread_id = (config.get("configurable") or {}).get("thread_id")
+        thread_id = str(thread_id) if thread_id is not None else None
+
+        def worker():
+            self._track(1, thread_id)
+            lock = self.thread_lock(thread_id) if thread_id is not None else None
+            try:
+                if lock is not None:
+                    lock.acquire()
+                try:
+                    for chunk in graph.stream(graph_input, config, **stream_kwargs):
+                        if cancelled.is_set():
+                            logger.info("客户端已断开，停止推送图执行结果")
+                            break
+                        publish(chunk)
+                finally:
+                    if lock is not None:
+                        lock.release()
+            except BaseException as e:
+                publish(_StreamError(e))
+            finally:
+                self._track(-1, thread_id)
+                publish(_DONE)
+
+        future = loop.run_in_executor(self._executor, worker)
+        try:
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, _StreamError):
+                    raise item.exc
+                yield item
+        finally:
+            cancelled.set()
+            if future.done():
+                future.result()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取线程池使用情况"""
+        with self._lock:
+            return {"max_workers": self.max_workers, "active_streams": self._active}
+
+
+# 创建全局桥接器实例
+graph_stream_bridge = GraphStreamBridge()
@@ -15,7 +15,10 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from ..config import ai_settings
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 from file.utils.file_tree_builder import file_tree_builder
+from file.managers.file_tree_index import file_tree_index
+from file.utils.async_fs import async_fs
 from config import settings
+from services.config_store import config_store
 
 logger = logging.getLogger(__name__)
 
@@ -25,9 +28,9 @@ class SystemPromptBuilder:
     
     def __init__(self):
         self.novel_dir = settings.NOVEL_DIR
-        self.file_tree_cache = None
-        self.last_cache_time = None
-        self.cache_timeout = 30  # 缓存30秒
+        # 格式化后的文件树文本，按文件树版本号缓存
+        self._tree_text_cache: Optional[str] = None
+        self._tree_text_version: Optional[int] = None
         
     def get_novel_path(self) -> str:
         """获取novel目录路径
@@ -38,15 +41,9 @@ class SystemPromptBuilder:
         return self.novel_dir
     
     def _load_store_config(self) -> Dict[str, Any]:
-        """加载存储配置"""
+        """加载存储配置（共享快照，只读）"""
         try:
-            config_path = Path(__file__).parent.parent.parent / "config" / "store.json"
-            if not config_path.exists():
-                logger.warning("配置文件不存在，返回空配置")
-                return {}
-            
-            with open(config_path, "r", encoding="utf-8") as f:
-                return json.load(f)
+            return config_store.snapshot()
         except Exception as e:
             logger.error(f"加载存储配置失败: {e}")
             return {}
@@ -123,10 +120,18 @@ class SystemPromptBuilder:
                 logger.error(f"获取文件树失败: {file_tree_result.get('error', '未知错误')}")
                 return "[当前工作区文件结构 (novel 目录)]:\n(获取文件树失败)"
             
+            # 文件树没有变化时直接使用上次格式化的文本
+            version = file_tree_result.get("version")
+            if version is not None and version == self._tree_text_version:
+                return self._tree_text_cache
+            
             # 格式化文件树为文本
             tree_text = self._format_tree_to_text(file_tree_result.get("tree", []))
+            content = f"[当前工作区文件结构 (novel 目录)]:\n{tree_text}"
+            self._tree_text_cache = content
+            self._tree_text_version = version
             
-            return f"[当前工作区文件结构 (novel 目录)]:\n{tree_text}"
+            return content
             
         except Exception as e:
             logger.error(f"获取文件树内容时出错: {e}")
@@ -210,18 +215,9 @@ class SystemPromptBuilder:
     async def refresh_file_tree_cache(self):
         """刷新文件树缓存"""
         try:
-            # 获取novel目录路径
-            novel_path = self.get_novel_path()
-            
-            # 重新获取文件树
-            file_tree_result = await file_tree_builder.get_file_tree(novel_path)
-            
-            if file_tree_result.get("success", False):
-                self.file_tree_cache = file_tree_result.get("tree", [])
-                self.last_cache_time = os.path.getmtime(novel_path) if os.path.exists(novel_path) else None
-                logger.info("文件树缓存已刷新")
-            else:
-                logger.error(f"刷新文件树缓存失败: {file_tree_result.get('error', '未知错误')}")
+            # 重新完整扫描一次，版本号变化后下次构建提示词时重新格式化
+            await async_fs.run("file_tree_reload", file_tree_index.load, key=file_tree_index.root)
+            logger.info("文件树缓存已刷新")
                 
         except Exception as e:
             logger.error(f"刷新文件树缓存时出错: {e}")
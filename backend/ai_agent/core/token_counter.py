@@ -0,0 +1,235 @@
+"""
+消息 token 计数缓存
+call_llm 在每次调用模型前（工具循环中每一步都会调用）都要裁剪历史，这里为每条消息只估算一次 token 数，
+按消息ID和内容哈希缓存，裁剪时从最新消息向前累加，只访问最终保留的那部分消息。
+
+- 中文按字符计数：chars/4 的通用估算会把中文低估数倍，这里对 CJK 字符和其他字符分别计数
+  （默认值参考 DeepSeek 的说明：1 个中文字符约 0.6 token，1 个英文字符约 0.3 token）
+- 模型返回的 usage（input_tokens）用于在线校准估算值，校准系数限制在合理范围内。
+  input_tokens 还包含工具定义和提供商的消息框架，这部分对同一个图是固定的，因此用同一调用环境下
+  相邻两次调用的差值（Δinput_tokens / Δ估算值）校准，固定开销相互抵消
+- 配置见 store.json 的 tokenEstimator（cjkTokensPerChar、charsPerToken、extraTokensPerMessage、calibrate）
+"""
+
+import math
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple, Type, Union
+
+from langchain_core.messages import HumanMessage, ToolMessage
+
+# 默认估算参数，可在 store.json 的 tokenEstimator 中覆盖
+DEFAULT_ESTIMATOR_OPTIONS: Dict[str, Any] = {
+    "cjkTokensPerChar": 0.6,  # 每个中日韩字符的 token 数
+    "charsPerToken": 3.3,  # 其他字符每个 token 对应的字符数
+    "extraTokensPerMessage": 3,  # 每条消息的角色和分隔符开销
+    "calibrate": True,  # 根据模型返回的 usage 校准估算值
+}
+
+# 中日韩统一表意文字、扩展A、兼容表意文字、中文标点和全角字符、假名、谚文
+_CJK_PATTERN = re.compile(
+    "[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]"
+)
+
+# 校准系数的范围，以及单次样本被视为有效的估算偏差范围（超出说明 usage 不可信，如本地假网关）
+_CALIBRATION_BOUNDS = (0.5, 2.0)
+_SAMPLE_BOUNDS = (0.25, 4.0)
+_CALIBRATION_WEIGHT = 0.2
+
+# 相邻两次调用的估算值至少相差这么多 token 才作为校准样本（差值太小时噪声占主导）
+_MIN_SAMPLE_DELTA = 50.0
+
+# 每个调用环境保留上一次调用的 (估算值, input_tokens)，最多保留的环境数量
+_MAX_OBSERVE_KEYS = 256
+
+MessageTypes = Union[Type, Tuple[Type, ...]]
+
+
+def estimate_text_tokens(text: str, cjk_tokens_per_char: float = 0.6, chars_per_token: float = 3.3) -> float:
+    """估算一段文本的 token 数，CJK 字符和其他字符分别计数"""
+    if not text:
+        return 0.0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk * cjk_tokens_per_char + (len(text) - cjk) / chars_per_token
+
+
+def _content_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        # 多模态内容只计文本部分
+        parts = []
+        for block in content:
+            if isinstance(block, str):
+                parts.append(block)
+            elif isinstance(block, dict) and block.get("type") == "text":
+                parts.append(block.get("text", ""))
+        return "".join(parts)
+    return repr(content)
+
+
+class TokenCounter:
+    """带缓存和在线校准的消息 token 估算器"""
+
+    def __init__(self, max_entries: int = 50000, options: Optional[Dict[str, Any]] = None):
+        self.max_entries = max_entries
+        self._options = options
+        self._cache: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.calibration = 1.0
+        self._last_observed: "OrderedDict[Hashable, Tuple[float, int]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.samples = 0
+
+    @property
+    def options(self) -> Dict[str, Any]:
+        if self._options is not None:
+            return self._options
+        from ai_agent.config import ai_settings
+        merged = dict(DEFAULT_ESTIMATOR_OPTIONS)
+        merged.update(ai_settings.TOKEN_ESTIMATOR)
+        return merged
+
+    def _key(self, message: Any, options: Dict[str, Any]) -> Hashable:
+        # 字符串的哈希值由解释器缓存，同一个消息对象重复计算键几乎没有开销
+        content = message.content if isinstance(message.content, str) else repr(message.content)
+        tool_calls = getattr(message, "tool_calls", None)
+        return (
+            message.type,
+            getattr(message, "id", None),
+            len(content),
+            hash(content),
+            hash(repr(tool_calls)) if tool_calls else 0,
+            options["cjkTokensPerChar"],
+            options["charsPerToken"],
+        )
+
+    def _estimate(self, message: Any, options: Dict[str, Any]) -> float:
+        text = _content_text(message.content) + message.type
+        name = getattr(message, "name", None)
+        if name:
+            text += name
+        tool_calls = getattr(message, "tool_calls", None)
+        if tool_calls:
+            text += repr(tool_calls)
+        if isinstance(message, ToolMessage):
+            text += message.tool_call_id or ""
+        return estimate_text_tokens(text, float(options["cjkTokensPerChar"]), float(options["charsPerToken"])) \
+            + float(options["extraTokensPerMessage"])
+
+    def _raw_count(self, message: Any, options: Dict[str, Any]) -> float:
+        key = self._key(message, options)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+        value = self._estimate(message, options)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = value
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return value
+
+    def message_counts(self, messages: Sequence[Any]) -> List[float]:
+        """逐条消息的 token 估算值（已校准）"""
+        options = self.options
+        factor = self.calibration if options["calibrate"] else 1.0
+        return [self._raw_count(msg, options) * factor for msg in messages]
+
+    def count(self, messages: Sequence[Any]) -> int:
+        """消息列表的 token 估算值，可直接作为 trim_messages 的 token_counter"""
+        return math.ceil(sum(self.message_counts(messages)))
+
+    __call__ = count
+
+    def trim(self, messages: Sequence[Any], max_tokens: int,
+             start_on: Optional[MessageTypes] = HumanMessage,
+             end_on: Optional[MessageTypes] = (HumanMessage, ToolMessage)) -> List[Any]:
+        """保留不超过 max_tokens 的最新消息，结果与 trim_messages(strategy="last") 一致
+
+        从最新消息向前累加缓存的计数，到预算用完为止，只访问保留下来的消息
+
+        Args:
+            start_on: 保留部分的第一条消息必须是该类型
+            end_on: 丢弃末尾不是该类型的消息
+        """
+        end = len(messages)
+        if end_on:
+            while end > 0 and not isinstance(messages[end - 1], end_on):
+                end -= 1
+
+        options = self.options
+        factor = self.calibration if options["calibrate"] else 1.0
+        total = 0.0
+        start = end
+        while start > 0:
+            tokens = self._raw_count(messages[start - 1], options) * factor
+            if total + tokens > max_tokens:
+                break
+            total += tokens
+            start -= 1
+
+        if start_on:
+            while start < end and not isinstance(messages[start], start_on):
+                start += 1
+        return list(messages[start:end])
+
+    def observe(self, messages: Sequence[Any], input_tokens: Optional[int], key: Hashable = None):
+        """根据模型实际返回的输入 token 数校准估算值
+
+        input_tokens 中工具定义等固定开销不在消息里，直接用 input_tokens / 估算值 会让系数偏大；
+        这里与同一 key 上一次调用比较，用两次的差值计算比例
+
+        Args:
+            messages: 本次发给模型的完整消息列表
+            input_tokens: usage_metadata 中的 input_tokens
+            key: 调用环境（模型和绑定的工具），固定开销相同的调用使用同一个 key
+        """
+        if not input_tokens or not self.options["calibrate"]:
+            return
+        options = self.options
+        estimated = sum(self._raw_count(msg, options) for msg in messages)
+        if estimated <= 0:
+            return
+        with self._lock:
+            previous = self._last_observed.get(key)
+            self._last_observed[key] = (estimated, input_tokens)
+            self._last_observed.move_to_end(key)
+            while len(self._last_observed) > _MAX_OBSERVE_KEYS:
+                self._last_observed.popitem(last=False)
+            if previous is None:
+                return
+            estimated_delta = estimated - previous[0]
+            if abs(estimated_delta) < _MIN_SAMPLE_DELTA:
+                return
+            ratio = (input_tokens - previous[1]) / estimated_delta
+            if not (_SAMPLE_BOUNDS[0] <= ratio <= _SAMPLE_BOUNDS[1]):
+                return
+            value = self.calibration * (1 - _CALIBRATION_WEIGHT) + ratio * _CALIBRATION_WEIGHT
+            self.calibration = min(max(value, _CALIBRATION_BOUNDS[0]), _CALIBRATION_BOUNDS[1])
+            self.samples += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "calibration": round(self.calibration, 3),
+                "samples": self.samples,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# 创建全局 token 计数实例
+token_counter = TokenCounter()
@@ -1,8 +1,13 @@
 import os
-import json
 from pathlib import Path
 from typing import Dict, List, Set, Any
-from ..config import ai_settings
+from ..config import ai_settings, config_store
+
+# 工具审批策略
+APPROVAL_AUTO = "auto"  # 直接执行，不中断
+APPROVAL_ASK = "ask"  # 每次调用都请求确认
+APPROVAL_ONCE = "once"  # 每个会话第一次调用时请求确认，确认后该会话内自动批准
+APPROVAL_POLICIES = (APPROVAL_AUTO, APPROVAL_ASK, APPROVAL_ONCE)
 
 class ToolConfigManager:
     """
@@ -10,7 +15,7 @@ class ToolConfigManager:
     """
     
     def __init__(self):
-        self._config_file = Path(__file__).parent.parent.parent / "config" / "store.json"
+        self._config_file = config_store.config_file
         self._tool_categories = {
             "file_operations": [
                 "read_file",
@@ -45,28 +50,35 @@ class ToolConfigManager:
             }
         }
     
+        # 工具审批策略：auto=自动批准，ask=每次询问，once=每个会话询问一次
+        self._default_approval_policy = {
+            "read_file": APPROVAL_AUTO,
+            "search_file": APPROVAL_AUTO,
+            "search_embedding": APPROVAL_AUTO,
+            "list_knowledge_base": APPROVAL_AUTO,
+            "write_file": APPROVAL_ASK,
+            "apply_diff": APPROVAL_ASK,
+            "insert_content": APPROVAL_ASK,
+            "search_and_replace": APPROVAL_ASK,
+            "ask_user_question": APPROVAL_ASK
+        }
+        # 中断本身就是与用户的交互，只能每次询问
+        self._interactive_tools = {"ask_user_question"}
+    
     def _load_config(self) -> Dict[str, Any]:
-        """从 store.json 加载配置"""
-        if not self._config_file.exists():
-            return {}
-        
-        try:
-            with open(self._config_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, Exception):
-            return {}
+        """从 store.json 加载配置（副本，可修改后保存）"""
+        return config_store.load()
     
     def _save_config(self, config: Dict[str, Any]):
         """保存配置到 store.json"""
         try:
-            with open(self._config_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
+            config_store.save(config)
         except Exception as e:
             print(f"[ERROR] 保存配置失败: {e}")
     
     def get_tools_for_mode(self, mode: str) -> List[str]:
         """获取指定模式启用的工具列表"""
-        config = self._load_config()
+        config = config_store.snapshot()
         
         # 从配置中获取模式工具设置
         mode_tools_config = config.get("mode_tools", {})
@@ -82,12 +94,6 @@ class ToolConfigManager:
     
     def set_tools_for_mode(self, mode: str, enabled_tools: List[str]):
         """设置指定模式的工具配置"""
-        config = self._load_config()
-        
-        # 初始化模式工具配置
-        if "mode_tools" not in config:
-            config["mode_tools"] = {}
-        
         # 验证工具名称
         valid_tools = []
         all_available_tools = self.get_all_available_tools()
@@ -97,13 +103,20 @@ class ToolConfigManager:
             else:
                 print(f"[WARNING] 工具 '{tool_name}' 不存在，已忽略")
         
-        # 更新配置
-        config["mode_tools"][mode] = {
-            "enabled_tools": valid_tools,
-            "description": f"自定义模式 - {mode}"
-        }
-        
-        self._save_config(config)
+        try:
+            with config_store.transaction() as config:
+                # 初始化模式工具配置
+                if "mode_tools" not in config:
+                    config["mode_tools"] = {}
+                
+                # 更新配置
+                config["mode_tools"][mode] = {
+                    "enabled_tools": valid_tools,
+                    "description": f"自定义模式 - {mode}"
+                }
+        except Exception as e:
+            print(f"[ERROR] 保存配置失败: {e}")
+            return
         print(f"[INFO] 已更新模式 '{mode}' 的工具配置: {valid_tools}")
     
     def get_all_available_tools(self) -> List[str]:
@@ -123,25 +136,26 @@ class ToolConfigManager:
     
     def reset_mode_tools(self, mode: str = None):
         """重置模式工具配置为默认值"""
-        config = self._load_config()
-        
-        if mode:
-            # 重置指定模式
-            if "mode_tools" in config and mode in config["mode_tools"]:
-                del config["mode_tools"][mode]
-                if not config["mode_tools"]:
-                    del config["mode_tools"]
-        else:
-            # 重置所有模式
-            if "mode_tools" in config:
-                del config["mode_tools"]
-        
-        self._save_config(config)
+        try:
+            with config_store.transaction() as config:
+                if mode:
+                    # 重置指定模式
+                    if "mode_tools" in config and mode in config["mode_tools"]:
+                        del config["mode_tools"][mode]
+                        if not config["mode_tools"]:
+                            del config["mode_tools"]
+                else:
+                    # 重置所有模式
+                    if "mode_tools" in config:
+                        del config["mode_tools"]
+        except Exception as e:
+            print(f"[ERROR] 保存配置失败: {e}")
+            return
         print(f"[INFO] 已重置模式 '{mode if mode else 'all'}' 的工具配置")
     
     def get_mode_tool_info(self, mode: str) -> Dict[str, Any]:
         """获取模式的工具配置信息"""
-        config = self._load_config()
+        config = config_store.snapshot()
         
         if "mode_tools" in config and mode in config["mode_tools"]:
             # 返回自定义配置
@@ -153,5 +167,63 @@ class ToolConfigManager:
                 "description": "未知模式"
             })
 
+    def get_approval_policy(self, mode: str) -> Dict[str, str]:
+        """获取指定模式的工具审批策略（默认策略 < store.json 中该模式的自定义策略）"""
+        config = config_store.snapshot()
+        policy = dict(self._default_approval_policy)
+        policy.update(config.get("tool_approval", {}).get(mode, {}) if mode else {})
+        for tool_name in self._interactive_tools:
+            policy[tool_name] = APPROVAL_ASK
+        return policy
+    
+    def set_approval_policy(self, mode: str, policy: Dict[str, str]) -> Dict[str, str]:
+        """设置指定模式的工具审批策略，只保存与默认策略不同的项，返回生效后的完整策略"""
+        all_available_tools = self.get_all_available_tools()
+        custom = {}
+        for tool_name, value in policy.items():
+            if tool_name not in all_available_tools:
+                print(f"[WARNING] 工具 '{tool_name}' 不存在，已忽略")
+            elif value not in APPROVAL_POLICIES:
+                print(f"[WARNING] 工具 '{tool_name}' 的审批策略 '{value}' 无效，已忽略")
+            elif tool_name in self._interactive_tools and value != APPROVAL_ASK:
+                print(f"[WARNING] 工具 '{tool_name}' 需要用户回复，只能使用 {APPROVAL_ASK} 策略")
+            elif value != self._default_approval_policy.get(tool_name, APPROVAL_ASK):
+                custom[tool_name] = value
+        
+        try:
+            with config_store.transaction() as config:
+                approval = config.setdefault("tool_approval", {})
+                if custom:
+                    approval[mode] = custom
+                else:
+                    approval.pop(mode, None)
+                    if not approval:
+                        del config["tool_approval"]
+        except Exception as e:
+            print(f"[ERROR] 保存配置失败: {e}")
+            raise
+        print(f"[INFO] 已更新模式 '{mode}' 的审批策略: {custom}")
+        return self.get_approval_policy(mode)
+    
+    def reset_approval_policy(self, mode: str = None):
+        """重置审批策略为默认值"""
+        try:
+            with config_store.transaction() as config:
+                if mode:
+                    if "tool_approval" in config and mode in config["tool_approval"]:
+                        del config["tool_approval"][mode]
+                        if not config["tool_approval"]:
+                            del config["tool_approval"]
+                elif "tool_approval" in config:
+                    del config["tool_approval"]
+        except Exception as e:
+            print(f"[ERROR] 保存配置失败: {e}")
+            return
+        print(f"[INFO] 已重置模式 '{mode if mode else 'all'}' 的审批策略")
+    
+    def get_default_approval_policy(self) -> Dict[str, str]:
+        """获取默认审批策略"""
+        return self._default_approval_policy.copy()
+
 # 创建全局工具配置管理器实例
 tool_config_manager = ToolConfigManager()
\ No newline at end of file
@@ -0,0 +1,349 @@
+"""
+并行工具执行
+模型在一轮中发出的多个工具调用（read_file、search_embedding、search_file 等）在有界线程池中并发执行，
+每个工具有独立的并发上限，ToolMessage 按原始调用顺序返回。
+
+- 依赖关系：操作同一文件路径的调用按原顺序串行执行（先写后读、连续写入），其他调用互不等待
+- 中断合并：工具内部的 interrupt() 不再逐个打断对话。先并发试运行所有调用，收集需要确认的调用，
+  合并成一次中断；恢复时按 tool_call_id 把用户的选择交给各个工具（不区分时所有调用使用同一个选择）
+- 确认前不执行：需要确认的工具在任何副作用之前调用 interrupt()，试运行只取得确认提示；每个节点最多中断一次，
+  全部选择到齐后才按队列执行。节点恢复后重新执行时试运行的结果相同，已完成的修改不会重复执行
+- 每次调用的耗时记录在 ToolMessage.response_metadata["duration_ms"]，并按工具汇总统计
+
+配置见 store.json 的 toolConcurrency，如 {"default": 4, "search_embedding": 2}
+
+为每个调用创建独立的中断上下文依赖 langgraph 的内部结构（公开 API 中没有对应功能），
+requirements.txt 限定了验证过的 langgraph 版本范围；导入时检查这些结构，不兼容时退回逐个执行工具
+（每个需要确认的工具单独中断，审批策略中的自动批准不生效）
+"""
+
+import dataclasses
+import itertools
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.messages import ToolMessage
+from langgraph.errors import GraphInterrupt
+from langgraph.types import interrupt
+
+try:
+    from langgraph._internal._constants import CONFIG_KEY_SCRATCHPAD, CONFIG_KEY_SEND
+    from langgraph._internal._scratchpad import PregelScratchpad
+except ImportError:
+    CONFIG_KEY_SCRATCHPAD = CONFIG_KEY_SEND = PregelScratchpad = None
+
+logger = logging.getLogger(__name__)
+
+# 默认并发上限，可在 store.json 的 toolConcurrency 中按工具覆盖
+DEFAULT_TOOL_CONCURRENCY: Dict[str, int] = {
+    "default": 4,
+    "search_embedding": 2,  # 嵌入检索占用模型服务，限制并发
+}
+
+# 用于判断依赖关系的路径参数名
+PATH_ARGS = ("path", "file_path")
+
+
+# _call_config 构造 PregelScratchpad 时传入的字段
+_SCRATCHPAD_FIELDS = {
+    "step", "stop", "call_counter", "interrupt_counter", "get_null_resume", "resume", "subgraph_counter",
+}
+
+
+def check_scratchpad_support() -> bool:
+    """检查当前 langgraph 是否提供独立中断上下文所需的内部结构"""
+    if PregelScratchpad is None:
+        logger.error("当前 langgraph 版本缺少 PregelScratchpad，工具调用将逐个执行")
+        return False
+    try:
+        fields = dataclasses.fields(PregelScratchpad)
+    except TypeError:
+        fields = ()
+    names = {field.name for field in fields}
+    # 新增的字段没有默认值时也无法构造
+    required = {
+        field.name for field in fields
+        if field.default is dataclasses.MISSING and field.default_factory is dataclasses.MISSING
+    }
+    if not names or not _SCRATCHPAD_FIELDS <= names or not required <= _SCRATCHPAD_FIELDS:
+        logger.error(
+            f"当前 langgraph 版本的 PregelScratchpad 结构不兼容（字段: {sorted(names)}），工具调用将逐个执行，"
+            f"请安装 requirements.txt 中限定的版本"
+        )
+        return False
+    return True
+
+
+# 当前 langgraph 是否支持为每个调用创建独立的中断上下文
+SCRATCHPAD_SUPPORTED = check_scratchpad_support()
+
+
+def load_tool_concurrency() -> Dict[str, int]:
+    """读取工具并发上限：默认值 < store.json 配置"""
+    from ai_agent.config import ai_settings
+
+    limits = dict(DEFAULT_TOOL_CONCURRENCY)
+    limits.update({k: int(v) for k, v in ai_settings.TOOL_CONCURRENCY.items() if isinstance(v, (int, float))})
+    return limits
+
+
+def _lane_key(tool_call: Dict[str, Any]) -> str:
+    """同一文件路径的调用进入同一队列串行执行，没有路径参数的调用各自独立"""
+    args = tool_call.get("args") or {}
+    for name in PATH_ARGS:
+        value = args.get(name)
+        if isinstance(value, str) and value.strip():
+            return "path:" + value.strip().replace("\\", "/").lstrip("./")
+    return "call:" + str(tool_call.get("id") or uuid.uuid4())
+
+
+def _null_resume(consume: bool = False) -> Any:
+    return None
+
+
+def format_batch_prompt(pending: List[Tuple[Dict[str, Any], Any]]) -> str:
+    """把多个待确认的工具调用合并成一条中断提示"""
+    lines = [f"以下 {len(pending)} 个工具调用需要确认，扣1全部恢复，扣2全部取消："]
+    for index, (tool_call, value) in enumerate(pending, 1):
+        args = ", ".join(f"{k}={v!r}" for k, v in (tool_call.get("args") or {}).items())
+        if len(args) > 200:
+            args = args[:200] + "..."
+        lines.append(f"{index}. {tool_call['name']}({args})")
+        if isinstance(value, str) and not value.startswith("工具中断"):
+            # 提问类工具附带问题内容
+            lines.append(f"   {value}")
+    return "\n".join(lines)
+
+
+def resolve_decisions(resume: Any, pending: List[Tuple[Dict[str, Any], Any]]) -> Dict[str, Any]:
+    """把中断恢复值分配给各个工具调用
+
+    恢复值中带 decisions（tool_call_id -> 选择）时按调用分别处理，缺少的调用使用顶层的选择
+    """
+    per_call = resume.get("decisions") if isinstance(resume, dict) else None
+    default = {k: v for k, v in resume.items() if k != "decisions"} if isinstance(resume, dict) else resume
+    decisions = {}
+    for tool_call, _ in pending:
+        decision = (per_call or {}).get(tool_call["id"])
+        decisions[tool_call["id"]] = decision if decision is not None else default
+    return decisions
+
+
+class ToolExecutor:
+    """有界线程池 + 按工具限流的工具调用执行器"""
+
+    def __init__(self, max_workers: int = 8):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool-worker")
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, Tuple[int, threading.BoundedSemaphore]] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}  # thread_id -> 等待确认的节点和调用
+
+    def _semaphore(self, tool_name: str, limits: Dict[str, int]) -> threading.BoundedSemaphore:
+        limit = max(1, limits.get(tool_name, limits.get("default", 4)))
+        with self._lock:
+            entry = self._semaphores.get(tool_name)
+            if entry is None or entry[0] != limit:
+                # 配置变化时换用新的信号量，正在执行的调用仍释放旧的
+                entry = (limit, threading.BoundedSemaphore(limit))
+                self._semaphores[tool_name] = entry
+            return entry[1]
+
+    def _record(self, tool_name: str, duration: float):
+        with self._lock:
+            stats = self._stats.setdefault(tool_name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stats["calls"] += 1
+            stats["total_ms"] += duration * 1000
+            stats["max_ms"] = max(stats["max_ms"], duration * 1000)
+
+    def _call_config(self, config: Dict[str, Any], resume: List[Any]) -> Dict[str, Any]:
+        """为单个工具调用创建独立的中断上下文
+
+        工具内部的 interrupt() 按顺序读取 resume 中的值，没有值时抛出 GraphInterrupt 交给执行器汇总；
+        屏蔽写入通道，避免工具把自己的恢复值写回节点
+        """
+        node_pad = config["configurable"][CONFIG_KEY_SCRATCHPAD]
+        counter = itertools.count()
+        pad = PregelScratchpad(
+            step=node_pad.step,
+            stop=node_pad.stop,
+            call_counter=node_pad.call_counter,
+            interrupt_counter=lambda: next(counter),
+            get_null_resume=_null_resume,
+            resume=list(resume),
+            subgraph_counter=node_pad.subgraph_counter,
+        )
+        return {
+            **config,
+            "configurable": {**config["configurable"], CONFIG_KEY_SCRATCHPAD: pad, CONFIG_KEY_SEND: lambda writes: None},
+        }
+
+    def _invoke(self, tool, tool_call: Dict[str, Any], config: Dict[str, Any], resume: List[Any],
+                limits: Dict[str, int]) -> Tuple[Optional[ToolMessage], Optional[Any]]:
+        """执行单个调用，返回 (工具消息, 中断值)，二者只有一个不为 None"""
+        semaphore = self._semaphore(tool_call["name"], limits)
+        with semaphore:
+            start = time.perf_counter()
+            try:
+                observation = tool.invoke(tool_call["args"], config=self._call_config(config, resume))
+            except GraphInterrupt as e:
+                return None, e.args[0][0].value if e.args and e.args[0] else None
+            duration = time.perf_counter() - start
+        return self._tool_message(tool_call, observation, duration), None
+
+    def _tool_message(self, tool_call: Dict[str, Any], observation: Any, duration: float) -> ToolMessage:
+        self._record(tool_call["name"], duration)
+        return ToolMessage(
+            content=observation,
+            tool_call_id=tool_call["id"],
+            id=str(uuid.uuid4()),
+            response_metadata={"duration_ms": round(duration * 1000, 1)},
+        )
+
+    def _run_sequential(self, tools_by_name: Dict[str, Any], tool_calls: List[Dict[str, Any]],
+                        config: Dict[str, Any]) -> List[ToolMessage]:
+        """不支持独立中断上下文时按顺序执行，工具的 interrupt() 直接使用节点的中断上下文"""
+        messages = []
+        for tool_call in tool_calls:
+            start = time.perf_counter()
+            observation = tools_by_name[tool_call["name"]].invoke(tool_call["args"], config=config)
+            messages.append(self._tool_message(tool_call, observation, time.perf_counter() - start))
+        return messages
+
+    def _map_lanes(self, func: Callable[[List[Dict[str, Any]]], Any], lanes: List[List[Dict[str, Any]]]) -> List[Any]:
+        """并发处理各个队列（只有一个队列时直接在当前线程执行）"""
+        if len(lanes) == 1:
+            return [func(lanes[0])]
+        return list(self._executor.map(func, lanes))
+
+    def _probe_lane(self, tools_by_name: Dict[str, Any], calls: List[Dict[str, Any]], config: Dict[str, Any],
+                    limits: Dict[str, int]) -> Tuple[Dict[str, ToolMessage], Dict[str, Any]]:
+        """试运行一个队列中的调用，收集确认提示
+
+        需要确认的工具在这里抛出中断，不产生副作用；不中断的工具（检索等只读工具）直接执行完毕。
+        排在需要确认的调用之后的只读调用依赖前面调用的结果，试运行的结果不保留，执行阶段重新运行
+
+        Returns:
+            (可直接使用的工具消息, tool_call_id -> 中断值)
+        """
+        done: Dict[str, ToolMessage] = {}
+        prompts: Dict[str, Any] = {}
+        for tool_call in calls:
+            message, value = self._invoke(tools_by_name[tool_call["name"]], tool_call, config, [], limits)
+            if message is None:
+                prompts[tool_call["id"]] = value
+            elif not prompts:
+                done[tool_call["id"]] = message
+        return done, prompts
+
+    def _execute_lane(self, tools_by_name: Dict[str, Any], calls: List[Dict[str, Any]], config: Dict[str, Any],
+                      done: Dict[str, ToolMessage], resumes: Dict[str, List[Any]],
+                      limits: Dict[str, int]) -> Dict[str, ToolMessage]:
+        """按顺序执行一个队列中的调用（所有确认都已取得）"""
+        messages: Dict[str, ToolMessage] = {}
+        for tool_call in calls:
+            message = done.get(tool_call["id"])
+            if message is None:
+                message, _ = self._invoke(
+                    tools_by_name[tool_call["name"]], tool_call, config, resumes.get(tool_call["id"], []), limits
+                )
+            if message is None:
+                # 每个调用只能确认一次，再次中断会让节点重新执行已完成的调用
+                logger.warning(f"工具 {tool_call['name']} 在确认后再次请求确认，已取消")
+                message = self._tool_message(tool_call, "工具执行失败：一次调用中只能请求一次确认", 0.0)
+            messages[tool_call["id"]] = message
+        return messages
+
+    def run(self, tools_by_name: Dict[str, Any], tool_calls: List[Dict[str, Any]], config: Dict[str, Any],
+            decide: Optional[Callable[[Dict[str, Any], Any], Any]] = None,
+            on_answer: Optional[Callable[[Dict[str, Any], Any], None]] = None) -> List[ToolMessage]:
+        """执行一条 AI 消息中的全部工具调用，返回按调用顺序排列的工具消息
+
+        需要在图节点中调用（config 为节点的运行配置）。先试运行所有调用收集确认提示，有调用需要用户确认时
+        以一次中断暂停节点（此时还没有执行任何需要确认的调用）；恢复后节点重新执行，试运行得到同样的提示，
+        本函数把恢复值分配给对应的调用，再按队列执行
+
+        Args:
+            decide: 可选的自动决策函数 (tool_call, 中断值) -> 恢复值，返回 None 时交给用户确认
+            on_answer: 可选的回调 (tool_call, 用户的选择)，用户确认后调用
+        """
+        if not SCRATCHPAD_SUPPORTED:
+            return self._run_sequential(tools_by_name, tool_calls, config)
+
+        limits = load_tool_concurrency()
+        lanes: Dict[str, List[Dict[str, Any]]] = {}
+        for tool_call in tool_calls:
+            lanes.setdefault(_lane_key(tool_call), []).append(tool_call)
+        lane_calls = list(lanes.values())
+
+        done: Dict[str, ToolMessage] = {}
+        prompts: Dict[str, Any] = {}
+        for lane_done, lane_prompts in self._map_lanes(
+            lambda calls: self._probe_lane(tools_by_name, calls, config, limits), lane_calls
+        ):
+            done.update(lane_done)
+            prompts.update(lane_prompts)
+
+        resumes: Dict[str, List[Any]] = {}
+        ask = []
+        for tool_call in tool_calls:
+            if tool_call["id"] not in prompts:
+                continue
+            value = prompts[tool_call["id"]]
+            decision = decide(tool_call, value) if decide else None
+            if decision is None:
+                ask.append((tool_call, value))
+            else:
+                resumes[tool_call["id"]] = [decision]
+        if ask:
+            # 所有需要确认的调用合并成一次中断；只有一个时沿用工具自己的提示
+            prompt = ask[0][1] if len(ask) == 1 else format_batch_prompt(ask)
+            self._set_pending(config, ask)
+            decisions = resolve_decisions(interrupt(prompt), ask)
+            self._clear_pending(config)
+            for tool_call, _ in ask:
+                resumes[tool_call["id"]] = [decisions[tool_call["id"]]]
+                if on_answer:
+                    on_answer(tool_call, decisions[tool_call["id"]])
+
+        completed: Dict[str, ToolMessage] = {}
+        for messages in self._map_lanes(
+            lambda calls: self._execute_lane(tools_by_name, calls, config, done, resumes, limits), lane_calls
+        ):
+            completed.update(messages)
+        return [completed[tool_call["id"]] for tool_call in tool_calls]
+
+    def _set_pending(self, config: Dict[str, Any], ask: List[Tuple[Dict[str, Any], Any]]):
+        thread_id = config["configurable"].get("thread_id")
+        if thread_id is None:
+            return
+        with self._lock:
+            self._pending[str(thread_id)] = {
+                "node": config.get("metadata", {}).get("langgraph_node"),
+                "tool_calls": [tool_call for tool_call, _ in ask],
+            }
+
+    def _clear_pending(self, config: Dict[str, Any]):
+        with self._lock:
+            self._pending.pop(str(config["configurable"].get("thread_id")), None)
+
+    def pending(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """会话当前等待确认的工具调用：{"node": 节点名, "tool_calls": [...]}，没有时返回 None"""
+        with self._lock:
+            return self._pending.get(str(thread_id))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                name: {**stats, "avg_ms": round(stats["total_ms"] / stats["calls"], 1) if stats["calls"] else 0.0}
+                for name, stats in self._stats.items()
+            }
+
+
+# 创建全局工具执行器实例
+tool_executor = ToolExecutor()
@@ -1,62 +1,197 @@
 import os
+import time
+import threading
 import importlib.util
-from typing import Dict, List
+from typing import Any, Dict, List, Optional
 from .tool_config_manager import tool_config_manager
 
 
+class ToolRegistry:
+    """
+    工具注册表 - 进程内只加载一次工具模块，源文件修改时间变化时才重新加载
+    """
+
+    def __init__(self, tool_dir: str = 'tool'):
+        self.tool_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), tool_dir)
+        self._lock = threading.RLock()
+        # 模块路径 -> {"module_name", "tools", "load_time", "mtime"}
+        self._modules: Dict[str, Dict[str, Any]] = {}
+        self._tools_by_name: Dict[str, Any] = {}
+        self._tools_by_category: Dict[str, List[str]] = {}
+        # 每次有模块新增、重新加载或删除时加一，缓存的图实例据此判断工具代码是否过期
+        self.version = 0
+
+    def _scan_module_files(self) -> Dict[str, float]:
+        """递归搜索工具目录中的Python文件及其修改时间"""
+        module_files = {}
+        for root, dirs, files in os.walk(self.tool_path):
+            for filename in files:
+                if filename.endswith('.py') and filename != '__init__.py':
+                    module_path = os.path.join(root, filename)
+                    try:
+                        module_files[module_path] = os.stat(module_path).st_mtime
+                    except OSError:
+                        continue
+        return module_files
+
+    def _module_name(self, module_path: str) -> str:
+        """计算相对于工具目录的模块名"""
+        relative_path = os.path.relpath(module_path, self.tool_path)
+        return relative_path.replace(os.path.sep, '.').replace('.py', '')
+
+    def _load_module(self, module_path: str) -> Dict[str, Any]:
+        """动态导入单个工具模块并收集其中的工具"""
+        module_name = self._module_name(module_path)
+        start = time.perf_counter()
+        spec = importlib.util.spec_from_file_location(module_name, module_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        # 查找模块中的工具函数
+        tools = {}
+        for attr_name in dir(module):
+            attr = getattr(module, attr_name)
+            if hasattr(attr, 'name') and hasattr(attr, 'invoke'):
+                # 这是一个 LangChain 工具
+                tools[attr.name] = attr
+        load_time = time.perf_counter() - start
+
+        print(f"[OK] 已加载工具模块: {module_name} ({load_time * 1000:.1f}ms) -> {list(tools.keys())}")
+        return {"module_name": module_name, "tools": tools, "load_time": load_time}
+
+    def _get_category(self, tool_name: str, module_name: str) -> str:
+        """获取工具分类，未在配置中分类的工具使用所在子目录名"""
+        for category, tool_names in tool_config_manager.get_tool_categories().items():
+            if tool_name in tool_names:
+                return category
+        return module_name.split('.')[0] if '.' in module_name else "uncategorized"
+
+    def _rebuild_index(self):
+        """根据已加载模块重建名称和分类索引"""
+        tools_by_name = {}
+        tools_by_category: Dict[str, List[str]] = {}
+        for entry in self._modules.values():
+            for tool_name, tool in entry["tools"].items():
+                tools_by_name[tool_name] = tool
+                category = self._get_category(tool_name, entry["module_name"])
+                tools_by_category.setdefault(category, []).append(tool_name)
+        self._tools_by_name = tools_by_name
+        self._tools_by_category = tools_by_category
+
+    def refresh(self) -> bool:
+        """检查工具源文件，加载新增或已修改的模块
+
+        Returns:
+            工具集合是否发生了变化
+        """
+        with self._lock:
+            if not os.path.exists(self.tool_path):
+                print(f"警告: 工具目录不存在: {self.tool_path}")
+                return False
+
+            module_files = self._scan_module_files()
+            changed = False
+
+            # 移除已删除的模块
+            for module_path in [p for p in self._modules if p not in module_files]:
+                del self._modules[module_path]
+                changed = True
+
+            for module_path, mtime in module_files.items():
+                entry = self._modules.get(module_path)
+                if entry is not None and entry["mtime"] == mtime:
+                    continue
+                try:
+                    loaded = self._load_module(module_path)
+                    loaded["mtime"] = mtime
+                    self._modules[module_path] = loaded
+                except Exception as e:
+                    print(f"[ERROR] 导入工具 {module_path} 失败: {e}")
+                    # 记录修改时间，避免每次请求都重复导入失败的模块
+                    self._modules[module_path] = {
+                        "module_name": self._module_name(module_path),
+                        "tools": entry["tools"] if entry else {},
+                        "load_time": 0.0,
+                        "mtime": mtime,
+                        "error": str(e),
+                    }
+                changed = True
+
+            if changed:
+                self.version += 1
+                self._rebuild_index()
+                print(f"[INFO] 工具注册表已更新，共 {len(self._tools_by_name)} 个工具")
+            return changed
+
+    def get_tools(self, mode: str = None) -> Dict[str, Any]:
+        """获取工具字典，支持按模式过滤
+
+        Args:
+            mode: 模式名称，如果提供则只返回该模式启用的工具
+        """
+        self.refresh()
+        with self._lock:
+            if not mode:
+                return dict(self._tools_by_name)
+
+            enabled_tools = tool_config_manager.get_tools_for_mode(mode)
+            return {
+                name: tool for name, tool in self._tools_by_name.items()
+                if name in enabled_tools
+            }
+
+    def get_tool(self, tool_name: str) -> Optional[Any]:
+        """按名称获取工具"""
+        self.refresh()
+        with self._lock:
+            return self._tools_by_name.get(tool_name)
+
+    def get_tools_by_category(self) -> Dict[str, List[str]]:
+        """获取按分类索引的工具名称"""
+        self.refresh()
+        with self._lock:
+            return {category: list(names) for category, names in self._tools_by_category.items()}
+
+    def get_load_stats(self) -> Dict[str, Any]:
+        """获取各工具模块的加载耗时统计"""
+        with self._lock:
+            modules = [
+                {
+                    "module": entry["module_name"],
+                    "tools": list(entry["tools"].keys()),
+                    "load_time_ms": round(entry["load_time"] * 1000, 2),
+                    "error": entry.get("error"),
+                }
+                for entry in self._modules.values()
+            ]
+            return {
+                "module_count": len(modules),
+                "tool_count": len(self._tools_by_name),
+                "total_load_time_ms": round(sum(m["load_time_ms"] for m in modules), 2),
+                "modules": modules,
+                "version": self.version,
+            }
+
+
+# 全局工具注册表实例
+tool_registry = ToolRegistry('tool')
+_registries: Dict[str, ToolRegistry] = {'tool': tool_registry}
+
+
 # 动态导入工具文件夹下的所有工具
 def import_tools_from_directory(tool_dir: str, mode: str = None):
     """从指定目录导入所有工具，支持按模式过滤
-    
+
+    工具模块由进程内的注册表缓存，只有源文件修改后才会重新导入
+
     Args:
         tool_dir: 工具目录
         mode: 模式名称，如果提供则只导入该模式启用的工具
     """
-    tools = {}
-    tool_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), tool_dir)
-    
-    if not os.path.exists(tool_path):
-        print(f"警告: 工具目录不存在: {tool_path}")
-        return tools
-    
-    # 获取模式启用的工具列表
-    enabled_tools = []
+    if tool_dir not in _registries:
+        _registries[tool_dir] = ToolRegistry(tool_dir)
+    registry = _registries[tool_dir]
+    tools = registry.get_tools(mode)
     if mode:
-        enabled_tools = tool_config_manager.get_tools_for_mode(mode)
-        print(f"[INFO] 模式 '{mode}' 启用的工具: {enabled_tools}")
-    
-    # 递归搜索所有子目录中的Python文件
-    for root, dirs, files in os.walk(tool_path):
-        for filename in files:
-            if filename.endswith('.py') and filename != '__init__.py':
-                module_path = os.path.join(root, filename)
-                # 计算相对于工具目录的模块名
-                relative_path = os.path.relpath(module_path, tool_path)
-                module_name = relative_path.replace(os.path.sep, '.').replace('.py', '')
-                
-                try:
-                    # 动态导入模块
-                    spec = importlib.util.spec_from_file_location(module_name, module_path)
-                    module = importlib.util.module_from_spec(spec)
-                    spec.loader.exec_module(module)
-                    
-                    # 查找模块中的工具函数
-                    for attr_name in dir(module):
-                        attr = getattr(module, attr_name)
-                        if hasattr(attr, 'name') and hasattr(attr, 'invoke'):
-                            # 这是一个 LangChain 工具
-                            tool_name = attr.name
-                            
-                            # 如果指定了模式，检查工具是否在该模式中启用
-                            if mode and tool_name not in enabled_tools:
-                                print(f"[SKIP] 工具 '{tool_name}' 在模式 '{mode}' 中未启用")
-                                continue
-                            
-                            tools[tool_name] = attr
-                            print(f"[OK] 已导入工具: {tool_name}")
-                            
-                except Exception as e:
-                    print(f"[ERROR] 导入工具 {module_name} 失败: {e}")
-    
-    print(f"[INFO] 总共导入 {len(tools)} 个工具")
-    return tools
\ No newline at end of file
+        print(f"[INFO] 模式 '{mode}' 启用的工具: {list(tools.keys())}")
+    return tools
@@ -4,17 +4,29 @@
 包括存档点管理、历史消息管理等功能
 """
 
+import asyncio
 import json
 import logging
 import sqlite3
 import os
-import msgpack
 from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, validator
+from langchain_core.messages import RemoveMessage
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
 
 from .config import ai_settings
-from .core.graph_builder import build_graph
+from .core.graph_registry import graph_registry
+from .core.stream_bridge import graph_stream_bridge
+from .core.message_reducer import message_keys, plan_message_removal, replace_all_messages
+from .core.checkpoint_summary import checkpoint_summary_reader
+from .core.checkpoint_retention import (
+    VACUUM_MODES, add_save_point, checkpoint_retention, delete_save_points, list_save_points
+)
+from .core.db_access import PooledSessionSaver, checkpoint_db
+from .core.message_store import diff_refs, load_messages, load_refs
+from .core.session_index import SESSION_SORT_FIELDS, get_session_entry, query_sessions
 from .core.tool_load import import_tools_from_directory
 from .core.system_prompt_builder import system_prompt_builder
 from .chat_api import serialize_langchain_object
@@ -25,96 +37,45 @@ logger = logging.getLogger(__name__)
 # 创建API路由器
 router = APIRouter(prefix="/api/history", tags=["History Management"])
 
-# 全局数据库连接和内存存储，避免重复创建连接
-_db_connection = None
+# 全局内存存储，所有模式共用 checkpoint_db 的写线程和只读连接池
 _memory_storage = {}
-_is_shutting_down = False
 
-def get_db_connection():
-    """获取全局数据库连接，避免多连接导致的锁定问题"""
-    global _db_connection, _is_shutting_down
-    
-    if _is_shutting_down:
-        raise RuntimeError("系统正在关闭，无法获取数据库连接")
-    
-    if _db_connection is None:
-        # 确保数据库目录存在
-        db_path = "checkpoints.db"
-        _db_connection = sqlite3.connect(db_path, check_same_thread=False)
-        # 设置更长的超时时间，默认5秒可能不够
-        _db_connection.execute("PRAGMA busy_timeout = 30000")  # 30秒超时
-        # 启用WAL模式，提高并发性能
-        _db_connection.execute("PRAGMA journal_mode=WAL")
-        # 设置同步模式为NORMAL，在性能和安全性之间取得平衡
-        _db_connection.execute("PRAGMA synchronous = NORMAL")
-        logger.info(f"数据库连接已建立: {db_path}")
-    
-    # 检查连接是否已关闭
-    try:
-        _db_connection.execute("SELECT 1")
-    except sqlite3.ProgrammingError as e:
-        if "Cannot operate on a closed database" in str(e):
-            logger.warning("数据库连接已关闭，重新创建连接")
-            db_path = "checkpoints.db"
-            _db_connection = sqlite3.connect(db_path, check_same_thread=False)
-            _db_connection.execute("PRAGMA busy_timeout = 30000")  # 30秒超时
-            _db_connection.execute("PRAGMA journal_mode=WAL")
-            _db_connection.execute("PRAGMA synchronous = NORMAL")
-        else:
-            raise
-    return _db_connection
+def get_checkpoint_db():
+    """获取检查点数据库访问层（单写线程 + 只读连接池）"""
+    checkpoint_db.start()
+    return checkpoint_db
 
 def close_db_connection():
     """安全关闭数据库连接"""
-    global _db_connection, _is_shutting_down, _memory_storage
-    
-    _is_shutting_down = True
-    
-    if _db_connection:
-        try:
-            # 清理内存存储
-            _memory_storage.clear()
-            
-            # 执行检查点操作，确保WAL文件中的数据写入主数据库
-            _db_connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
-            
-            # 关闭连接
-            _db_connection.close()
-            _db_connection = None
-            logger.info("数据库连接已安全关闭")
-        except Exception as e:
-            logger.error(f"关闭数据库连接时发生错误: {e}")
+    try:
+        # 清理内存存储以及绑定在其上的图实例缓存
+        _memory_storage.clear()
+        graph_registry.invalidate()
+        # 等待排队的写操作提交，执行WAL检查点后关闭全部连接
+        checkpoint_db.close()
+    except Exception as e:
+        logger.error(f"关闭数据库连接时发生错误: {e}")
+
+def _busy_error(e: TimeoutError) -> HTTPException:
+    """只读连接池等待超时时返回 503，客户端可以稍后重试"""
+    logger.warning(f"检查点数据库繁忙: {e}")
+    return HTTPException(status_code=503, detail=f"检查点数据库繁忙，请稍后重试: {str(e)}")
 
 def get_memory_storage(mode: str = None):
     """获取或创建内存存储，避免重复创建"""
-    from langgraph.checkpoint.sqlite import SqliteSaver
-    
     if mode not in _memory_storage:
-        conn = get_db_connection()
-        try:
-            _memory_storage[mode] = SqliteSaver(conn)
-            logger.info(f"内存存储已创建，模式: {mode}")
-        except Exception as e:
-            logger.error(f"创建内存存储失败: {e}")
-            # 如果创建失败，尝试重置连接并重试
-            global _db_connection
-            _db_connection = None
-            conn = get_db_connection()
-            _memory_storage[mode] = SqliteSaver(conn)
+        _memory_storage[mode] = PooledSessionSaver(get_checkpoint_db(), mode=mode)
+        logger.info(f"内存存储已创建，模式: {mode}")
     
     return _memory_storage[mode]
 
 def create_graph(mode: str = None):
-    """创建新的图实例
+    """获取图实例，配置未变化时复用已编译的图
     
     Args:
         mode: 模式名称，如果提供则只加载该模式启用的工具
     """
     try:
-        # 根据模式加载工具
-        tools = import_tools_from_directory('tool', mode)
-        
-        # 构建图实例
         # 使用全局内存存储，避免重复创建连接
         memory = get_memory_storage(mode)
         
@@ -134,9 +95,11 @@ def create_graph(mode: str = None):
             # 没有运行中的循环，可以安全创建新循环
             current_prompt = asyncio.run(system_prompt_builder.build_system_prompt(mode=mode, include_persistent_memory=True))
         
-        graph = build_graph(tools, memory, system_prompt=current_prompt, mode=mode)
-        
-        logger.info(f"Graph created successfully for mode '{mode}': {len(tools)} tools bound")
+        # 模式、模型、工具集和提示词都未变化时直接复用缓存的图
+        graph = graph_registry.get_or_build(
+            mode, current_prompt, memory,
+            lambda m: import_tools_from_directory('tool', m)
+        )
         return graph
     except Exception as e:
         logger.error(f"Failed to create graph: {e}")
@@ -147,6 +110,9 @@ class CheckpointListRequest(BaseModel):
     """存档点列表请求模型"""
     thread_id: str = "default"
     mode: str = "outline"
+    limit: Optional[int] = None  # 每页数量，不传则返回全部
+    before: Optional[str] = None  # 分页游标：上一页最后一个检查点ID
+    stream: bool = False  # 以 NDJSON 逐条返回
 
 class CheckpointInfo(BaseModel):
     """存档点信息模型"""
@@ -162,14 +128,24 @@ class CheckpointListResponse(BaseModel):
     success: bool
     message: str
     data: List[CheckpointInfo]
+    next_before: Optional[str] = None  # 下一页游标
+    has_more: bool = False
 
 class CheckpointOperationRequest(BaseModel):
     """存档点操作请求模型"""
     thread_id: str = "default"
-    checkpoint_index: int
+    checkpoint_index: Optional[int] = None  # 存档点在完整历史中的索引
+    checkpoint_id: Optional[str] = None  # 直接指定检查点ID，优先于索引
     new_message: str
     mode: str = "outline"
 
+class CheckpointDiffRequest(BaseModel):
+    """存档点消息差异请求模型"""
+    thread_id: str = "default"
+    from_checkpoint_id: str
+    to_checkpoint_id: Optional[str] = None  # 不传则与最新检查点比较
+    mode: str = "outline"
+
 class CheckpointOperationResponse(BaseModel):
     """存档点操作响应模型"""
     success: bool
@@ -218,6 +194,7 @@ class SessionInfo(BaseModel):
     created_at: Optional[str] = None
     last_accessed: Optional[str] = None
     preview: Optional[str] = None
+    mode: Optional[str] = None
     is_current: bool = False
 
 class SessionListResponse(BaseModel):
@@ -225,6 +202,7 @@ class SessionListResponse(BaseModel):
     success: bool
     message: str
     sessions: List[SessionInfo]
+    total: Optional[int] = None  # 会话总数（分页时使用）
 
 class SessionOperationResponse(BaseModel):
     """会话操作响应模型"""
@@ -232,62 +210,93 @@ class SessionOperationResponse(BaseModel):
     message: str
     data: Optional[Dict[str, Any]] = None
 
+class SavePointRequest(BaseModel):
+    """命名存档点请求模型"""
+    thread_id: str = "default"
+    name: str
+    checkpoint_id: Optional[str] = None  # 不传则使用会话最新的检查点
+
+class RetentionRunRequest(BaseModel):
+    """手动执行保留策略请求模型，不传的字段使用配置中的策略"""
+    keep_last: Optional[int] = None
+    vacuum: Optional[str] = None
+
+    @validator('vacuum')
+    def validate_vacuum(cls, v):
+        if v is not None and v not in VACUUM_MODES:
+            raise ValueError(f"vacuum 必须是 {', '.join(VACUUM_MODES)} 之一")
+        return v
+
+class MaintenanceResponse(BaseModel):
+    """维护操作响应模型"""
+    success: bool
+    message: str
+    data: Optional[Dict[str, Any]] = None
+
 # API端点
 
 @router.post("/checkpoints", response_model=CheckpointListResponse, summary="获取存档点列表")
 async def get_checkpoints(request: CheckpointListRequest):
     """
-    获取指定会话的所有存档点列表
+    获取指定会话的存档点列表（从新到旧）
+    
+    只解析列表需要的字段（检查点ID、下一步节点、最后一条消息摘要），摘要按检查点ID缓存
     
     - **thread_id**: 会话ID
     - **mode**: 对话模式 (outline/writing/adjustment)
+    - **limit**: 每页数量，不传则返回全部
+    - **before**: 游标，返回比该检查点更早的存档点（上一页响应中的 next_before）
+    - **stream**: 以 NDJSON 逐条返回存档点
     """
     try:
-        # 创建图实例
-        graph = create_graph(request.mode)
-        config = {"configurable": {"thread_id": request.thread_id}}
+        db = get_checkpoint_db()
+        serde = get_memory_storage(request.mode).serde
         
-        # 获取存档点历史
-        states = list(graph.get_state_history(config))
+        # 多读一条用于判断是否还有下一页
+        fetch_limit = request.limit + 1 if request.limit is not None else None
         
-        checkpoints = []
-        for index, state in enumerate(states):
-            # 获取检查点ID
-            checkpoint_id = state.config.get('configurable', {}).get('checkpoint_id', 'unknown')
-            
-            # 获取最后一条消息内容
-            messages = state.values.get("messages", [])
-            last_message_type = "unknown"
-            last_message_content = ""
-            tool_calls = None
-            
-            if messages:
-                last_message = messages[-1]
-                last_message_type = last_message.type if hasattr(last_message, 'type') else 'unknown'
-                last_message_content = last_message.content if hasattr(last_message, 'content') else str(last_message)
-                
-                # 如果是工具调用，显示工具信息
-                if last_message_type == 'ai' and hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-                    tool_names = [tc.get('name', 'unknown') for tc in last_message.tool_calls]
-                    tool_calls = tool_names
-                    last_message_content = f"工具调用: {', '.join(tool_names)}"
-            
-            checkpoint_info = CheckpointInfo(
-                checkpoint_id=checkpoint_id,
+        def to_info(index: int, summary: Dict[str, Any]) -> CheckpointInfo:
+            return CheckpointInfo(
+                checkpoint_id=summary["checkpoint_id"],
                 index=index,
-                next_node=state.next,
-                last_message_type=last_message_type,
-                last_message_content=last_message_content,
-                tool_calls=tool_calls
+                next_node=",".join(summary["next"]),
+                last_message_type=summary["last_message_type"],
+                last_message_content=summary["last_message_content"],
+                tool_calls=summary["tool_calls"]
             )
-            checkpoints.append(checkpoint_info)
+        
+        def load() -> List[CheckpointInfo]:
+            with db.reader() as conn:
+                # 索引与完整历史中的位置一致，可直接用于按索引回档
+                start_index = checkpoint_summary_reader.count_newer(conn, request.thread_id, request.before)
+                summaries = checkpoint_summary_reader.iter_summaries(
+                    conn, serde, request.thread_id, before=request.before, limit=fetch_limit
+                )
+                return [to_info(start_index + offset, summary) for offset, summary in enumerate(summaries)]
+        
+        # 整页在工作线程中读入内存后立即归还连接，流式响应期间不占用连接池
+        checkpoints = await asyncio.to_thread(load)
+        has_more = request.limit is not None and len(checkpoints) > request.limit
+        if has_more:
+            checkpoints = checkpoints[:request.limit]
+        
+        if request.stream:
+            def generate():
+                for checkpoint in checkpoints:
+                    yield checkpoint.model_dump_json() + "\n"
+            
+            return StreamingResponse(generate(), media_type="application/x-ndjson")
         
         return CheckpointListResponse(
             success=True,
             message=f"成功获取 {len(checkpoints)} 个存档点",
-            data=checkpoints
+            data=checkpoints,
+            next_before=checkpoints[-1].checkpoint_id if has_more else None,
+            has_more=has_more
         )
         
+    except TimeoutError as e:
+        raise _busy_error(e)
     except Exception as e:
         logger.error(f"获取存档点列表失败: {e}")
         raise HTTPException(status_code=500, detail=f"获取存档点列表失败: {str(e)}")
@@ -299,63 +308,150 @@ async def rollback_to_checkpoint(request: CheckpointOperationRequest):
     
     - **thread_id**: 会话ID
     - **checkpoint_index**: 存档点索引
+    - **checkpoint_id**: 存档点ID（分页列表返回的 checkpoint_id，优先于索引）
     - **new_message**: 新的用户消息内容
     - **mode**: 对话模式
     """
     try:
         # 创建图实例
-        graph = create_graph(request.mode)
-        config = {"configurable": {"thread_id": request.thread_id}}
+        graph = await graph_stream_bridge.run(create_graph, request.mode)
+        # 读取存档点、更新状态和执行对话都是同步调用，整体在工作线程中执行
+        new_config, result = await graph_stream_bridge.run(_rollback, graph, request)
         
-        # 获取存档点历史
-        states = list(graph.get_state_history(config))
+        return CheckpointOperationResponse(
+            success=True,
+            message="回档成功",
+            data={
+                "new_config": new_config,
+                "result": serialize_langchain_object(result)
+            }
+        )
         
-        if request.checkpoint_index < 0 or request.checkpoint_index >= len(states):
-            raise HTTPException(status_code=400, detail="存档点索引无效")
+    except HTTPException:
+        raise
+    except TimeoutError as e:
+        raise _busy_error(e)
+    except Exception as e:
+        logger.error(f"回档操作失败: {e}")
+        raise HTTPException(status_code=500, detail=f"回档操作失败: {str(e)}")
+
+def _rollback(graph, request: CheckpointOperationRequest):
+    """回档到指定存档点并执行新的用户消息，返回 (新配置, 对话结果)"""
+    # 与对话和自动总结共用会话锁，更新状态和执行对话之间不会插入其他写入
+    with graph_stream_bridge.thread_lock(request.thread_id):
+        if request.checkpoint_id is None:
+            if request.checkpoint_index is None or request.checkpoint_index < 0:
+                raise HTTPException(status_code=400, detail="存档点索引无效")
+            # 按索引定位检查点ID，不反序列化整个历史
+            row = get_checkpoint_db().read(lambda conn: conn.execute(
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = '' "
+                "ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+                (request.thread_id, request.checkpoint_index)
+            ).fetchone())
+            if row is None:
+                raise HTTPException(status_code=400, detail="存档点索引无效")
+            checkpoint_id = row[0]
+        else:
+            checkpoint_id = request.checkpoint_id
         
         # 获取选中的存档点
-        selected_state = states[request.checkpoint_index]
+        selected_state = graph.get_state(
+            {"configurable": {"thread_id": request.thread_id, "checkpoint_ns": "", "checkpoint_id": checkpoint_id}}
+        )
+        # 检查点不存在（ID 错误或已被清理）时 get_state 仍原样返回传入的配置，只能看 created_at
+        if selected_state.created_at is None:
+            raise HTTPException(status_code=404, detail="存档点不存在")
         
         # 更新状态：获取整个消息列表，去掉最后一条用户信息，添加新的用户消息
         current_messages = selected_state.values.get("messages", [])
         
         from langchain_core.messages import HumanMessage
         
-        # 如果消息列表为空，直接添加新消息
-        if not current_messages:
-            new_messages = [HumanMessage(content=request.new_message)]
-        else:
-            # 检查最后一条消息是否是用户消息
+        # 如果最后一条是用户消息，新消息替换它；否则直接追加
+        base_messages = current_messages
+        if current_messages:
             last_message = current_messages[-1]
             if hasattr(last_message, 'type') and last_message.type == 'human':
-                # 如果最后一条是用户消息，替换它
-                new_messages = current_messages[:-1] + [HumanMessage(content=request.new_message)]
-            else:
-                # 如果最后一条不是用户消息，直接添加新消息
-                new_messages = current_messages + [HumanMessage(content=request.new_message)]
+                base_messages = current_messages[:-1]
         
-        # 用整个新状态替换原本的旧状态
-        new_config = graph.update_state(selected_state.config, values={"messages": new_messages})
+        # 用整个新状态替换原本的旧状态（不含新消息）
+        new_config = graph.update_state(selected_state.config, values={"messages": replace_all_messages(base_messages)})
         
-        # 触发回复
+        # 触发回复，只提交新的用户消息
         from ai_agent.config import State
-        input_state = State(messages=new_messages)
+        input_state = State(messages=[HumanMessage(content=request.new_message)])
         
         # 执行对话
         result = graph.invoke(input_state, new_config)
+        return new_config, result
+
+@router.post("/checkpoint/diff", response_model=CheckpointOperationResponse, summary="比较两个存档点的消息差异")
+async def diff_checkpoints(request: CheckpointDiffRequest):
+    """
+    比较两个存档点的消息列表，只返回新增消息和被删除消息的ID
+
+    消息按内容寻址存储时直接比较哈希列表，只反序列化新增的消息
+
+    - **thread_id**: 会话ID
+    - **from_checkpoint_id**: 起始存档点ID
+    - **to_checkpoint_id**: 目标存档点ID，不传则为最新存档点
+    - **mode**: 对话模式
+    """
+    try:
+        memory = get_memory_storage(request.mode)
+        
+        def load():
+            with get_checkpoint_db().reader() as conn:
+                to_checkpoint_id = request.to_checkpoint_id
+                if to_checkpoint_id is None:
+                    row = conn.execute(
+                        "SELECT MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ''",
+                        (request.thread_id,)
+                    ).fetchone()
+                    to_checkpoint_id = row[0] if row else None
+            
+                old_refs = load_refs(conn, request.thread_id, request.from_checkpoint_id)
+                new_refs = load_refs(conn, request.thread_id, to_checkpoint_id) if to_checkpoint_id else None
+                if old_refs is None or new_refs is None:
+                    raise HTTPException(status_code=404, detail="存档点不存在或未使用消息引用存储")
+            
+                diff = diff_refs(old_refs, new_refs)
+                added_messages = load_messages(conn, memory.serde, request.thread_id, [d for _, d in diff["added"]])
+                removed_ids = []
+                for digest in diff["removed"]:
+                    row = conn.execute(
+                        "SELECT message_id FROM message_store WHERE thread_id = ? AND hash = ?",
+                        (request.thread_id, digest)
+                    ).fetchone()
+                    removed_ids.append(row[0] if row else None)
+                return to_checkpoint_id, diff, added_messages, removed_ids
+        
+        to_checkpoint_id, diff, added_messages, removed_ids = await asyncio.to_thread(load)
         
         return CheckpointOperationResponse(
             success=True,
-            message="回档成功",
+            message=f"新增 {len(added_messages)} 条消息，删除 {len(removed_ids)} 条消息",
             data={
-                "new_config": new_config,
-                "result": serialize_langchain_object(result)
+                "from_checkpoint_id": request.from_checkpoint_id,
+                "to_checkpoint_id": to_checkpoint_id,
+                "common_prefix": diff["common_prefix"],
+                "old_count": diff["old_count"],
+                "new_count": diff["new_count"],
+                "added": [
+                    {"index": index, "message": serialize_langchain_object(message)}
+                    for (index, _), message in zip(diff["added"], added_messages)
+                ],
+                "removed_ids": removed_ids
             }
         )
         
+    except HTTPException:
+        raise
+    except TimeoutError as e:
+        raise _busy_error(e)
     except Exception as e:
-        logger.error(f"回档操作失败: {e}")
-        raise HTTPException(status_code=500, detail=f"回档操作失败: {str(e)}")
+        logger.error(f"比较存档点失败: {e}")
+        raise HTTPException(status_code=500, detail=f"比较存档点失败: {str(e)}")
 
 @router.post("/messages", response_model=MessageListResponse, summary="获取历史消息列表")
 async def get_messages(request: MessageListRequest):
@@ -367,18 +463,19 @@ async def get_messages(request: MessageListRequest):
     """
     try:
         # 创建图实例
-        graph = create_graph(request.mode)
+        graph = await graph_stream_bridge.run(create_graph, request.mode)
         config = {"configurable": {"thread_id": request.thread_id}}
         
         # 获取当前状态
-        current_state = graph.get_state(config)
+        current_state = await graph_stream_bridge.run(graph.get_state, config)
         current_messages = current_state.values.get("messages", [])
         
         messages = []
-        for index, msg in enumerate(current_messages):
+        # 旧消息没有ID时返回确定性标识，可直接用于 delete_ids
+        for index, (msg, key) in enumerate(zip(current_messages, message_keys(current_messages))):
             message_info = MessageInfo(
                 index=index,
-                message_id=getattr(msg, 'id', f"msg_{index}") or f"msg_{index}",
+                message_id=key,
                 message_type=msg.type if hasattr(msg, 'type') else 'unknown',
                 content=msg.content if hasattr(msg, 'content') else str(msg),
                 tool_calls=getattr(msg, 'tool_calls', None)
@@ -391,112 +488,105 @@ async def get_messages(request: MessageListRequest):
             data=messages
         )
         
+    except TimeoutError as e:
+        raise _busy_error(e)
     except Exception as e:
         logger.error(f"获取历史消息列表失败: {e}")
         raise HTTPException(status_code=500, detail=f"获取历史消息列表失败: {str(e)}")
 
-@router.post("/messages/operation", response_model=MessageOperationResponse, summary="操作历史消息")
-async def operate_messages(request: MessageOperationRequest):
-    """
-    对历史消息进行操作（删除等）
-    
-    - **thread_id**: 会话ID
-    - **operation_type**: 操作类型 ('delete_all', 'delete_index', 'delete_ids')
-    - **target_indices**: 目标索引列表（用于delete_index操作）
-    - **target_ids**: 目标ID列表（用于delete_ids操作）
-    - **mode**: 对话模式
-    """
-    try:
-        # 创建图实例
-        graph = create_graph(request.mode)
+def _operate_messages(graph, request: MessageOperationRequest) -> Dict[str, Any]:
+    """读取当前状态、计划删除并写入删除标记，返回响应数据"""
+    # 与对话、自动总结和回档共用会话锁，读取和写入之间不会插入其他写入
+    with graph_stream_bridge.thread_lock(request.thread_id):
         config = {"configurable": {"thread_id": request.thread_id}}
         
         # 获取当前状态
         current_state = graph.get_state(config)
         current_messages = current_state.values.get("messages", [])
         
-        from langchain_core.messages import HumanMessage
+        if current_state.next:
+            raise HTTPException(status_code=409, detail="会话有等待确认的操作，请先完成后再删除消息")
         
         if request.operation_type == 'delete_all':
             # 删除所有消息
-            delete_instruction = HumanMessage(content="/delete all")
-            updated_messages = current_messages + [delete_instruction]
-            
-            # 调用图，条件边会自动路由到自定义删除节点
-            result = graph.invoke(
-                {"messages": updated_messages},
-                config
-            )
-            
-            return MessageOperationResponse(
-                success=True,
-                message="已删除所有消息",
-                data={"result": serialize_langchain_object(result)}
-            )
+            markers = [RemoveMessage(id=REMOVE_ALL_MESSAGES)]
+            results = None
+            deleted_count = len(current_messages)
             
         elif request.operation_type == 'delete_index' and request.target_indices:
-            # 删除指定索引的消息
-            for index in request.target_indices:
-                if 0 <= index < len(current_messages):
-                    # 使用自定义删除指令删除特定索引的消息
-                    delete_instruction = HumanMessage(content=f"/delete index {index}")
-                    updated_messages = current_messages + [delete_instruction]
-                    
-                    # 调用图，条件边会自动路由到自定义删除节点
-                    result = graph.invoke(
-                        {"messages": updated_messages},
-                        config
-                    )
-                    current_messages = result["messages"]
-                else:
-                    logger.warning(f"无效的消息索引: {index}")
-            
-            return MessageOperationResponse(
-                success=True,
-                message=f"已删除 {len(request.target_indices)} 条消息",
-                data={"result": serialize_langchain_object(result)}
-            )
+            # 删除指定索引的消息（索引都针对删除前的列表）
+            markers, results = plan_message_removal(current_messages, target_indices=request.target_indices)
+            deleted_count = len(markers)
             
         elif request.operation_type == 'delete_ids' and request.target_ids:
             # 删除指定ID的消息
-            deleted_count = 0
-            for msg_id in request.target_ids:
-                # 查找消息索引
-                for index, msg in enumerate(current_messages):
-                    if getattr(msg, 'id', None) == msg_id:
-                        # 使用自定义删除指令删除特定索引的消息
-                        delete_instruction = HumanMessage(content=f"/delete index {index}")
-                        updated_messages = current_messages + [delete_instruction]
-                        
-                        # 调用图，条件边会自动路由到自定义删除节点
-                        result = graph.invoke(
-                            {"messages": updated_messages},
-                            config
-                        )
-                        current_messages = result["messages"]
-                        deleted_count += 1
-                        break
-            
-            return MessageOperationResponse(
-                success=True,
-                message=f"已删除 {deleted_count} 条消息",
-                data={"result": serialize_langchain_object(result)}
-            )
+            markers, results = plan_message_removal(current_messages, target_ids=request.target_ids)
+            deleted_count = len(markers)
         
         else:
             raise HTTPException(status_code=400, detail="无效的操作类型或参数")
         
+        for result in results or []:
+            if result["status"] != "deleted":
+                logger.warning(f"消息删除未命中: {result}")
+        
+        # 一次状态更新写入全部删除标记，只产生一个检查点
+        new_config = current_state.config
+        if markers:
+            new_config = graph.update_state(config, {"messages": markers}, as_node="custom_delete")
+        
+        return {
+            "deleted_count": deleted_count,
+            "message_count": 0 if request.operation_type == 'delete_all' else len(current_messages) - deleted_count,
+            "results": results,
+            "new_config": new_config
+        }
+
+@router.post("/messages/operation", response_model=MessageOperationResponse, summary="操作历史消息")
+async def operate_messages(request: MessageOperationRequest):
+    """
+    对历史消息进行操作（删除等）
+    
+    所有目标消息在一次状态更新中删除，只写入一个检查点，data.results 给出每个目标的处理结果
+    
+    - **thread_id**: 会话ID
+    - **operation_type**: 操作类型 ('delete_all', 'delete_index', 'delete_ids')
+    - **target_indices**: 目标索引列表（用于delete_index操作）
+    - **target_ids**: 目标ID列表（用于delete_ids操作）
+    - **mode**: 对话模式
+    """
+    try:
+        # 创建图实例
+        graph = await graph_stream_bridge.run(create_graph, request.mode)
+        data = await graph_stream_bridge.run(_operate_messages, graph, request)
+        
+        return MessageOperationResponse(
+            success=True,
+            message=f"已删除 {data['deleted_count']} 条消息",
+            data=data
+        )
+        
+    except HTTPException:
+        raise
+    except TimeoutError as e:
+        raise _busy_error(e)
     except Exception as e:
         logger.error(f"消息操作失败: {e}")
         raise HTTPException(status_code=500, detail=f"消息操作失败: {str(e)}")
 
 # 会话管理API端点
 @router.get("/sessions", response_model=SessionListResponse, summary="获取所有会话列表")
-async def get_all_sessions():
+async def get_all_sessions(limit: Optional[int] = None, offset: int = 0,
+                           sort_by: str = "last_accessed", order: str = "desc"):
     """
     获取所有会话的列表
     
-    返回所有用户的会话信息，包括会话ID、消息数量等
+    返回所有用户的会话信息，包括会话ID、消息数量等，数据来自会话索引表
+    
+    - **limit**: 每页数量，不传则返回全部
+    - **offset**: 偏移量
+    - **sort_by**: 排序字段 (last_accessed/created_at/checkpoint_count/thread_id)
+    - **order**: 排序方向 (asc/desc)
     """
     try:
         db_path = "checkpoints.db"
@@ -508,118 +598,43 @@ async def get_all_sessions():
                 sessions=[]
             )
         
-        # 使用全局连接，避免锁定问题
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 获取所有用户ID（会话ID）
-        cursor.execute('SELECT DISTINCT thread_id FROM checkpoints')
-        user_ids = [row[0] for row in cursor.fetchall()]
+        if sort_by not in SESSION_SORT_FIELDS:
+            raise HTTPException(status_code=400, detail=f"不支持的排序字段: {sort_by}")
         
-        sessions = []
-        for user_id in user_ids:
-            # 获取该会话的检查点数量（消息数量）
-            cursor.execute('SELECT COUNT(*) FROM checkpoints WHERE thread_id = ?', (user_id,))
-            message_count = cursor.fetchone()[0]
-            
-            # 获取创建时间和最后访问时间
-            # 由于数据库中没有created列，我们从checkpoint字段中提取时间戳
-            cursor.execute('''
-                SELECT checkpoint, checkpoint_id
-                FROM checkpoints
-                WHERE thread_id = ?
-                ORDER BY checkpoint_id ASC
-                LIMIT 1
-            ''', (user_id,))
-            first_checkpoint = cursor.fetchone()
-            created_at = None
-            
-            cursor.execute('''
-                SELECT checkpoint, checkpoint_id
-                FROM checkpoints
-                WHERE thread_id = ?
-                ORDER BY checkpoint_id DESC
-                LIMIT 1
-            ''', (user_id,))
-            last_checkpoint = cursor.fetchone()
-            last_accessed = None
-            
-            # 尝试从checkpoint数据中提取时间戳
-            if first_checkpoint and first_checkpoint[0]:
-                try:
-                    import msgpack
-                    checkpoint_data = msgpack.unpackb(first_checkpoint[0])
-                    created_at = checkpoint_data.get('ts', None)
-                except:
-                    created_at = None
-            
-            if last_checkpoint and last_checkpoint[0]:
-                try:
-                    import msgpack
-                    checkpoint_data = msgpack.unpackb(last_checkpoint[0])
-                    last_accessed = checkpoint_data.get('ts', None)
-                except:
-                    last_accessed = None
-            
-            # 获取最后一条消息作为预览
-            cursor.execute('''
-                SELECT checkpoint
-                FROM checkpoints
-                WHERE thread_id = ?
-                ORDER BY checkpoint_id DESC
-                LIMIT 1
-            ''', (user_id,))
-            last_checkpoint = cursor.fetchone()
-            preview = ""
-            
-            if last_checkpoint and last_checkpoint[0]:
-                try:
-                    checkpoint_data = msgpack.unpackb(last_checkpoint[0])
-                    channel_values = checkpoint_data.get('channel_values', {})
-                    messages = channel_values.get('__start__', {}).get('messages', [])
-                    
-                    if messages:
-                        # 获取最后一条消息
-                        last_message_data = messages[-1]
-                        # 消息数据是msgpack格式，需要解析
-                        if isinstance(last_message_data, dict):
-                            content = last_message_data.get('content', '')
-                            if content:
-                                preview = content
-                                # 截断预览文本
-                                if len(preview) > 100:
-                                    preview = preview[:100] + "..."
-                        else:
-                            preview = "消息格式无法解析"
-                    else:
-                        preview = "无消息内容"
-                except Exception as e:
-                    logger.warning(f"解析消息预览失败: {e}")
-                    preview = "无法解析消息预览"
-            
-            session_info = SessionInfo(
-                session_id=user_id,
-                message_count=message_count,
-                created_at=created_at,
-                last_accessed=last_accessed,
-                preview=preview,
-                is_current=False  # 暂时不实现当前会话检测
-            )
-            sessions.append(session_info)
+        # 会话索引表已在写连接启动时创建，这里只读
+        total, entries = await asyncio.to_thread(get_checkpoint_db().read,
+            lambda conn: query_sessions(conn, limit=limit, offset=offset, sort_by=sort_by, order=order)
+        )
         
-        # 不关闭全局连接，保持连接开放
-        # conn.close()
+        sessions = [_session_info(entry) for entry in entries]
         
         return SessionListResponse(
             success=True,
             message=f"成功获取 {len(sessions)} 个会话",
-            sessions=sessions
+            sessions=sessions,
+            total=total
         )
         
+    except HTTPException:
+        raise
+    except TimeoutError as e:
+        raise _busy_error(e)
     except Exception as e:
         logger.error(f"获取会话列表失败: {e}")
         raise HTTPException(status_code=500, detail=f"获取会话列表失败: {str(e)}")
 
+def _session_info(entry: Dict[str, Any]) -> SessionInfo:
+    """将会话索引行转换为响应模型"""
+    return SessionInfo(
+        session_id=entry["thread_id"],
+        message_count=entry["checkpoint_count"],
+        created_at=entry["created_at"],
+        last_accessed=entry["last_accessed"],
+        preview=entry["preview"] or "无消息内容",
+        mode=entry["mode"],
+        is_current=False  # 暂时不实现当前会话检测
+    )
+
 @router.get("/sessions/{session_id}", response_model=SessionOperationResponse, summary="获取指定会话详情")
 async def get_session(session_id: str):
     """
@@ -633,116 +648,23 @@ async def get_session(session_id: str):
         if not os.path.exists(db_path):
             raise HTTPException(status_code=404, detail="数据库文件不存在")
 
-        # 使用全局连接，避免锁定问题
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 检查会话是否存在
-        cursor.execute('SELECT COUNT(*) FROM checkpoints WHERE thread_id = ?', (session_id,))
-        session_count = cursor.fetchone()[0]
+        entry = await asyncio.to_thread(get_checkpoint_db().read, lambda conn: get_session_entry(conn, session_id))
         
-        if session_count == 0:
-            conn.close()
+        if entry is None:
             raise HTTPException(status_code=404, detail="会话不存在")
-
-        # 获取会话的基本信息
-        cursor.execute('SELECT COUNT(*) FROM checkpoints WHERE thread_id = ?', (session_id,))
-        message_count = cursor.fetchone()[0]
-        
-        # 获取创建时间和最后访问时间
-        cursor.execute('''
-            SELECT checkpoint, checkpoint_id
-            FROM checkpoints
-            WHERE thread_id = ?
-            ORDER BY checkpoint_id ASC
-            LIMIT 1
-        ''', (session_id,))
-        first_checkpoint = cursor.fetchone()
-        created_at = None
-        
-        cursor.execute('''
-            SELECT checkpoint, checkpoint_id
-            FROM checkpoints
-            WHERE thread_id = ?
-            ORDER BY checkpoint_id DESC
-            LIMIT 1
-        ''', (session_id,))
-        last_checkpoint = cursor.fetchone()
-        last_accessed = None
-        
-        # 尝试从checkpoint数据中提取时间戳
-        if first_checkpoint and first_checkpoint[0]:
-            try:
-                import msgpack
-                checkpoint_data = msgpack.unpackb(first_checkpoint[0])
-                created_at = checkpoint_data.get('ts', None)
-            except:
-                created_at = None
-        
-        if last_checkpoint and last_checkpoint[0]:
-            try:
-                import msgpack
-                checkpoint_data = msgpack.unpackb(last_checkpoint[0])
-                last_accessed = checkpoint_data.get('ts', None)
-            except:
-                last_accessed = None
-        
-        # 获取最后一条消息作为预览
-        cursor.execute('''
-            SELECT checkpoint
-            FROM checkpoints
-            WHERE thread_id = ?
-            ORDER BY checkpoint_id DESC
-            LIMIT 1
-        ''', (session_id,))
-        last_checkpoint = cursor.fetchone()
-        preview = ""
-        
-        if last_checkpoint and last_checkpoint[0]:
-            try:
-                checkpoint_data = msgpack.unpackb(last_checkpoint[0])
-                channel_values = checkpoint_data.get('channel_values', {})
-                messages = channel_values.get('__start__', {}).get('messages', [])
-                
-                if messages:
-                    # 获取最后一条消息
-                    last_message_data = messages[-1]
-                    # 消息数据是msgpack格式，需要解析
-                    if isinstance(last_message_data, dict):
-                        content = last_message_data.get('content', '')
-                        if content:
-                            preview = content
-                            # 截断预览文本
-                            if len(preview) > 100:
-                                preview = preview[:100] + "..."
-                    else:
-                        preview = "消息格式无法解析"
-                else:
-                    preview = "无消息内容"
-            except Exception as e:
-                logger.warning(f"解析消息预览失败: {e}")
-                preview = "无法解析消息预览"
-        
-        # 不关闭全局连接，保持连接开放
-        # conn.close()
         
         return SessionOperationResponse(
             success=True,
             message=f"成功获取会话 {session_id} 的详情",
             data={
-                "session_data": {
-                    "session_id": session_id,
-                    "message_count": message_count,
-                    "created_at": created_at,
-                    "last_accessed": last_accessed,
-                    "preview": preview,
-                    "is_current": False  # 暂时不实现当前会话检测
-                }
+                "session_data": _session_info(entry).model_dump()
             }
         )
         
     except HTTPException:
         raise
+    except TimeoutError as e:
+        raise _busy_error(e)
     except Exception as e:
         logger.error(f"获取会话详情失败: {e}")
         raise HTTPException(status_code=500, detail=f"获取会话详情失败: {str(e)}")
@@ -760,53 +682,168 @@ async def delete_session(session_id: str):
         if not os.path.exists(db_path):
             raise HTTPException(status_code=404, detail="数据库文件不存在")
 
-        # 使用全局连接，避免锁定问题
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 检查会话是否存在
-        cursor.execute('SELECT COUNT(*) FROM checkpoints WHERE thread_id = ?', (session_id,))
-        session_count = cursor.fetchone()[0]
-        
-        if session_count == 0:
-            conn.close()
+        def delete(conn: sqlite3.Connection) -> Optional[Dict[str, int]]:
+            # 检查会话是否存在
+            session_count = conn.execute('SELECT COUNT(*) FROM checkpoints WHERE thread_id = ?', (session_id,)).fetchone()[0]
+            if session_count == 0:
+                return None
+            checkpoints_deleted = conn.execute('DELETE FROM checkpoints WHERE thread_id = ?', (session_id,)).rowcount
+            writes_deleted = conn.execute('DELETE FROM writes WHERE thread_id = ?', (session_id,)).rowcount
+            conn.execute('DELETE FROM save_points WHERE thread_id = ?', (session_id,))
+            conn.execute('DELETE FROM message_store WHERE thread_id = ?', (session_id,))
+            return {"checkpoints_deleted": checkpoints_deleted, "writes_deleted": writes_deleted}
+        
+        # 由写线程在一个事务中执行，不再与对话写入争用数据库锁
+        deleted = await asyncio.to_thread(get_checkpoint_db().write, delete)
+        if deleted is None:
             raise HTTPException(status_code=404, detail="会话不存在")
-
-        # 删除会话数据，添加重试机制
-        max_retries = 3
-        retry_delay = 0.5  # 秒
-        
-        for attempt in range(max_retries):
-            try:
-                cursor.execute('DELETE FROM checkpoints WHERE thread_id = ?', (session_id,))
-                checkpoints_deleted = cursor.rowcount
-                cursor.execute('DELETE FROM writes WHERE thread_id = ?', (session_id,))
-                writes_deleted = cursor.rowcount
-                
-                conn.commit()
-                break  # 成功则退出重试循环
-            except sqlite3.OperationalError as e:
-                if "database is locked" in str(e).lower() and attempt < max_retries - 1:
-                    logger.warning(f"数据库锁定，第 {attempt + 1} 次重试...")
-                    time.sleep(retry_delay * (2 ** attempt))  # 指数退避
-                    continue
-                else:
-                    raise  # 重试次数用完或不是锁定错误，重新抛出异常
-        
-        # 不关闭全局连接，保持连接开放
-        # conn.close()
+        checkpoint_summary_reader.invalidate(session_id)
         
         return SessionOperationResponse(
             success=True,
             message=f"已删除会话 {session_id}",
-            data={
-                "checkpoints_deleted": checkpoints_deleted,
-                "writes_deleted": writes_deleted
-            }
+            data=deleted
         )
         
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"删除会话失败: {e}")
-        raise HTTPException(status_code=500, detail=f"删除会话失败: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"删除会话失败: {str(e)}")
+
+# 命名存档点API端点
+@router.post("/savepoints", response_model=MaintenanceResponse, summary="创建命名存档点")
+async def create_save_point(request: SavePointRequest):
+    """
+    为检查点创建命名存档点，被引用的检查点不会被保留策略清理
+
+    - **thread_id**: 会话ID
+    - **name**: 存档点名称（同一会话内唯一，重名时覆盖）
+    - **checkpoint_id**: 检查点ID，不传则使用最新检查点
+    """
+    try:
+        db = get_checkpoint_db()
+        checkpoint_id = request.checkpoint_id
+        if checkpoint_id is None:
+            row = await asyncio.to_thread(db.read, lambda conn: conn.execute(
+                "SELECT MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ''",
+                (request.thread_id,)
+            ).fetchone())
+            checkpoint_id = row[0] if row else None
+            if checkpoint_id is None:
+                raise HTTPException(status_code=404, detail="会话不存在")
+        
+        save_point = await asyncio.to_thread(
+            db.write, lambda conn: add_save_point(conn, request.thread_id, request.name, checkpoint_id)
+        )
+        return MaintenanceResponse(success=True, message=f"已创建存档点 {request.name}", data=save_point)
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except TimeoutError as e:
+        raise _busy_error(e)
+    except Exception as e:
+        logger.error(f"创建存档点失败: {e}")
+        raise HTTPException(status_code=500, detail=f"创建存档点失败: {str(e)}")
+
+@router.get("/savepoints", response_model=MaintenanceResponse, summary="获取命名存档点列表")
+async def get_save_points(thread_id: Optional[str] = None):
+    """
+    获取命名存档点列表
+
+    - **thread_id**: 会话ID，不传则返回所有会话的存档点
+    """
+    try:
+        save_points = await asyncio.to_thread(get_checkpoint_db().read, lambda conn: list_save_points(conn, thread_id))
+        return MaintenanceResponse(
+            success=True,
+            message=f"成功获取 {len(save_points)} 个存档点",
+            data={"save_points": save_points}
+        )
+    except TimeoutError as e:
+        raise _busy_error(e)
+    except Exception as e:
+        logger.error(f"获取存档点列表失败: {e}")
+        raise HTTPException(status_code=500, detail=f"获取存档点列表失败: {str(e)}")
+
+@router.delete("/savepoints/{thread_id}/{name}", response_model=MaintenanceResponse, summary="删除命名存档点")
+async def remove_save_point(thread_id: str, name: str):
+    """
+    删除命名存档点，对应检查点之后可能被保留策略清理
+
+    - **thread_id**: 会话ID
+    - **name**: 存档点名称
+    """
+    try:
+        deleted = await asyncio.to_thread(get_checkpoint_db().write, lambda conn: delete_save_points(conn, thread_id, name))
+        if not deleted:
+            raise HTTPException(status_code=404, detail="存档点不存在")
+        return MaintenanceResponse(success=True, message=f"已删除存档点 {name}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"删除存档点失败: {e}")
+        raise HTTPException(status_code=500, detail=f"删除存档点失败: {str(e)}")
+
+# 检查点维护API端点
+@router.get("/maintenance/retention", response_model=MaintenanceResponse, summary="获取检查点保留任务状态")
+async def get_retention_status():
+    """
+    获取检查点保留任务的状态、当前策略和最近一次执行报告
+    """
+    return MaintenanceResponse(success=True, message="获取保留任务状态成功", data=checkpoint_retention.status())
+
+@router.post("/maintenance/retention", response_model=MaintenanceResponse, summary="立即执行检查点保留策略")
+async def run_retention_now(request: RetentionRunRequest):
+    """
+    立即按保留策略清理检查点并回收空间，返回删除数量、回收空间和耗时
+
+    - **keep_last**: 每个会话保留的最近检查点数量，不传则使用配置
+    - **vacuum**: 空间回收方式 (incremental/full/off)，不传则使用配置
+    """
+    try:
+        # 清理和 VACUUM 可能耗时较长，放到线程中执行
+        report = await asyncio.to_thread(
+            checkpoint_retention.run_now, {"keepLast": request.keep_last, "vacuum": request.vacuum}
+        )
+        return MaintenanceResponse(
+            success=True,
+            message=f"已删除 {report['checkpoints_deleted']} 个检查点，回收 {report['reclaimed_bytes'] / 1024 / 1024:.1f} MB",
+            data=report
+        )
+    except Exception as e:
+        logger.error(f"执行检查点保留策略失败: {e}")
+        raise HTTPException(status_code=500, detail=f"执行检查点保留策略失败: {str(e)}")
+
+@router.post("/maintenance/db/incremental-vacuum", response_model=MaintenanceResponse, summary="开启检查点数据库增量回收")
+async def enable_incremental_vacuum():
+    """
+    把检查点数据库转换为 auto_vacuum=INCREMENTAL，之后保留任务才会执行增量回收
+
+    转换需要一次完整 VACUUM，会重写整个数据库文件并在期间阻塞所有写入，请在空闲时执行
+    """
+    try:
+        report = await asyncio.to_thread(checkpoint_retention.enable_incremental_vacuum)
+        message = "已开启增量回收" if report["converted"] else "数据库已启用增量回收，无需转换"
+        return MaintenanceResponse(success=True, message=message, data=report)
+    except Exception as e:
+        logger.error(f"开启增量回收失败: {e}")
+        raise HTTPException(status_code=500, detail=f"开启增量回收失败: {str(e)}")
+
+@router.get("/maintenance/db", response_model=MaintenanceResponse, summary="获取检查点数据库访问指标")
+async def get_db_metrics(check: bool = False):
+    """
+    获取检查点数据库的写队列深度、批次大小、写入延迟和只读连接池使用情况
+
+    - **check**: 是否同时检查写连接和只读连接是否可用
+    """
+    try:
+        data = checkpoint_db.metrics()
+        if check:
+            data["health"] = await asyncio.to_thread(checkpoint_db.health)
+        return MaintenanceResponse(success=True, message="获取数据库指标成功", data=data)
+    except Exception as e:
+        logger.error(f"获取数据库指标失败: {e}")
+        raise HTTPException(status_code=500, detail=f"获取数据库指标失败: {str(e)}")
@@ -14,6 +14,7 @@ from core.graph_builder import build_graph, State
 from core.clean_checkpoint import cleanup_conversations
 from core.main_loop import main_loop
 from core.system_prompt_builder import system_prompt_builder
+from core.checkpoint_compression import create_checkpoint_serializer
 from prompts import sys_prompts
 
 # 导入所有工具（按当前模式过滤）
@@ -25,7 +26,9 @@ tool = import_tools_from_directory('tool', mode=current_mode)
 try:
     # 使用SqliteSaver自动管理连接，避免线程问题
     # 直接创建SqliteSaver实例，让它在内部管理连接
-    memory = SqliteSaver(sqlite3.connect("checkpoints.db", check_same_thread=False))
+    memory = SqliteSaver(sqlite3.connect("checkpoints.db", check_same_thread=False),
+                         serde=create_checkpoint_serializer(ai_settings.CHECKPOINT_COMPRESSION,
+                                                            db_path="checkpoints.db"))
 except Exception as e:
     print(f"[ERROR] SQLite检查点初始化失败: {e}")
     exit(1)
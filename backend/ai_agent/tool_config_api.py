@@ -20,6 +20,10 @@ class ToolConfigRequest(BaseModel):
     """工具配置请求模型"""
     enabled_tools: List[str]
 
+class ApprovalPolicyRequest(BaseModel):
+    """审批策略请求模型，键为工具名，值为 auto / ask / once"""
+    policy: Dict[str, str]
+
 class ToolConfigResponse(BaseModel):
     """工具配置响应模型"""
     success: bool
@@ -39,7 +43,7 @@ class AvailableToolsResponse(BaseModel):
     data: Optional[Dict[str, Any]] = None
 
 # 导入工具配置管理器
-from .core.tool_config_manager import tool_config_manager
+from .core.tool_config_manager import tool_config_manager, APPROVAL_POLICIES
 
 @router.get("/modes", response_model=ModeToolConfigResponse, summary="获取所有模式的工具配置")
 async def get_all_modes_tool_config():
@@ -158,6 +162,63 @@ async def reset_mode_tool_config(mode_id: str):
         logger.error(f"重置模式 '{mode_id}' 工具配置失败: {e}")
         raise HTTPException(status_code=500, detail=f"重置模式 '{mode_id}' 工具配置失败: {str(e)}")
 
+@router.get("/modes/{mode_id}/approval", response_model=ToolConfigResponse, summary="获取指定模式的工具审批策略")
+async def get_mode_approval_policy(mode_id: str):
+    """获取指定模式的工具审批策略"""
+    try:
+        return ToolConfigResponse(
+            success=True,
+            message=f"获取模式 '{mode_id}' 审批策略成功",
+            data={
+                "mode_id": mode_id,
+                "policy": tool_config_manager.get_approval_policy(mode_id),
+                "default_policy": tool_config_manager.get_default_approval_policy(),
+                "available_policies": list(APPROVAL_POLICIES)
+            }
+        )
+    
+    except Exception as e:
+        logger.error(f"获取模式 '{mode_id}' 审批策略失败: {e}")
+        raise HTTPException(status_code=500, detail=f"获取模式 '{mode_id}' 审批策略失败: {str(e)}")
+
+@router.put("/modes/{mode_id}/approval", response_model=ToolConfigResponse, summary="更新指定模式的工具审批策略")
+async def update_mode_approval_policy(mode_id: str, request: ApprovalPolicyRequest):
+    """更新指定模式的工具审批策略，无效的工具名或策略会被忽略"""
+    try:
+        policy = tool_config_manager.set_approval_policy(mode_id, request.policy)
+        
+        return ToolConfigResponse(
+            success=True,
+            message=f"模式 '{mode_id}' 的审批策略已更新",
+            data={
+                "mode_id": mode_id,
+                "policy": policy
+            }
+        )
+    
+    except Exception as e:
+        logger.error(f"更新模式 '{mode_id}' 审批策略失败: {e}")
+        raise HTTPException(status_code=500, detail=f"更新模式 '{mode_id}' 审批策略失败: {str(e)}")
+
+@router.post("/modes/{mode_id}/approval/reset", response_model=ToolConfigResponse, summary="重置指定模式的工具审批策略")
+async def reset_mode_approval_policy(mode_id: str):
+    """重置指定模式的工具审批策略为默认值"""
+    try:
+        tool_config_manager.reset_approval_policy(mode_id)
+        
+        return ToolConfigResponse(
+            success=True,
+            message=f"模式 '{mode_id}' 的审批策略已重置为默认值",
+            data={
+                "mode_id": mode_id,
+                "policy": tool_config_manager.get_approval_policy(mode_id)
+            }
+        )
+    
+    except Exception as e:
+        logger.error(f"重置模式 '{mode_id}' 审批策略失败: {e}")
+        raise HTTPException(status_code=500, detail=f"重置模式 '{mode_id}' 审批策略失败: {str(e)}")
+
 @router.get("/available-tools", response_model=AvailableToolsResponse, summary="获取所有可用的工具")
 async def get_available_tools():
     """获取所有可用的工具"""
@@ -175,6 +236,25 @@ async def get_available_tools():
         logger.error(f"获取可用工具失败: {e}")
         raise HTTPException(status_code=500, detail=f"获取可用工具失败: {str(e)}")
 
+@router.get("/registry-stats", response_model=AvailableToolsResponse, summary="获取工具注册表加载统计")
+async def get_tool_registry_stats():
+    """获取已加载工具的分类索引和各模块加载耗时"""
+    try:
+        from .core.tool_load import tool_registry
+        
+        return AvailableToolsResponse(
+            success=True,
+            message="获取工具注册表统计成功",
+            data={
+                "tools_by_category": tool_registry.get_tools_by_category(),
+                "load_stats": tool_registry.get_load_stats()
+            }
+        )
+    
+    except Exception as e:
+        logger.error(f"获取工具注册表统计失败: {e}")
+        raise HTTPException(status_code=500, detail=f"获取工具注册表统计失败: {str(e)}")
+
 @router.get("/default-config", response_model=ToolConfigResponse, summary="获取默认工具配置")
 async def get_default_tool_config():
     """获取默认工具配置"""
@@ -22,6 +22,7 @@ from ai_agent.core.graph_builder import build_graph, State
 from ai_agent.core.clean_checkpoint import cleanup_conversations
 from ai_agent.core.main_loop import main_loop
 from ai_agent.core.system_prompt_builder import system_prompt_builder
+from ai_agent.core.checkpoint_compression import create_checkpoint_serializer
 from ai_agent.prompts import sys_prompts
 
 # 导入所有工具
@@ -31,7 +32,9 @@ tool = import_tools_from_directory('tool')
 try:
     # 使用SqliteSaver自动管理连接，避免线程问题
     # 直接创建SqliteSaver实例，让它在内部管理连接
-    memory = SqliteSaver(sqlite3.connect("ai_agent/checkpoints.db", check_same_thread=False))
+    memory = SqliteSaver(sqlite3.connect("ai_agent/checkpoints.db", check_same_thread=False),
+                         serde=create_checkpoint_serializer(ai_settings.CHECKPOINT_COMPRESSION,
+                                                            db_path="ai_agent/checkpoints.db"))
 except Exception as e:
     print(f"[ERROR] SQLite检查点初始化失败: {e}")
     exit(1)
@@ -0,0 +1,170 @@
+"""
+检查点压缩基准
+
+在合成的中文小说会话上对比检查点数据块的压缩效果：
+- 不压缩（原 SqliteSaver 行为）
+- zlib
+- zstd
+- zstd + 共享字典（字典用另一个会话训练，避免在测试数据上训练）
+
+报告总大小、压缩率，以及每个数据块的平均编码/解码耗时（含 msgpack 序列化）。
+每轮对话包含续写正文，每 5 轮一次 read_file 读取整章，模拟章节正文在检查点中反复出现的情况。
+
+运行方式（在 backend 目录下）::
+
+    python -m benchmarks.bench_checkpoint_compression --turns 60
+"""
+
+import argparse
+import gc
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.graph import END, START, StateGraph
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ai_agent.config import State
+from ai_agent.core.checkpoint_compression import (
+    ZLIB, ZSTD, CompressedSerializer, decompress_blob, iter_raw_blobs, train_dictionary, zstandard
+)
+
+NAMES = ["林远", "苏晚", "沈青", "顾长风", "叶知秋", "白若雪"]
+PLACES = ["青云山", "洛阳城", "落雁关", "听雨楼", "寒江渡口", "藏经阁"]
+PHRASES = [
+    "夜色渐深，", "风从山口吹来，", "他没有回头，", "远处传来钟声，", "她握紧了手中的剑，",
+    "城门在火光中缓缓倒下，", "雨水顺着屋檐落下，", "众人屏住了呼吸，", "灯火一盏盏熄灭，",
+    "马蹄声由远及近，", "那封信被揉成一团，", "少年抬起头，", "旧日的誓言犹在耳边，",
+]
+ENDINGS = ["。", "，却始终没有开口。", "，仿佛什么也没有发生。", "，心中却早已波澜起伏。", "。"]
+
+
+def make_paragraph(rng: random.Random, sentences: int) -> str:
+    parts = []
+    for _ in range(sentences):
+        parts.append(rng.choice(PHRASES))
+        parts.append(f"{rng.choice(NAMES)}在{rng.choice(PLACES)}")
+        parts.append(rng.choice(ENDINGS))
+    return "".join(parts)
+
+
+def build_graph(memory, rng: random.Random):
+    def call_llm(state):
+        messages = state["messages"]
+        last_human = next(m for m in reversed(messages) if isinstance(m, HumanMessage))
+        if last_human.content.endswith("[tool]") and not isinstance(messages[-1], ToolMessage):
+            return {"messages": [AIMessage(content="", id=str(uuid.uuid4()), tool_calls=[
+                {"name": "read_file", "args": {"path": "第一章.md"}, "id": f"call_{uuid.uuid4().hex[:8]}"}
+            ])]}
+        return {"messages": [AIMessage(content=make_paragraph(rng, 20), id=str(uuid.uuid4()))]}
+
+    def tool_node(state):
+        call = state["messages"][-1].tool_calls[0]
+        chapter = "\n\n".join(make_paragraph(rng, 25) for _ in range(12))
+        return {"messages": [ToolMessage(content=chapter, tool_call_id=call["id"], id=str(uuid.uuid4()))]}
+
+    def route(state):
+        return "tools" if getattr(state["messages"][-1], "tool_calls", None) else END
+
+    builder = StateGraph(State)
+    builder.add_node("call_llm", call_llm)
+    builder.add_node("tools", tool_node)
+    builder.add_edge(START, "call_llm")
+    builder.add_conditional_edges("call_llm", route)
+    builder.add_edge("tools", "call_llm")
+    return builder.compile(checkpointer=memory)
+
+
+def build_session(path: str, turns: int, seed: int) -> sqlite3.Connection:
+    """用未压缩的 SqliteSaver 生成会话，返回数据库连接"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    graph = build_graph(SqliteSaver(conn), rng)
+    config = {"configurable": {"thread_id": f"bench-{seed}"}}
+    for turn in range(turns):
+        text = f"第{turn}轮：{make_paragraph(rng, 2)}" + (" [tool]" if turn % 5 == 4 else "")
+        graph.invoke({"messages": [HumanMessage(content=text, id=str(uuid.uuid4()))]}, config)
+    conn.commit()
+    return conn
+
+
+def load_objects(conn: sqlite3.Connection):
+    """读取全部检查点和 writes，反序列化为原始对象，作为各序列化器的输入"""
+    serde = JsonPlusSerializer()
+    rows = conn.execute("""
+        SELECT type, checkpoint FROM checkpoints
+        UNION ALL
+        SELECT type, value FROM writes WHERE type IS NOT NULL
+    """).fetchall()
+    return [serde.loads_typed(decompress_blob(type_, blob)) for type_, blob in rows if blob is not None]
+
+
+def measure(name: str, serde, objects, repeat: int = 3):
+    """编码/解码全部数据块，耗时取多次中的最小值，减少 GC 等干扰"""
+    encode_time = decode_time = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        encoded = [serde.dumps_typed(obj) for obj in objects]
+        encode_time = min(encode_time, time.perf_counter() - start)
+
+        gc.collect()
+        start = time.perf_counter()
+        for data in encoded:
+            serde.loads_typed(data)
+        decode_time = min(decode_time, time.perf_counter() - start)
+
+    return {
+        "name": name,
+        "bytes": sum(len(blob) for _, blob in encoded),
+        "compressed": sum(1 for type_, _ in encoded if "+" in type_),
+        "encode_us": encode_time / len(objects) * 1e6,
+        "decode_us": decode_time / len(objects) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查点压缩基准")
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--threshold", type=int, default=4096)
+    parser.add_argument("--level", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        train_conn = build_session(os.path.join(tmp, "train.db"), args.turns, seed=1)
+        test_conn = build_session(os.path.join(tmp, "test.db"), args.turns, seed=2)
+        samples = list(iter_raw_blobs(train_conn))
+        objects = load_objects(test_conn)
+        train_conn.close()
+        test_conn.close()
+
+    serializers = [("不压缩", JsonPlusSerializer()),
+                   ("zlib", CompressedSerializer(threshold=args.threshold, codec=ZLIB))]
+    if zstandard is not None:
+        dictionary = train_dictionary(samples)
+        serializers += [
+            ("zstd", CompressedSerializer(threshold=args.threshold, level=args.level, codec=ZSTD)),
+            ("zstd+字典", CompressedSerializer(threshold=args.threshold, level=args.level, codec=ZSTD,
+                                             dictionary=dictionary)),
+        ]
+    else:
+        print("未安装 zstandard，只测试 zlib")
+
+    results = [measure(name, serde, objects) for name, serde in serializers]
+    baseline = results[0]["bytes"]
+    print(f"{args.turns} 轮会话，{len(objects)} 个数据块，压缩阈值 {args.threshold} 字节")
+    print(f"{'方式':<10}{'总大小':>12}{'压缩率':>10}{'压缩块数':>10}{'编码/块':>12}{'解码/块':>12}")
+    for r in results:
+        print(f"{r['name']:<10}{r['bytes'] / 1024 / 1024:>10.2f}MB{baseline / r['bytes']:>9.1f}x"
+              f"{r['compressed']:>10}{r['encode_us']:>10.0f}us{r['decode_us']:>10.0f}us")
+
+
+if __name__ == "__main__":
+    main()
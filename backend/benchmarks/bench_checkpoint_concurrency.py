@@ -0,0 +1,132 @@
+"""
+检查点并发访问基准
+
+多个会话同时对话、同时有请求在读取会话列表和存档点时，对比两种数据库访问方式：
+- 共享连接：所有会话共用一个 SessionIndexedSaver 和一个连接，每次读写都在连接锁上排队、单独提交
+- 写线程+连接池：PooledSessionSaver，写入由 CheckpointDatabase 的写线程合并成批次提交，读取使用只读连接池
+
+图结构与 bench_checkpoint_growth 的归约器实现一致，模型响应用固定文本代替，只测量检查点读写本身。
+
+运行方式（在 backend 目录下）::
+
+    python -m benchmarks.bench_checkpoint_concurrency --sessions 8 --turns 30
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ai_agent.core.db_access import CheckpointDatabase, PooledSessionSaver
+from ai_agent.core.session_index import SessionIndexedSaver, query_sessions
+from benchmarks.bench_checkpoint_growth import build_reducer_graph
+
+
+def _percentile(samples, ratio):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))] if ordered else 0.0
+
+
+def run(kind: str, sessions: int, turns: int, workdir: str):
+    db_path = os.path.join(workdir, f"{kind}.db")
+    db = None
+    if kind == "shared":
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        memory = SessionIndexedSaver(conn, serde=JsonPlusSerializer())
+        memory.setup()
+
+        def read_sessions():
+            with memory.cursor(transaction=False) as cur:
+                query_sessions(cur.connection, limit=20)
+    else:
+        db = CheckpointDatabase(db_path)
+        memory = PooledSessionSaver(db, serde=JsonPlusSerializer())
+
+        def read_sessions():
+            db.read(lambda conn: query_sessions(conn, limit=20))
+
+    graph = build_reducer_graph(memory)
+    turn_times = []
+    read_times = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def chat(index: int):
+        config = {"configurable": {"thread_id": f"bench-{index}"}}
+        for turn in range(turns):
+            text = f"第{turn}轮：继续写下一段" + (" [tool]" if turn % 5 == 4 else "")
+            start = time.perf_counter()
+            graph.invoke({"messages": [HumanMessage(content=text, id=str(uuid.uuid4()))]}, config)
+            graph.get_state(config)
+            with lock:
+                turn_times.append(time.perf_counter() - start)
+
+    def browse():
+        # 模拟前端轮询会话列表
+        while not done.is_set():
+            start = time.perf_counter()
+            read_sessions()
+            with lock:
+                read_times.append(time.perf_counter() - start)
+            time.sleep(0.005)
+
+    workers = [threading.Thread(target=chat, args=(i,)) for i in range(sessions)]
+    reader = threading.Thread(target=browse)
+    start = time.perf_counter()
+    reader.start()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    reader.join()
+
+    metrics = db.metrics() if db is not None else None
+    if db is not None:
+        db.close()
+    else:
+        conn.close()
+    return {
+        "kind": kind,
+        "elapsed": elapsed,
+        "turn_p50": _percentile(turn_times, 0.5),
+        "turn_p95": _percentile(turn_times, 0.95),
+        "read_p95": _percentile(read_times, 0.95),
+        "reads": len(read_times),
+        "metrics": metrics,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查点并发访问基准")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = [run(kind, args.sessions, args.turns, workdir) for kind in ("shared", "pooled")]
+
+    print(f"{args.sessions} 个会话并发，每个 {args.turns} 轮，同时轮询会话列表")
+    print(f"{'实现':<8}{'总耗时':>10}{'单轮p50':>12}{'单轮p95':>12}{'列表p95':>12}{'列表请求数':>12}")
+    for r in results:
+        print(f"{r['kind']:<8}{r['elapsed']:>9.2f}s{r['turn_p50'] * 1000:>10.1f}ms{r['turn_p95'] * 1000:>10.1f}ms"
+              f"{r['read_p95'] * 1000:>10.1f}ms{r['reads']:>12}")
+    metrics = results[-1]["metrics"]
+    write = metrics["write"]
+    print(f"写线程: {write['jobs']} 次写入，{write['batches']} 个批次（平均 {write['avg_batch_size']}，"
+          f"最大 {write['max_batch_size']}），写入延迟 p95 {write['latency_ms_p95']}ms")
+
+
+if __name__ == "__main__":
+    main()
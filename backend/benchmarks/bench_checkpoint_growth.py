@@ -0,0 +1,162 @@
+"""
+检查点存储增长基准
+
+对比两种消息状态管理方式在长会话下的 checkpoints.db 大小和写入耗时：
+- 旧实现：messages 没有归约器，输入和每个节点都写入完整消息列表
+- 归约器：messages 按ID归约，输入只提交新消息，节点只返回增量
+- 消息存储：归约器 + MessageStoreSaver，消息按内容哈希只存一份，检查点只保存引用（不压缩，单独衡量去重效果）
+
+图结构与 build_graph 一致（call_llm -> tools -> call_llm），模型响应用固定中文文本代替，
+只测量检查点读写本身。每 5 轮触发一次工具调用（读取一章正文）。
+
+运行方式（在 backend 目录下）::
+
+    python -m benchmarks.bench_checkpoint_growth --turns 200
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from typing import TypedDict
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.graph import END, START, StateGraph
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ai_agent.config import State
+from ai_agent.core.message_store import MessageStoreSaver
+
+REPLY = "夜色沉沉，少年握紧了手中的剑，望向远处燃烧的城池。" * 16
+CHAPTER = "城门在火光中缓缓倒下，百姓四散奔逃，他却逆着人流向前走去。" * 70
+
+
+class LegacyState(TypedDict):
+    messages: list
+    summary: str
+
+
+def _needs_tool(messages) -> bool:
+    last_human = next(m for m in reversed(messages) if isinstance(m, HumanMessage))
+    return last_human.content.endswith("[tool]")
+
+
+def _reply(messages) -> AIMessage:
+    if _needs_tool(messages) and not isinstance(messages[-1], ToolMessage):
+        return AIMessage(content="", id=str(uuid.uuid4()), tool_calls=[
+            {"name": "read_file", "args": {"path": "第一章.md"}, "id": f"call_{uuid.uuid4().hex[:8]}"}
+        ])
+    return AIMessage(content=REPLY, id=str(uuid.uuid4()))
+
+
+def _route(state):
+    last = state["messages"][-1]
+    return "tools" if getattr(last, "tool_calls", None) else END
+
+
+def build_legacy_graph(memory):
+    def call_llm(state):
+        messages = state["messages"]
+        return {"messages": messages + [_reply(messages)]}
+
+    def tool_node(state):
+        messages = state["messages"]
+        call = messages[-1].tool_calls[0]
+        return {"messages": messages + [ToolMessage(content=CHAPTER, tool_call_id=call["id"])]}
+
+    builder = StateGraph(LegacyState)
+    builder.add_node("call_llm", call_llm)
+    builder.add_node("tools", tool_node)
+    builder.add_edge(START, "call_llm")
+    builder.add_conditional_edges("call_llm", _route)
+    builder.add_edge("tools", "call_llm")
+    return builder.compile(checkpointer=memory)
+
+
+def build_reducer_graph(memory):
+    def call_llm(state):
+        return {"messages": [_reply(state["messages"])]}
+
+    def tool_node(state):
+        call = state["messages"][-1].tool_calls[0]
+        return {"messages": [ToolMessage(content=CHAPTER, tool_call_id=call["id"], id=str(uuid.uuid4()))]}
+
+    builder = StateGraph(State)
+    builder.add_node("call_llm", call_llm)
+    builder.add_node("tools", tool_node)
+    builder.add_edge(START, "call_llm")
+    builder.add_conditional_edges("call_llm", _route)
+    builder.add_edge("tools", "call_llm")
+    return builder.compile(checkpointer=memory)
+
+
+def run_session(kind: str, turns: int, workdir: str):
+    db_path = os.path.join(workdir, f"{kind}.db")
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    if kind == "store":
+        memory = MessageStoreSaver(conn, serde=JsonPlusSerializer())
+    else:
+        memory = SqliteSaver(conn)
+    graph = build_legacy_graph(memory) if kind == "legacy" else build_reducer_graph(memory)
+    config = {"configurable": {"thread_id": "bench"}}
+
+    turn_times = []
+    for turn in range(turns):
+        text = f"第{turn}轮：继续写下一段" + (" [tool]" if turn % 5 == 4 else "")
+        human = HumanMessage(content=text, id=str(uuid.uuid4()))
+        start = time.perf_counter()
+        if kind == "legacy":
+            current = graph.get_state(config).values.get("messages", [])
+            graph.invoke({"messages": current + [human]}, config)
+        else:
+            graph.invoke({"messages": [human]}, config)
+        turn_times.append(time.perf_counter() - start)
+
+    message_count = len(graph.get_state(config).values["messages"])
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    checkpoints_bytes = conn.execute("SELECT COALESCE(SUM(LENGTH(checkpoint)), 0) FROM checkpoints").fetchone()[0]
+    writes_bytes = conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM writes").fetchone()[0]
+    if kind == "store":
+        checkpoints_bytes += conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(blob)), 0) FROM message_store"
+        ).fetchone()[0]
+        checkpoints_bytes += conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(refs)), 0) FROM checkpoint_message_refs"
+        ).fetchone()[0]
+    conn.close()
+    return {
+        "kind": kind,
+        "messages": message_count,
+        "db_size": os.path.getsize(db_path),
+        "checkpoints_bytes": checkpoints_bytes,
+        "writes_bytes": writes_bytes,
+        "total_time": sum(turn_times),
+        "last_10_avg": sum(turn_times[-10:]) / min(10, len(turn_times)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查点存储增长基准")
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = [run_session(kind, args.turns, workdir) for kind in ("legacy", "reducer", "store")]
+
+    print(f"{args.turns} 轮会话（每 5 轮一次工具调用）")
+    print(f"{'实现':<8}{'消息数':>8}{'DB大小':>12}{'checkpoints':>14}{'writes':>12}{'总写入耗时':>12}{'末10轮均值':>12}")
+    for r in results:
+        print(f"{r['kind']:<8}{r['messages']:>8}{r['db_size'] / 1024 / 1024:>10.1f}MB"
+              f"{r['checkpoints_bytes'] / 1024 / 1024:>12.1f}MB{r['writes_bytes'] / 1024 / 1024:>10.1f}MB"
+              f"{r['total_time']:>11.2f}s{r['last_10_avg'] * 1000:>10.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+存档点列表基准
+
+对比 /api/history/checkpoints 的两种实现：
+- 旧实现：graph.get_state_history 反序列化全部检查点（含完整消息列表）
+- 摘要读取器：按 checkpoint_id 分页，只解码最后一条消息，摘要缓存
+
+运行方式（在 backend 目录下）::
+
+    python -m benchmarks.bench_checkpoint_list --turns 200
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+
+from langchain_core.messages import HumanMessage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ai_agent.core.checkpoint_summary import CheckpointSummaryReader
+from ai_agent.core.session_index import SessionIndexedSaver
+from benchmarks.bench_checkpoint_growth import build_reducer_graph
+
+
+def main():
+    parser = argparse.ArgumentParser(description="存档点列表基准")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--page", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "checkpoints.db"), check_same_thread=False)
+        saver = SessionIndexedSaver(conn)
+        graph = build_reducer_graph(saver)
+        config = {"configurable": {"thread_id": "bench"}}
+        for turn in range(args.turns):
+            text = f"第{turn}轮：继续写下一段" + (" [tool]" if turn % 5 == 4 else "")
+            graph.invoke({"messages": [HumanMessage(content=text, id=str(uuid.uuid4()))]}, config)
+
+        start = time.perf_counter()
+        history = list(graph.get_state_history(config))
+        legacy = time.perf_counter() - start
+
+        reader = CheckpointSummaryReader()
+        start = time.perf_counter()
+        first_page = list(reader.iter_summaries(conn, saver.serde, "bench", limit=args.page))
+        cold_page = time.perf_counter() - start
+
+        start = time.perf_counter()
+        list(reader.iter_summaries(conn, saver.serde, "bench", limit=args.page))
+        warm_page = time.perf_counter() - start
+
+        start = time.perf_counter()
+        list(reader.iter_summaries(conn, saver.serde, "bench", before=first_page[-1]["checkpoint_id"]))
+        rest = time.perf_counter() - start
+        conn.close()
+
+    print(f"{args.turns} 轮会话，共 {len(history)} 个检查点")
+    print(f"旧实现（get_state_history 全量）: {legacy * 1000:.1f} ms")
+    print(f"摘要读取器（首页 {args.page} 条，冷）: {cold_page * 1000:.2f} ms")
+    print(f"摘要读取器（首页 {args.page} 条，缓存）: {warm_page * 1000:.2f} ms")
+    print(f"摘要读取器（其余全部，冷）: {rest * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
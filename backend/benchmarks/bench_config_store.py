@@ -0,0 +1,78 @@
+"""
+store.json 配置访问微基准
+
+对比两种读取方式：
+- 旧实现：每次访问都 open + json.load 整个 store.json
+- 配置服务：stat 检查修改时间，未变化时直接读取内存快照
+
+运行方式（在 backend 目录下）::
+
+    python -m benchmarks.bench_config_store
+"""
+
+import json
+import os
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.config_store import ConfigStore
+
+# 一次 build_graph 大约读取的配置键
+KEYS = [
+    "selectedModel", "selectedProvider", "deepseekApiKey", "aiParameters",
+    "customPrompts", "additionalInfo", "mode_tools", "currentMode",
+    "ollamaBaseUrl", "embeddingModel", "embeddingUrl", "retrievalTopK",
+]
+
+
+def make_store(path: Path):
+    """生成接近真实规模的 store.json（持久记忆中包含整章正文）"""
+    chapter = "夜色沉沉，少年握紧了手中的剑，望向远处燃烧的城池。" * 800
+    config = {
+        "selectedModel": "deepseek/deepseek-chat",
+        "selectedProvider": "deepseek",
+        "deepseekApiKey": "sk-xxxxxxxx",
+        "currentMode": "writing",
+        "aiParameters": {m: {"max_tokens": 8192, "temperature": 0.7} for m in ("outline", "writing", "adjustment")},
+        "customPrompts": {"writing": "你是一位专业小说代笔" * 20},
+        "additionalInfo": {
+            m: {"outline": "大纲" * 500, "previousChapter": chapter, "characterSettings": "人设" * 300}
+            for m in ("outline", "writing", "adjustment")
+        },
+        "mode_tools": {"writing": {"enabled_tools": ["read_file", "write_file"]}},
+        "embeddingModel": "text-embedding-v4",
+        "embeddingUrl": "http://127.0.0.1:4000",
+        "retrievalTopK": 5,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+
+
+def legacy_get(path: Path, key: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get(key)
+
+
+def main(number: int = 200):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "store.json"
+        make_store(path)
+        store = ConfigStore(path)
+        size_kb = path.stat().st_size / 1024
+
+        legacy = timeit.timeit(lambda: [legacy_get(path, k) for k in KEYS], number=number)
+        cached = timeit.timeit(lambda: [store.get(k) for k in KEYS], number=number)
+
+        per_build_legacy = legacy / number * 1000
+        per_build_cached = cached / number * 1000
+        print(f"store.json 大小: {size_kb:.1f} KB，每次构建读取 {len(KEYS)} 个键，重复 {number} 次")
+        print(f"旧实现 (open + json.load): {per_build_legacy:.3f} ms / 次构建")
+        print(f"配置服务 (stat + 快照):     {per_build_cached:.3f} ms / 次构建")
+        print(f"加速比: {per_build_legacy / per_build_cached:.1f}x，快照重新解析次数: {store.reload_count}")
+
+
+if __name__ == "__main__":
+    main()
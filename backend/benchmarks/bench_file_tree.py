@@ -0,0 +1,197 @@
+"""
+文件树构建基准
+
+在临时目录生成合成小说（默认 500 个文件夹、10000 个章节），对比
+- 原实现：os.listdir + 逐个 os.path.isdir，子目录排序两次，每次排序 print 完整项目列表（输出计入耗时）
+- 单次遍历：os.scandir 条目类型 + 每个目录排序一次 + 采样调试日志
+- 文件树索引：冷启动完整扫描、无变化时读取快照、新增一个章节后的增量更新
+
+运行方式（在 backend 目录下）::
+
+    python -m benchmarks.bench_file_tree --folders 500 --chapters 10000 --rounds 5
+"""
+
+import argparse
+import asyncio
+import contextlib
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from file.managers.file_tree_index import FileTreeIndex
+from file.managers.sort_config_manager import sort_config_manager
+from file.utils.file_tree_builder import add_display_prefixes, walk_directory_tree
+
+logger = logging.getLogger(__name__)
+
+
+class CountingSink:
+    """统计写入的字节数，代替 stdout（不把基准结果淹没在输出中，同时保留格式化和写入的开销）"""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, text):
+        self.bytes += len(text.encode("utf-8"))
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def legacy_sort_items(items, directory_path=""):
+    """原 file_tree_builder.sort_items（每次调用 print 完整项目列表）"""
+    if not items or not isinstance(items, list):
+        print(f"[file-tree-builder] sortItems: 传入空数组或无效数据，返回空数组")
+        return []
+
+    print(f"[file-tree-builder] sortItems: 开始排序目录 {directory_path}，项目数量: {len(items)}")
+    print(f"[file-tree-builder] sortItems: 原始项目: {[{'title': item['title'], 'isFolder': item.get('isFolder', False)} for item in items]}")
+
+    custom_sorted = sort_config_manager.apply_custom_order(items, directory_path)
+
+    print(f"[file-tree-builder] sortItems: 自定义排序结果 === 原始项目: {custom_sorted is items}")
+    print(f"[file-tree-builder] sortItems: 排序是否启用: {sort_config_manager.is_sort_enabled()}")
+
+    if custom_sorted is items or not sort_config_manager.is_sort_enabled():
+        print(f"[file-tree-builder] sortItems: 使用默认排序")
+        default_sorted = sort_config_manager.sort_items_default(custom_sorted)
+        result = add_display_prefixes(default_sorted)
+        print(f"[file-tree-builder] sortItems: 默认排序完成，结果数量: {len(result)}")
+        return result
+
+    print(f"[file-tree-builder] sortItems: 使用自定义排序")
+    result = add_display_prefixes(custom_sorted)
+    print(f"[file-tree-builder] sortItems: 自定义排序完成，结果数量: {len(result)}")
+    return result
+
+
+async def legacy_read_directory_recursive(dir_path, base_dir_path):
+    """原 file_tree_builder.read_directory_recursive"""
+    print(f"[file-tree-builder] readDirectoryRecursive: 正在读取目录: {dir_path}")
+
+    try:
+        entries = os.listdir(dir_path)
+    except Exception as e:
+        print(f"[file-tree-builder] 读取目录失败 {dir_path}: {e}")
+        return []
+
+    print(f"[file-tree-builder] readDirectoryRecursive: 目录 {dir_path} 读取到的条目: {entries}")
+    result = []
+
+    for entry_name in entries:
+        if entry_name.startswith('.') or entry_name.startswith('$'):
+            print(f"[file-tree-builder] readDirectoryRecursive: 忽略条目: {entry_name}")
+            continue
+
+        full_path = os.path.join(dir_path, entry_name)
+        relative_path = os.path.relpath(full_path, base_dir_path)
+
+        if os.path.isdir(full_path):
+            children = await legacy_read_directory_recursive(full_path, base_dir_path)
+            result.append({
+                "id": relative_path.replace("\\", "/"),
+                "title": entry_name,
+                "isFolder": True,
+                "children": legacy_sort_items(children, relative_path)
+            })
+        else:
+            result.append({
+                "id": relative_path.replace("\\", "/"),
+                "title": entry_name,
+                "isFolder": False
+            })
+
+    current_dir_path = "" if dir_path == base_dir_path else os.path.relpath(dir_path, base_dir_path).replace("\\", "/")
+    print(f"[file-tree-builder] readDirectoryRecursive: 准备排序目录 {current_dir_path}，项目数量: {len(result)}")
+    sorted_result = legacy_sort_items(result, current_dir_path)
+    print(f"[file-tree-builder] readDirectoryRecursive: 排序完成，返回项目数量: {len(sorted_result)}")
+    return sorted_result
+
+
+def build_novel(root: str, folders: int, chapters: int):
+    """生成合成小说：每 10 个文件夹归入一卷，章节平均分到各文件夹"""
+    volumes = max(1, folders // 10)
+    folder_paths = []
+    for index in range(folders):
+        volume = os.path.join(root, f"第{index % volumes + 1}卷")
+        path = os.path.join(volume, f"第{index + 1}部分")
+        os.makedirs(path, exist_ok=True)
+        folder_paths.append(path)
+    for index in range(chapters):
+        path = os.path.join(folder_paths[index % folders], f"第{index + 1}章.md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("")
+    with open(os.path.join(root, ".sort-config.json"), "w", encoding="utf-8") as f:
+        f.write("{}")
+
+
+def _time(func, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文件树构建基准")
+    parser.add_argument("--folders", type=int, default=500)
+    parser.add_argument("--chapters", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_file_tree_")
+    try:
+        build_novel(root, args.folders, args.chapters)
+
+        sink = CountingSink()
+
+        def run_legacy():
+            with contextlib.redirect_stdout(sink):
+                return asyncio.run(legacy_read_directory_recursive(root, root))
+
+        def run_walk():
+            return walk_directory_tree(root, root)
+
+        assert run_legacy() == run_walk(), "单次遍历的结果与原实现不一致"
+        sink.bytes = 0
+        legacy_seconds = _time(run_legacy, args.rounds)
+        legacy_output = sink.bytes / args.rounds
+        walk_seconds = _time(run_walk, args.rounds)
+
+        index = FileTreeIndex(root)
+        cold_seconds = _time(index.load, args.rounds)
+        assert index.snapshot() == run_walk(), "文件树索引的结果与单次遍历不一致"
+        snapshot_seconds = _time(index.snapshot, args.rounds * 100)
+
+        counter = [0]
+
+        def run_incremental():
+            counter[0] += 1
+            path = os.path.join(root, "第1卷", "第1部分", f"新增{counter[0]}.md")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("")
+            index.apply_changes([path])
+            index.snapshot()
+
+        incremental_seconds = _time(run_incremental, args.rounds)
+
+        print(f"合成小说: {args.folders} 个文件夹，{args.chapters} 个章节")
+        print(f"{'实现':<20}{'耗时':>12}")
+        print(f"{'原实现':<20}{legacy_seconds * 1000:>10.1f}ms  （stdout 输出 {legacy_output / 1024 / 1024:.1f}MB）")
+        print(f"{'单次遍历':<20}{walk_seconds * 1000:>10.1f}ms")
+        print(f"{'索引冷启动扫描':<20}{cold_seconds * 1000:>10.1f}ms")
+        print(f"{'索引读取快照':<20}{snapshot_seconds * 1000:>10.4f}ms")
+        print(f"{'索引新增一章':<20}{incremental_seconds * 1000:>10.2f}ms")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+会话列表查询基准
+
+对比 /api/history/sessions 的两种实现：
+- 旧实现：DISTINCT thread_id 后逐个会话 COUNT，并用三次 ORDER BY 查询解码整个检查点读取时间戳和预览
+- 会话索引表：一次带索引的分页查询
+
+运行方式（在 backend 目录下）::
+
+    python -m benchmarks.bench_sessions_list --sessions 300 --turns 10
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+
+import msgpack
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import START, END, StateGraph
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ai_agent.config import State
+from ai_agent.core.checkpoint_compression import decompress_blob
+from ai_agent.core.session_index import SessionIndexedSaver, query_sessions
+
+REPLY = "夜色沉沉，少年握紧了手中的剑，望向远处燃烧的城池。" * 16
+
+
+def build_db(path: str, sessions: int, turns: int):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    saver = SessionIndexedSaver(conn, mode="writing")
+    builder = StateGraph(State)
+    builder.add_node("call_llm", lambda s: {"messages": [AIMessage(content=REPLY, id=str(uuid.uuid4()))]})
+    builder.add_edge(START, "call_llm")
+    builder.add_edge("call_llm", END)
+    graph = builder.compile(checkpointer=saver)
+    for s in range(sessions):
+        config = {"configurable": {"thread_id": f"session-{s}"}}
+        for t in range(turns):
+            graph.invoke({"messages": [HumanMessage(content=f"第{t}轮：继续写", id=str(uuid.uuid4()))]}, config)
+    conn.commit()
+    return conn
+
+
+def legacy_list(conn: sqlite3.Connection):
+    """旧实现的查询方式（与原 get_all_sessions 相同的 SQL 和解码，压缩的检查点先解压）"""
+    def unpack(row):
+        return msgpack.unpackb(decompress_blob(*row)[1])
+
+    cursor = conn.cursor()
+    cursor.execute('SELECT DISTINCT thread_id FROM checkpoints')
+    result = []
+    for (thread_id,) in cursor.fetchall():
+        cursor.execute('SELECT COUNT(*) FROM checkpoints WHERE thread_id = ?', (thread_id,))
+        count = cursor.fetchone()[0]
+        cursor.execute('SELECT type, checkpoint FROM checkpoints WHERE thread_id = ? ORDER BY checkpoint_id ASC LIMIT 1', (thread_id,))
+        created_at = unpack(cursor.fetchone()).get('ts')
+        cursor.execute('SELECT type, checkpoint FROM checkpoints WHERE thread_id = ? ORDER BY checkpoint_id DESC LIMIT 1', (thread_id,))
+        last_accessed = unpack(cursor.fetchone()).get('ts')
+        cursor.execute('SELECT type, checkpoint FROM checkpoints WHERE thread_id = ? ORDER BY checkpoint_id DESC LIMIT 1', (thread_id,))
+        data = unpack(cursor.fetchone())
+        messages = data.get('channel_values', {}).get('__start__', {}).get('messages', [])
+        result.append((thread_id, count, created_at, last_accessed, len(messages)))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会话列表查询基准")
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "checkpoints.db")
+        start = time.perf_counter()
+        conn = build_db(path, args.sessions, args.turns)
+        print(f"构建 {args.sessions} 个会话 × {args.turns} 轮，耗时 {time.perf_counter() - start:.1f}s，"
+              f"数据库 {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+
+        def timed(func):
+            samples = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                func()
+                samples.append(time.perf_counter() - t0)
+            return min(samples) * 1000
+
+        legacy = timed(lambda: legacy_list(conn))
+        indexed_all = timed(lambda: query_sessions(conn))
+        indexed_page = timed(lambda: query_sessions(conn, limit=50, offset=100))
+        conn.close()
+
+    print(f"旧实现（逐会话查询并解码）: {legacy:.1f} ms")
+    print(f"会话索引表（全部）:         {indexed_all:.2f} ms")
+    print(f"会话索引表（分页 50 条）:   {indexed_page:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
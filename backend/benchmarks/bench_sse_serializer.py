@@ -0,0 +1,245 @@
+"""
+SSE 事件序列化基准
+
+用真实形态的流式事件（legacy 协议每个节点更新携带完整消息列表、token 事件、中断前的状态快照）对比
+- 原实现：逐个 hasattr/isinstance 判断的递归序列化 + json.dumps + Base64
+- 按类型分派的序列化 + json.dumps + Base64（legacy 默认编码，逐字节校验与原实现一致）
+- 按类型分派的序列化 + orjson 直接输出 UTF-8 JSON（sse_encoding=json）
+
+运行方式（在 backend 目录下）::
+
+    python -m benchmarks.bench_sse_serializer --messages 200 --rounds 20
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+import uuid
+
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, SystemMessage, ToolMessage
+from langgraph.types import Interrupt, StateSnapshot
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ai_agent.chat_api import SSE_ENCODING_BASE64, SSE_ENCODING_JSON, build_token_event, encode_sse_event
+from ai_agent.core.fast_serializer import serialize_langchain_object
+
+logger = logging.getLogger(__name__)
+
+REPLY = "夜色沉沉，少年握紧了手中的剑，望向远处燃烧的城池。" * 16
+CHAPTER = "城门在火光中缓缓倒下，百姓四散奔逃，他却逆着人流向前走去。" * 70
+
+
+def legacy_serialize(obj):
+    """原 chat_api.serialize_langchain_object（逐个 hasattr/isinstance 判断的递归实现）"""
+    try:
+        result = {}
+        
+        # 处理Stream对象 - 优先处理，避免后续尝试调用model_dump()
+        if hasattr(obj, '__class__') and obj.__class__.__name__ == 'Stream':
+            return {
+                'type': 'stream',
+                'content': str(obj),
+                'class_name': obj.__class__.__name__
+            }
+        
+        # 处理StateSnapshot对象 - 这是主要的返回对象
+        if isinstance(obj, StateSnapshot):
+            result.update({
+                'type': 'state_snapshot',
+                'values': legacy_serialize(getattr(obj, 'values', {})),
+                'next': getattr(obj, 'next', None),
+                'config': getattr(obj, 'config', {}),
+                'metadata': getattr(obj, 'metadata', {}),
+                'created_at': getattr(obj, 'created_at', None),
+                'parent_config': getattr(obj, 'parent_config', None),
+                'tasks': legacy_serialize(getattr(obj, 'tasks', [])),
+                'interrupts': legacy_serialize(getattr(obj, 'interrupts', [])),
+            })
+        
+        # 处理各种消息类型
+        if isinstance(obj, (SystemMessage, HumanMessage, AIMessage, ToolMessage)):
+            message_data = {
+                'type': obj.__class__.__name__.lower(),
+                'content': getattr(obj, 'content', ''),
+                'additional_kwargs': legacy_serialize(getattr(obj, 'additional_kwargs', {})),
+                'response_metadata': legacy_serialize(getattr(obj, 'response_metadata', {})),
+                'id': getattr(obj, 'id', '')
+            }
+            
+            # 处理AIMessage特有的字段
+            if isinstance(obj, AIMessage):
+                message_data.update({
+                    'tool_calls': legacy_serialize(getattr(obj, 'tool_calls', [])),
+                    'usage_metadata': legacy_serialize(getattr(obj, 'usage_metadata', {})),
+                    'refusal': getattr(obj, 'refusal', None)
+                })
+            
+            # 处理ToolMessage特有的字段
+            if isinstance(obj, ToolMessage):
+                message_data.update({
+                    'tool_call_id': getattr(obj, 'tool_call_id', '')
+                })
+            
+            result.update(message_data)
+        
+        # 处理Interrupt对象
+        if isinstance(obj, Interrupt):
+            result.update({
+                'type': 'interrupt',
+                'value': getattr(obj, 'value', ''),
+                'id': getattr(obj, 'id', '')
+            })
+        
+        # 处理PregelTask对象（使用字符串检查作为备用）
+        if hasattr(obj, '__class__') and obj.__class__.__name__ == 'PregelTask':
+            result.update({
+                'type': 'pregel_task',
+                'id': getattr(obj, 'id', ''),
+                'name': getattr(obj, 'name', ''),
+                'path': legacy_serialize(getattr(obj, 'path', ())),
+                'error': getattr(obj, 'error', None),
+                'interrupts': legacy_serialize(getattr(obj, 'interrupts', ())),
+                'state': getattr(obj, 'state', None),
+                'result': getattr(obj, 'result', None)
+            })
+        
+        # 如果已经处理了特定类型，直接返回结果
+        if result:
+            return result
+        
+        # 处理字典、列表、元组等基础数据结构
+        if isinstance(obj, dict):
+            return {k: legacy_serialize(v) for k, v in obj.items()}
+        elif isinstance(obj, list):
+            return [legacy_serialize(item) for item in obj]
+        elif isinstance(obj, tuple):
+            return [legacy_serialize(item) for item in obj]
+        elif isinstance(obj, (str, int, float, bool, type(None))):
+            # 基础类型直接返回
+            return obj
+        else:
+            # 对于其他无法序列化的对象，尝试获取其属性
+            try:
+                # 检查是否有model_dump方法（Pydantic模型）
+                if hasattr(obj, 'model_dump') and callable(getattr(obj, 'model_dump')):
+                    return legacy_serialize(obj.model_dump())
+                # 尝试获取对象的可序列化属性
+                elif hasattr(obj, '__dict__'):
+                    return legacy_serialize(obj.__dict__)
+                else:
+                    # 最后尝试字符串表示
+                    return str(obj)
+            except Exception as inner_e:
+                logger.warning(f"Fallback serialization failed for {type(obj)}: {inner_e}")
+                return repr(obj)
+    except Exception as e:
+        logger.error(f"Serialization error for object {type(obj)}: {e}")
+        return {"type": "serialization_error", "error": str(e)}
+
+
+def build_history(count: int):
+    messages = [SystemMessage(content="你是一名小说写作助手", id=str(uuid.uuid4()))]
+    while len(messages) < count:
+        turn = len(messages) // 4
+        call_id = f"call_{uuid.uuid4().hex[:8]}"
+        messages.append(HumanMessage(content=f"第{turn}轮：继续写下一段", id=str(uuid.uuid4())))
+        messages.append(AIMessage(
+            content="", id=str(uuid.uuid4()),
+            tool_calls=[{"name": "read_file", "args": {"file_path": "第一章.md"}, "id": call_id}],
+            response_metadata={"finish_reason": "tool_calls", "model_name": "deepseek-chat"},
+            usage_metadata={"input_tokens": 1200, "output_tokens": 30, "total_tokens": 1230},
+        ))
+        messages.append(ToolMessage(content=CHAPTER, tool_call_id=call_id, id=str(uuid.uuid4()),
+                                    response_metadata={"duration_ms": 3.2}))
+        messages.append(AIMessage(
+            content=REPLY, id=str(uuid.uuid4()),
+            response_metadata={"finish_reason": "stop", "model_name": "deepseek-chat"},
+            usage_metadata={"input_tokens": 2400, "output_tokens": 300, "total_tokens": 2700},
+        ))
+    return messages[:count]
+
+
+def build_events(count: int):
+    """一轮带工具调用的对话在 legacy 协议下产生的事件"""
+    history = build_history(count)
+    config = {"configurable": {"thread_id": "bench", "checkpoint_ns": "", "checkpoint_id": str(uuid.uuid4())}}
+    snapshot = StateSnapshot(
+        values={"messages": history, "summary": ""},
+        next=("tools",),
+        config=config,
+        metadata={"source": "loop", "step": 12, "parents": {}},
+        created_at="2026-01-01T00:00:00+00:00",
+        parent_config=config,
+        tasks=(),
+        interrupts=(Interrupt(value="工具中断，扣1恢复，扣2取消", id=uuid.uuid4().hex),),
+    )
+    chunks = [{"call_llm": {"messages": history}}, {"tools": {"messages": history}},
+              {"call_llm": {"messages": history}}, snapshot]
+    tokens = [
+        (AIMessageChunk(content=char, id="run-1"), {"langgraph_node": "call_llm"})
+        for char in REPLY[:120]
+    ]
+    return chunks, tokens
+
+
+def _time(func, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSE 事件序列化基准")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    chunks, tokens = build_events(args.messages)
+
+    legacy = [encode_sse_event(legacy_serialize(chunk)) for chunk in chunks]
+    fast = [encode_sse_event(serialize_langchain_object(chunk)) for chunk in chunks]
+    assert legacy == fast, "按类型分派的序列化结果与原实现不一致"
+    token_events = [build_token_event(*token) for token in tokens]
+
+    def run_legacy():
+        for chunk in chunks:
+            encode_sse_event(legacy_serialize(chunk))
+
+    def run_fast():
+        for chunk in chunks:
+            encode_sse_event(serialize_langchain_object(chunk))
+
+    def run_fast_json():
+        for chunk in chunks:
+            encode_sse_event(serialize_langchain_object(chunk), SSE_ENCODING_JSON)
+
+    def run_tokens(encoding):
+        return lambda: [encode_sse_event(event, encoding) for event in token_events]
+
+    def size(events):
+        return sum(len(event.encode("utf-8")) for event in events)
+
+    json_events = [encode_sse_event(serialize_langchain_object(c), SSE_ENCODING_JSON) for c in chunks]
+    rows = [
+        ("原实现 + Base64", _time(run_legacy, args.rounds), size(legacy)),
+        ("分派 + Base64", _time(run_fast, args.rounds), size(fast)),
+        ("分派 + orjson", _time(run_fast_json, args.rounds), size(json_events)),
+    ]
+    legacy_only = _time(lambda: [legacy_serialize(chunk) for chunk in chunks], args.rounds)
+    fast_only = _time(lambda: [serialize_langchain_object(chunk) for chunk in chunks], args.rounds)
+
+    print(f"{args.messages} 条消息的会话，一轮 {len(chunks)} 个 legacy 事件（Base64 输出与原实现逐字节一致）")
+    print(f"{'实现':<16}{'每轮耗时':>12}{'输出大小':>14}")
+    for name, seconds, total in rows:
+        print(f"{name:<16}{seconds * 1000:>10.2f}ms{total / 1024:>12.1f}KB")
+    print(f"仅序列化: 原实现 {legacy_only * 1000:.2f}ms，分派 {fast_only * 1000:.2f}ms")
+    base64_tokens = _time(run_tokens(SSE_ENCODING_BASE64), args.rounds)
+    json_tokens = _time(run_tokens(SSE_ENCODING_JSON), args.rounds)
+    print(f"{len(token_events)} 个 token 事件: Base64 {base64_tokens * 1000:.2f}ms，orjson {json_tokens * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+消息裁剪基准
+
+模拟一次包含多步工具调用的对话：每一步 call_llm 都要在完整历史上裁剪一次。对比
+- trim_messages + count_tokens_approximately：每次从头重新计数所有消息
+- TokenCounter.trim：每条消息只估算一次，从最新消息向前累加缓存的计数
+
+同时对比两种估算在中文正文上的误差（以 DeepSeek 的 1 个中文字符约 0.6 token 为参照）。
+
+运行方式（在 backend 目录下）::
+
+    python -m benchmarks.bench_token_trim --messages 400 --steps 20
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately, trim_messages
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ai_agent.core.token_counter import DEFAULT_ESTIMATOR_OPTIONS, TokenCounter
+
+REPLY = "夜色沉沉，少年握紧了手中的剑，望向远处燃烧的城池。" * 16
+CHAPTER = "城门在火光中缓缓倒下，百姓四散奔逃，他却逆着人流向前走去。" * 70
+
+
+def build_history(count: int):
+    messages = []
+    while len(messages) < count:
+        turn = len(messages) // 4
+        call_id = f"call_{uuid.uuid4().hex[:8]}"
+        messages.append(HumanMessage(content=f"第{turn}轮：继续写下一段", id=str(uuid.uuid4())))
+        messages.append(AIMessage(content="", id=str(uuid.uuid4()), tool_calls=[
+            {"name": "read_file", "args": {"path": "第一章.md"}, "id": call_id}
+        ]))
+        messages.append(ToolMessage(content=CHAPTER, tool_call_id=call_id, id=str(uuid.uuid4())))
+        messages.append(AIMessage(content=REPLY, id=str(uuid.uuid4())))
+    return messages
+
+
+def simulate(messages, steps: int, max_tokens: int, trim):
+    """工具循环：每一步追加一条工具调用和一条工具结果后重新裁剪"""
+    history = list(messages) + [HumanMessage(content="继续", id=str(uuid.uuid4()))]
+    elapsed = 0.0
+    kept = 0
+    for _ in range(steps):
+        start = time.perf_counter()
+        kept = len(trim(history, max_tokens))
+        elapsed += time.perf_counter() - start
+        call_id = f"call_{uuid.uuid4().hex[:8]}"
+        history.append(AIMessage(content="", id=str(uuid.uuid4()), tool_calls=[
+            {"name": "read_file", "args": {"path": "第二章.md"}, "id": call_id}
+        ]))
+        history.append(ToolMessage(content=CHAPTER, tool_call_id=call_id, id=str(uuid.uuid4())))
+    return elapsed, kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description="消息裁剪基准")
+    parser.add_argument("--messages", type=int, default=400)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--max-tokens", type=int, default=32000)
+    args = parser.parse_args()
+
+    messages = build_history(args.messages)
+
+    def legacy(history, max_tokens):
+        return trim_messages(history, strategy="last", token_counter=count_tokens_approximately,
+                             max_tokens=max_tokens, start_on="human", end_on=("human", "tool"))
+
+    counter = TokenCounter(options={**DEFAULT_ESTIMATOR_OPTIONS, "calibrate": False})
+
+    legacy_time, legacy_kept = simulate(messages, args.steps, args.max_tokens, legacy)
+    cached_time, cached_kept = simulate(messages, args.steps, args.max_tokens, counter.trim)
+
+    print(f"{len(messages)} 条历史消息，工具循环 {args.steps} 步，上下文上限 {args.max_tokens}")
+    print(f"{'实现':<10}{'总耗时':>12}{'每步':>12}{'保留消息':>10}")
+    print(f"{'legacy':<10}{legacy_time * 1000:>10.1f}ms{legacy_time / args.steps * 1000:>10.2f}ms{legacy_kept:>10}")
+    print(f"{'cached':<10}{cached_time * 1000:>10.1f}ms{cached_time / args.steps * 1000:>10.2f}ms{cached_kept:>10}")
+    print(f"缓存命中 {counter.hits}，估算 {counter.misses} 次")
+
+    sample = [ToolMessage(content=CHAPTER, tool_call_id="call_x")]
+    reference = len(CHAPTER) * DEFAULT_ESTIMATOR_OPTIONS["cjkTokensPerChar"]
+    print(f"整章正文（{len(CHAPTER)} 字）估算: chars/4 = {count_tokens_approximately(sample)}，"
+          f"CJK 估算 = {counter.count(sample)}，参照值约 {reference:.0f}")
+
+
+if __name__ == "__main__":
+    main()
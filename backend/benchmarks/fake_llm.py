@@ -0,0 +1,101 @@
+"""
+本地假 LLM 网关
+模拟 LiteLLM 的 OpenAI 兼容接口 /chat/completions，用固定延迟返回中文文本，供基准和压测使用
+
+支持普通响应和 stream=True 的 SSE 增量响应。单独运行::
+
+    python -m benchmarks.fake_llm --port 4000 --latency 1.0
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+REPLY = "夜色沉沉，少年握紧了手中的剑，望向远处燃烧的城池。"
+
+
+def create_app(latency: float = 1.0, tokens: int = 20) -> FastAPI:
+    """创建假网关应用
+
+    Args:
+        latency: 完整响应的总耗时（秒），流式模式下平均分摊到每个增量
+        tokens: 流式模式下的增量块数量
+    """
+    app = FastAPI()
+
+    @app.post("/chat/completions")
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake-model")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": REPLY * 2},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 10, "completion_tokens": tokens, "total_tokens": 10 + tokens},
+            }
+
+        async def event_stream():
+            for i in range(tokens):
+                await asyncio.sleep(latency / tokens)
+                delta = {"content": REPLY[i % len(REPLY)]}
+                if i == 0:
+                    delta["role"] = "assistant"
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            final = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    return app
+
+
+def start_in_thread(app, host: str = "127.0.0.1", port: int = 4000) -> uvicorn.Server:
+    """在后台线程中启动 uvicorn，返回可用于关闭的 server 对象"""
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地假 LLM 网关")
+    parser.add_argument("--port", type=int, default=4000)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--tokens", type=int, default=20)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency, args.tokens), host="127.0.0.1", port=args.port)
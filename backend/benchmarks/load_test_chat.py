@@ -0,0 +1,133 @@
+"""
+聊天流式接口并发压测
+
+启动本地假 LLM 网关（占用 LiteLLM 的 127.0.0.1:4000，运行前请先停止真实网关）和后端服务，
+同时发起 N 个不同 thread_id 的 /api/chat/message 请求，记录每个会话的首包和完成时间，
+并在压测期间持续探测 /health 的响应延迟，用于确认事件循环没有被图执行阻塞。
+
+运行方式（在 backend 目录下）::
+
+    python -m benchmarks.load_test_chat --conversations 8 --latency 1.0
+
+对比流式协议在多轮对话中的传输量::
+
+    python -m benchmarks.load_test_chat --conversations 2 --turns 20 --latency 0.05 --protocol delta
+
+测量逐token推送的首字延迟（TTFT）::
+
+    python -m benchmarks.load_test_chat --conversations 4 --latency 2.0 --stream-tokens
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.fake_llm import create_app, start_in_thread
+
+
+async def run_conversation(client: httpx.AsyncClient, base_url: str, index: int, t0: float, body_extra=None, turns: int = 1):
+    """在同一会话中连续发送 turns 条消息，并读取完整的SSE流"""
+    thread_id = f"load-test-{index}-{int(t0)}"
+    first_chunk = None
+    events = 0
+    turn_bytes = []
+    ttft = []
+    for turn in range(turns):
+        payload = {"message": f"第{index}号会话第{turn}轮：请续写下一段", "thread_id": thread_id, "mode": "writing"}
+        payload.update(body_extra or {})
+        received = 0
+        turn_start = time.perf_counter()
+        first_token = None
+        async with client.stream("POST", f"{base_url}/api/chat/message", json=payload) as response:
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                events += 1
+                received += len(line)
+                data = json.loads(base64.b64decode(line[6:]).decode("utf-8"))
+                if first_chunk is None and data.get("type") != "done":
+                    first_chunk = time.perf_counter() - t0
+                if first_token is None and data.get("type") == "token":
+                    first_token = time.perf_counter() - turn_start
+                if "error" in data:
+                    raise RuntimeError(data["error"])
+        turn_bytes.append(received)
+        if first_token is not None:
+            ttft.append(first_token)
+    return {"index": index, "first_chunk": first_chunk, "done": time.perf_counter() - t0,
+            "events": events, "turn_bytes": turn_bytes, "ttft": ttft}
+
+
+async def probe_health(client: httpx.AsyncClient, base_url: str, stop: asyncio.Event, samples: list):
+    """压测期间持续探测健康检查接口"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get(f"{base_url}/health")
+        samples.append(time.perf_counter() - start)
+        await asyncio.sleep(0.05)
+
+
+async def main_async(conversations: int, base_url: str, latency: float, body_extra=None, turns: int = 1):
+    async with httpx.AsyncClient(timeout=120) as client:
+        # 预热：构建并缓存图实例
+        await run_conversation(client, base_url, -1, time.perf_counter(), body_extra)
+
+        stop = asyncio.Event()
+        health_samples: list = []
+        probe = asyncio.create_task(probe_health(client, base_url, stop, health_samples))
+
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*[
+            run_conversation(client, base_url, i, t0, body_extra, turns) for i in range(conversations)
+        ])
+        wall = time.perf_counter() - t0
+        stop.set()
+        await probe
+
+    print(f"并发会话数: {conversations}，每会话轮数: {turns}，假 LLM 单次延迟: {latency:.2f}s")
+    for r in sorted(results, key=lambda r: r["index"]):
+        first = f"{r['first_chunk']:.2f}s" if r["first_chunk"] is not None else "-"
+        sizes = r["turn_bytes"]
+        ttft = f"，平均首字 {sum(r['ttft']) / len(r['ttft']):.2f}s" if r["ttft"] else ""
+        print(f"  会话 {r['index']:>2}: 首包 {first}，完成 {r['done']:.2f}s，事件数 {r['events']}，"
+              f"传输 {sum(sizes) / 1024:.1f} KB（首轮 {sizes[0]} B，末轮 {sizes[-1]} B）{ttft}")
+    print(f"总耗时: {wall:.2f}s（串行执行预计 >= {latency * conversations * turns:.2f}s）")
+    if health_samples:
+        print(f"/health 探测 {len(health_samples)} 次，最大延迟 {max(health_samples) * 1000:.1f}ms")
+    return results, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="聊天流式接口并发压测")
+    parser.add_argument("--conversations", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--turns", type=int, default=1)
+    parser.add_argument("--protocol", choices=["legacy", "delta"], default="legacy")
+    parser.add_argument("--stream-tokens", action="store_true", help="请求逐token推送并统计首字延迟")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    # 检查点数据库写到临时目录，避免污染真实会话
+    workdir = tempfile.mkdtemp(prefix="ai-novelist-load-")
+    os.chdir(workdir)
+
+    start_in_thread(create_app(latency=args.latency), port=4000)
+    from main import app
+    start_in_thread(app, port=args.port)
+
+    asyncio.run(main_async(args.conversations, f"http://127.0.0.1:{args.port}", args.latency,
+                           {"stream_protocol": args.protocol, "stream_tokens": args.stream_tokens}, args.turns))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,16 @@
-import json
 import os
 from pathlib import Path
 from typing import Optional, Dict, Any
 
+from services.config_store import config_store
+
 class Settings:
     """
     统一配置系统 - 所有配置都从 store.json 读取
     """
     
     def __init__(self):
-        self._config_file = Path("config/store.json")
+        self._config_file = config_store.config_file
         
         # 应用配置
         self.APP_NAME: str = "AI Novelist Backend"
@@ -37,19 +38,12 @@ class Settings:
         os.makedirs(self.LANCEDB_PERSIST_DIR, exist_ok=True)
     
     def _load_config(self) -> Dict[str, Any]:
-        """从 store.json 加载配置"""
-        if not self._config_file.exists():
-            return {}
-        
-        try:
-            with open(self._config_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, Exception):
-            return {}
+        """从 store.json 加载配置（共享快照，只读）"""
+        return config_store.snapshot()
     
     def _get_config(self, key: str, default: Any = None) -> Any:
         """获取配置值"""
-        # 每次获取配置时重新加载，确保获取最新配置
+        # 配置服务会在文件变化时自动重新加载，确保获取最新配置
         config = self._load_config()
         value = config.get(key, default)
         
@@ -65,7 +59,7 @@ class Settings:
     
     def reload(self):
         """重新加载配置（向后兼容）"""
-        pass  # 现在每次访问都会重新加载，这个方法保留用于向后兼容
+        pass  # 配置服务按文件修改时间自动失效，这个方法保留用于向后兼容
     
     # AI相关配置已移动到 ai_agent/config.py 中管理
 
@@ -12,17 +12,14 @@ from langchain_openai import OpenAIEmbeddings
 from langchain_community.embeddings import DashScopeEmbeddings
 from langchain_ollama import OllamaEmbeddings
 
+from services.config_store import config_store
+
 # 导入配置
 def load_config():
-    """从 store.json 加载配置"""
-    config_file = Path(__file__).parent.parent / "config" / "store.json"
-    if not config_file.exists():
-        return {}
-    
+    """从 store.json 加载配置（副本，可修改后保存）"""
     try:
-        with open(config_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, Exception):
+        return config_store.load()
+    except Exception:
         return {}
 
 # 从配置中获取嵌入模型相关设置
@@ -11,6 +11,7 @@ from fastapi import APIRouter, HTTPException, Query, UploadFile, File
 from pydantic import BaseModel
 
 from .emb_service import prepare_emb, load_config, list_available_tables, delete_table, update_table_metadata, prepare_doc, create_db
+from services.config_store import config_store
 
 # 创建路由器
 router = APIRouter(prefix="/api/embedding", tags=["embedding"])
@@ -100,24 +101,10 @@ async def save_embedding_dimensions_to_config(model_id: str, dimensions: int):
         dimensions: 维度值
     """
     try:
-        # 加载当前配置
-        config = load_config()
-        
-        # 确保config是一个字典
-        if not isinstance(config, dict):
-            config = {}
-        
         # embeddingDimensions应该是一个字典，只存储当前使用的模型的维度信息
         # 每次保存时先清空现有数据，只保留当前模型的维度
-        config["embeddingDimensions"] = {}
-            
-        # 保存模型维度
-        config["embeddingDimensions"][model_id] = dimensions
-        
-        # 保存到文件
-        config_file = Path(__file__).parent.parent / "config" / "store.json"
-        with open(config_file, 'w', encoding='utf-8') as f:
-            json.dump(config, f, ensure_ascii=False, indent=2)
+        # 串行化读取-修改-保存；配置文件无法解析时抛出异常，不会用只含维度的配置覆盖原文件
+        config_store.update(lambda config: config.__setitem__("embeddingDimensions", {model_id: dimensions}))
             
         print(f"已保存模型 {model_id} 的维度 {dimensions} 到配置文件")
         
@@ -4,12 +4,12 @@
 """
 
 import os
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, List, Optional, Dict, Any
 from datetime import datetime
 import logging
 
 from config import settings
-from ..models import FileItem
+from ..models import FileItem, SearchMatch
 from .file_service_operations import FileServiceOperations
 from .file_service_folders import FileServiceFolders
 from .file_service_search import FileServiceSearch
@@ -70,9 +70,13 @@ class FileService:
         await self.folders.copy_item(source_path, target_path)
 
     # 搜索和排序相关方法
-    async def search_files(self, query: str) -> List[FileItem]:
+    async def search_files(self, query: str, max_results: Optional[int] = None) -> List[FileItem]:
         """搜索文件"""
-        return await self.search.search_files(query)
+        return await self.search.search_files(query, max_results)
+
+    def stream_search_files(self, query: str, max_results: Optional[int] = None) -> AsyncIterator[SearchMatch]:
+        """逐条产出内容搜索结果"""
+        return self.search.stream_search(query, max_results)
 
     async def update_file_order(self, file_paths: List[str], directory_path: str = ""):
         """更新文件顺序（仅文件）"""
@@ -13,6 +13,7 @@ import logging
 from ..models import FileItem
 from ..utils.path_validator import PathValidator
 from ..managers.event_manager import file_event_manager
+from ..utils.async_fs import async_fs
 
 
 logger = logging.getLogger(__name__)
@@ -34,9 +35,9 @@ class FileServiceFolders:
             
             # 创建文件夹
             folder_path = os.path.join(target_dir, unique_name)
-            os.makedirs(folder_path, exist_ok=True)
+            await async_fs.makedirs(folder_path, exist_ok=True)
             
-            stat = os.stat(folder_path)
+            stat = await async_fs.stat(folder_path)
             # 返回相对于novel目录的相对路径作为id
             relative_id = os.path.relpath(folder_path, self.novel_dir)
             
@@ -72,7 +73,7 @@ class FileServiceFolders:
             parent_dir = os.path.dirname(old_path)
             new_path = os.path.join(parent_dir, new_name)
             
-            os.rename(old_path, new_path)
+            await async_fs.rename(old_path, new_path)
             logger.info(f"Renamed {old_path} to {new_path}")
             
             # 触发文件重命名事件
@@ -100,10 +101,10 @@ class FileServiceFolders:
                 raise ValueError(f"不安全的文件路径")
             
             # 如果目标是目录，将源移动到目标目录下
-            if os.path.isdir(target_path):
+            if await async_fs.isdir(target_path):
                 target_path = os.path.join(target_path, os.path.basename(source_path))
             
-            shutil.move(source_path, target_path)
+            await async_fs.move(source_path, target_path)
             logger.info(f"Moved {source_path} to {target_path}")
             
             # 触发文件移动事件
@@ -130,34 +131,8 @@ class FileServiceFolders:
             if not self.path_validator.is_safe_path(clean_source) or not self.path_validator.is_safe_path(clean_target):
                 raise ValueError(f"不安全的文件路径")
             
-            # 检查源路径是否存在
-            if not os.path.exists(source_path):
-                raise FileNotFoundError(f"源路径不存在: {source_path}")
-            
-            # 如果目标是目录，将源复制到目标目录下
-            if os.path.isdir(target_path):
-                source_name = os.path.basename(source_path)
-                target_dir = target_path
-                # 生成唯一的名称以避免冲突
-                unique_name = await self._generate_unique_name(target_dir, source_name, os.path.isdir(source_path))
-                target_path = os.path.join(target_dir, unique_name)
-            else:
-                # 如果目标是文件路径，确保父目录存在
-                target_dir = os.path.dirname(target_path)
-                os.makedirs(target_dir, exist_ok=True)
-                
-                # 如果目标已存在，生成唯一名称
-                if os.path.exists(target_path):
-                    target_dir = os.path.dirname(target_path)
-                    source_name = os.path.basename(source_path)
-                    unique_name = await self._generate_unique_name(target_dir, source_name, os.path.isdir(source_path))
-                    target_path = os.path.join(target_dir, unique_name)
-            
-            # 执行复制操作
-            if os.path.isdir(source_path):
-                shutil.copytree(source_path, target_path, dirs_exist_ok=True)
-            else:
-                shutil.copy2(source_path, target_path)
+            # 检查、选择目标名称和复制在文件系统线程池中一次完成
+            target_path = await async_fs.run("copy_item", self._copy_item_sync, source_path, target_path)
             
             logger.info(f"Copied {source_path} to {target_path}")
             
@@ -170,10 +145,45 @@ class FileServiceFolders:
             logger.error(f"Error copying item: {str(e)}")
             raise
 
+    def _copy_item_sync(self, source_path: str, target_path: str) -> str:
+        """复制文件或文件夹，返回实际的目标路径"""
+        # 检查源路径是否存在
+        if not os.path.exists(source_path):
+            raise FileNotFoundError(f"源路径不存在: {source_path}")
+        
+        source_is_dir = os.path.isdir(source_path)
+        
+        # 如果目标是目录，将源复制到目标目录下
+        if os.path.isdir(target_path):
+            source_name = os.path.basename(source_path)
+            target_dir = target_path
+            # 生成唯一的名称以避免冲突
+            unique_name = self._find_unique_name(target_dir, source_name, source_is_dir)
+            target_path = os.path.join(target_dir, unique_name)
+        else:
+            # 如果目标是文件路径，确保父目录存在
+            target_dir = os.path.dirname(target_path)
+            os.makedirs(target_dir, exist_ok=True)
+            
+            # 如果目标已存在，生成唯一名称
+            if os.path.exists(target_path):
+                source_name = os.path.basename(source_path)
+                unique_name = self._find_unique_name(target_dir, source_name, source_is_dir)
+                target_path = os.path.join(target_dir, unique_name)
+        
+        # 执行复制操作
+        if source_is_dir:
+            shutil.copytree(source_path, target_path, dirs_exist_ok=True)
+        else:
+            shutil.copy2(source_path, target_path)
+        return target_path
+
     async def _generate_unique_name(self, target_dir: str, original_name: str, is_folder: bool = False) -> str:
         """生成唯一的文件或文件夹名称"""
-        import os.path
-        
+        return await async_fs.run("unique_name", self._find_unique_name, target_dir, original_name, is_folder)
+
+    def _find_unique_name(self, target_dir: str, original_name: str, is_folder: bool = False) -> str:
+        """逐个检查候选名称是否已存在（在文件系统线程池中执行）"""
         # 分离文件名和扩展名
         if is_folder:
             base_name = original_name
@@ -14,6 +14,7 @@ from config import settings
 from ..models import FileItem
 from ..utils.path_validator import PathValidator
 from ..managers.event_manager import file_event_manager
+from ..utils.async_fs import async_fs
 from ..utils.content_previewer import ContentPreviewer
 
 
@@ -45,7 +46,7 @@ class FileServiceOperations:
             unique_name = await self._generate_unique_name(target_dir, name, False)
             
             # 确保目录存在
-            os.makedirs(target_dir, exist_ok=True)
+            await async_fs.makedirs(target_dir, exist_ok=True)
             
             # 写入文件内容
             file_path = os.path.join(target_dir, unique_name)
@@ -53,7 +54,7 @@ class FileServiceOperations:
                 await f.write(content)
             
             # 获取文件信息
-            stat = os.stat(file_path)
+            stat = await async_fs.stat(file_path)
             # 返回相对于novel目录的相对路径作为id
             relative_id = os.path.relpath(file_path, self.novel_dir)
             
@@ -110,7 +111,7 @@ class FileServiceOperations:
             
             # 读取旧内容用于事件
             old_content = ""
-            if os.path.exists(full_path):
+            if await async_fs.exists(full_path):
                 async with aiofiles.open(full_path, 'r', encoding='utf-8') as f:
                     old_content = await f.read()
             
@@ -137,12 +138,12 @@ class FileServiceOperations:
                 
             full_path = self.path_validator.get_full_path(clean_path)
             
-            if os.path.exists(full_path):
-                if os.path.isdir(full_path):
-                    shutil.rmtree(full_path)
+            if await async_fs.exists(full_path):
+                if await async_fs.isdir(full_path):
+                    await async_fs.run("rmtree", shutil.rmtree, full_path)
                     logger.info(f"Folder {full_path} deleted successfully")
                 else:
-                    os.remove(full_path)
+                    await async_fs.run("remove", os.remove, full_path)
                     logger.info(f"File {full_path} deleted successfully")
                     
                 # 触发文件删除事件
@@ -155,8 +156,10 @@ class FileServiceOperations:
 
     async def _generate_unique_name(self, target_dir: str, original_name: str, is_folder: bool = False) -> str:
         """生成唯一的文件或文件夹名称"""
-        import os.path
-        
+        return await async_fs.run("unique_name", self._find_unique_name, target_dir, original_name, is_folder)
+
+    def _find_unique_name(self, target_dir: str, original_name: str, is_folder: bool = False) -> str:
+        """逐个检查候选名称是否已存在（在文件系统线程池中执行）"""
         # 分离文件名和扩展名
         if is_folder:
             base_name = original_name
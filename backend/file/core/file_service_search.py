@@ -4,94 +4,120 @@
 """
 
 import os
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, List, Optional, Dict, Any
 import logging
 
-from ..models import FileItem
+from ..models import FileItem, SearchMatch
 from ..services.ripgrep_service import ripgrep_service
 from ..managers.sort_config_manager import sort_config_manager
+from ..managers.event_manager import file_event_manager
 from ..utils.file_tree_builder import file_tree_builder
+from ..utils.async_fs import async_fs
 
 
 logger = logging.getLogger(__name__)
 
+# 按文件分组的搜索只用前几条匹配生成预览，每个文件不必让 rg 找满 max_count_per_file 条
+PREVIEW_MATCHES_PER_FILE = 3
+
 
 class FileServiceSearch:
     def __init__(self, novel_dir: str):
         self.novel_dir = novel_dir
 
-    async def search_files(self, query: str) -> List[FileItem]:
-        """搜索文件 - 使用ripgrep进行内容搜索"""
+    async def search_files(self, query: str, max_results: Optional[int] = None) -> List[FileItem]:
+        """搜索文件 - 使用ripgrep进行内容搜索，每个命中文件一项
+
+        Args:
+            max_results: 最多返回的文件数，默认使用 ripgrep 服务的上限
+        """
         try:
-            # 使用ripgrep搜索文件内容
-            search_results = await ripgrep_service.regex_search_files(
-                self.novel_dir, self.novel_dir, query, "*"
-            )
-            
-            # 解析搜索结果
-            parsed_results = ripgrep_service.parse_search_results(search_results, self.novel_dir)
-            
-            # 转换为FileItem格式
             file_items = []
-            for result in parsed_results:
-                file_path = result["path"]
-                full_path = os.path.join(self.novel_dir, file_path)
-                
-                if os.path.exists(full_path):
-                    stat = os.stat(full_path)
-                    file_items.append(FileItem(
-                        id=file_path,
-                        name=result["name"],
-                        path=full_path,
-                        type="file",
-                        content=result["preview"],
-                        created_at=stat.st_ctime,
-                        updated_at=stat.st_mtime
-                    ))
-            
+            for group in await self._collect_matches(query, max_results):
+                first = group["matches"][0]
+                file_items.append(FileItem(
+                    id=first.path,
+                    name=first.name,
+                    path=os.path.join(self.novel_dir, first.path),
+                    type="file",
+                    content=group["preview"],
+                    created_at=first.ctime,
+                    updated_at=first.mtime
+                ))
             return file_items
         except Exception as e:
             logger.error(f"Error searching files: {str(e)}")
             # 如果ripgrep失败，回退到文件名搜索
             return await self._fallback_search(query)
 
+    def stream_search(self, query: str, max_results: Optional[int] = None) -> AsyncIterator[SearchMatch]:
+        """逐条产出内容搜索结果"""
+        return ripgrep_service.search(self.novel_dir, self.novel_dir, query, "*", max_results=max_results)
+
+    async def _collect_matches(self, query: str, max_files: Optional[int] = None) -> List[Dict[str, Any]]:
+        """按文件分组搜索结果，保持 rg 输出顺序；已被删除的文件（无法 stat）不计入
+
+        上限按文件数计算，每个文件只取前 PREVIEW_MATCHES_PER_FILE 条匹配用于预览
+        """
+        max_files = max_files or ripgrep_service.max_results
+        groups: Dict[str, Dict[str, Any]] = {}
+        async for match in ripgrep_service.search(
+            self.novel_dir, self.novel_dir, query, "*",
+            max_results=max_files * PREVIEW_MATCHES_PER_FILE,
+            max_count_per_file=PREVIEW_MATCHES_PER_FILE,
+            max_files=max_files,
+        ):
+            if match.mtime is None:
+                continue
+            group = groups.get(match.path)
+            if group is None:
+                group = groups[match.path] = {"name": match.name, "path": match.path, "preview": "", "matches": []}
+            group["matches"].append(match)
+            if len(group["preview"]) < 100:  # 限制预览长度
+                group["preview"] += match.text.strip() + ' '
+        return list(groups.values())
+
     async def _fallback_search(self, query: str) -> List[FileItem]:
         """回退搜索 - 仅搜索文件名"""
         try:
-            results = []
-            for root, dirs, files in os.walk(self.novel_dir):
-                # 搜索文件名
-                for item in dirs + files:
-                    if query.lower() in item.lower():
-                        item_path = os.path.join(root, item)
-                        stat = os.stat(item_path)
-                        
-                        item_type = "folder" if os.path.isdir(item_path) else "file"
-                        content = None
-                        if item_type == "file":
-                            try:
-                                import aiofiles
-                                async with aiofiles.open(item_path, 'r', encoding='utf-8') as f:
-                                    content = await f.read()
-                            except:
-                                content = None
-                        
-                        relative_id = os.path.relpath(item_path, self.novel_dir)
-                        results.append(FileItem(
-                            id=relative_id,
-                            name=item,
-                            path=item_path,
-                            type=item_type,
-                            content=content,
-                            created_at=stat.st_ctime,
-                            updated_at=stat.st_mtime
-                        ))
-            
-            return results
+            # 相同关键词的并发搜索只遍历一次目录
+            return await async_fs.run("fallback_search", self._fallback_search_sync, query, key=query.lower())
         except Exception as e:
             logger.error(f"Error in fallback search: {str(e)}")
             return []
 
+    def _fallback_search_sync(self, query: str) -> List[FileItem]:
+        """遍历 novel 目录按文件名搜索（在文件系统线程池中执行）"""
+        results = []
+        for root, dirs, files in os.walk(self.novel_dir):
+            # 搜索文件名
+            for item in dirs + files:
+                if query.lower() in item.lower():
+                    item_path = os.path.join(root, item)
+                    stat = os.stat(item_path)
+                    
+                    item_type = "folder" if item in dirs else "file"
+                    content = None
+                    if item_type == "file":
+                        try:
+                            with open(item_path, 'r', encoding='utf-8') as f:
+                                content = f.read()
+                        except:
+                            content = None
+                    
+                    relative_id = os.path.relpath(item_path, self.novel_dir)
+                    results.append(FileItem(
+                        id=relative_id,
+                        name=item,
+                        path=item_path,
+                        type=item_type,
+                        content=content,
+                        created_at=stat.st_ctime,
+                        updated_at=stat.st_mtime
+                    ))
+        
+        return results
+
     async def update_file_order(self, file_paths: List[str], directory_path: str = ""):
         """更新文件顺序（仅文件）"""
         try:
@@ -103,6 +129,7 @@ class FileServiceSearch:
             
             # 调用排序配置管理器来保存自定义文件排序
             await sort_config_manager.set_custom_file_order(directory_path, file_paths)
+            await file_event_manager.emit_sort_changed(directory_path)
             
             logger.info(f"文件排序顺序已保存到配置文件，目录: {directory_path}")
             
@@ -121,6 +148,7 @@ class FileServiceSearch:
             
             # 调用排序配置管理器来保存自定义文件夹排序
             await sort_config_manager.set_custom_folder_order(directory_path, folder_paths)
+            await file_event_manager.emit_sort_changed(directory_path)
             
             logger.info(f"文件夹排序顺序已保存到配置文件，目录: {directory_path}")
             
@@ -148,13 +176,10 @@ class FileServiceSearch:
         try:
             logger.info(f"搜索novel目录: {self.novel_dir}, 查询: {search_query}")
             
-            # 使用ripgrep搜索文件内容
-            search_results = await ripgrep_service.regex_search_files(
-                self.novel_dir, self.novel_dir, search_query, "*"
-            )
-            
-            # 解析搜索结果
-            results = ripgrep_service.parse_search_results(search_results, self.novel_dir)
+            results = [
+                {"name": group["name"], "path": group["path"], "preview": group["preview"]}
+                for group in await self._collect_matches(search_query)
+            ]
             return {"success": True, "results": results}
         except Exception as error:
             logger.error(f"搜索novel文件时发生异常: {error}")
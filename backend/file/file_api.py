@@ -4,14 +4,19 @@
 """
 
 import os
+import json
+import time
 import logging
 from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, HTTPException, UploadFile, File as FastAPIFile
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 
 from .core.file_service import FileService
+from .managers.file_tree_index import file_tree_index
+from .utils.async_fs import async_fs
 from .services.image_upload_service import image_upload_service
+from .services.ripgrep_service import ripgrep_service
 from .models import FileItem
 
 logger = logging.getLogger(__name__)
@@ -52,6 +57,8 @@ class CopyItemRequest(BaseModel):
 class SearchFilesRequest(BaseModel):
     """搜索文件请求模型"""
     query: str
+    max_results: Optional[int] = None  # 最多返回的匹配行数（stream 时）或文件数，默认使用 ripgrep 服务的上限
+    stream: bool = False  # 以 NDJSON 逐行返回每条匹配，最后一行为汇总
 
 class UpdateFileOrderRequest(BaseModel):
     """更新文件顺序请求模型"""
@@ -183,9 +190,36 @@ async def copy_item(request: CopyItemRequest):
 # 搜索和排序API端点
 @router.post("/search", summary="搜索文件")
 async def search_files(request: SearchFilesRequest):
-    """搜索文件"""
+    """搜索文件
+
+    - **stream**: 为 true 时每找到一条匹配就返回一行 SearchMatch JSON（包含行号、列号、匹配片段、上下文、
+      文件大小和修改时间），最后一行为 {"type": "summary", "count", "truncated", "elapsed_ms"}；
+      搜索出错时返回 {"type": "error", "message"} 行
+    """
+    if request.stream:
+        limit = request.max_results or ripgrep_service.max_results
+
+        async def generate():
+            started = time.perf_counter()
+            count = 0
+            try:
+                async for match in file_service.stream_search_files(request.query, limit):
+                    count += 1
+                    yield match.model_dump_json() + "\n"
+            except Exception as e:
+                logger.error(f"搜索文件失败: {str(e)}")
+                yield json.dumps({"type": "error", "message": str(e)}, ensure_ascii=False) + "\n"
+            yield json.dumps({
+                "type": "summary",
+                "count": count,
+                "truncated": count >= limit,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+            }) + "\n"
+
+        return StreamingResponse(generate(), media_type="application/x-ndjson")
+
     try:
-        files = await file_service.search_files(request.query)
+        files = await file_service.search_files(request.query, request.max_results)
         return {
             "success": True,
             "data": [file.dict() for file in files]
@@ -238,18 +272,66 @@ async def list_novel_files():
         raise HTTPException(status_code=500, detail=f"获取文件列表失败: {str(e)}")
 
 @router.get("/tree", summary="获取文件树")
-async def get_file_tree():
-    """获取文件树结构"""
+async def get_file_tree(version: Optional[int] = None):
+    """获取文件树结构
+
+    传入上次获取的版本号且文件树没有变化时，只返回 unchanged 标记，不再返回整棵树
+    """
     try:
-        chapters = await file_service.list_chapters()
+        current_version, chapters = await file_tree_index.get_tree_with_version()
+        if version is not None and version == current_version:
+            return {
+                "success": True,
+                "unchanged": True,
+                "version": current_version
+            }
         return {
             "success": True,
-            "data": chapters
+            "data": chapters,
+            "version": current_version
         }
     except Exception as e:
         logger.error(f"获取文件树失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取文件树失败: {str(e)}")
 
+@router.get("/tree/changes", summary="获取文件树增量")
+async def get_file_tree_changes(since: int):
+    """获取指定版本之后的文件树增量，版本太旧、增量已不在日志中时返回完整文件树"""
+    try:
+        await file_tree_index.ensure_loaded()
+        deltas = file_tree_index.changes_since(since)
+        if deltas is None:
+            version, tree = file_tree_index.snapshot_with_version()
+            return {
+                "success": True,
+                "resync": True,
+                "version": version,
+                "data": tree
+            }
+        return {
+            "success": True,
+            "version": deltas[-1]["version"] if deltas else since,
+            "deltas": deltas
+        }
+    except Exception as e:
+        logger.error(f"获取文件树增量失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取文件树增量失败: {str(e)}")
+
+@router.get("/fs-metrics", summary="获取文件系统操作指标")
+async def get_fs_metrics():
+    """获取文件系统线程池的调用次数、合并次数和耗时，以及文件树索引的状态"""
+    try:
+        return {
+            "success": True,
+            "data": {
+                "async_fs": async_fs.metrics(),
+                "file_tree": file_tree_index.stats()
+            }
+        }
+    except Exception as e:
+        logger.error(f"获取文件系统指标失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取文件系统指标失败: {str(e)}")
+
 # 图片上传API端点
 @router.post("/upload/image", summary="上传图片")
 async def upload_image(file: UploadFile = FastAPIFile(...)):
@@ -66,6 +66,12 @@ class FileEventManager:
             "target_path": target_path
         })
 
+    async def emit_sort_changed(self, directory_path: str):
+        """触发排序配置变更事件"""
+        await self.emit_event("sort_changed", {
+            "directory_path": directory_path
+        })
+
 
 # 创建全局事件管理器实例
 file_event_manager = FileEventManager()
\ No newline at end of file
@@ -0,0 +1,89 @@
+"""
+文件树增量推送
+把 file_tree_index 生成的增量通过 websocket_manager 推送给前端：
+
+- file-tree-delta：一条增量 {"version", "base_version", "ops"}
+- file-tree-resync：完整文件树 {"version", "tree"}，用于重新扫描后或客户端落后太多时
+
+客户端维护本地版本号：version 不大于本地版本的增量直接忽略；base_version 等于本地版本时应用；
+否则说明漏掉了版本，发送 {"type": "file_tree_sync", "version": 本地版本} 请求补发。
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from fastapi import WebSocket
+
+from services.websocket_manager import websocket_manager
+from .file_tree_index import FileTreeIndex, file_tree_index
+
+logger = logging.getLogger(__name__)
+
+DELTA_EVENT = "file-tree-delta"
+RESYNC_EVENT = "file-tree-resync"
+
+
+class FileTreeEventPublisher:
+    """在事件循环中按顺序推送文件树增量"""
+
+    def __init__(self, index: FileTreeIndex):
+        self.index = index
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """在运行中的事件循环里启动推送任务（增量可能来自监听线程，统一转到事件循环发送）"""
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._task = self._loop.create_task(self._run())
+        self.index.add_listener(self._on_delta)
+
+    def stop(self):
+        self.index.remove_listener(self._on_delta)
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _on_delta(self, delta: Dict[str, Any]):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._queue.put_nowait, delta)
+
+    async def _run(self):
+        while True:
+            delta = await self._queue.get()
+            if not websocket_manager.active_connections:
+                continue
+            try:
+                if delta.get("resync"):
+                    await websocket_manager.send_event(RESYNC_EVENT, self.resync_payload())
+                else:
+                    await websocket_manager.send_event(DELTA_EVENT, delta)
+            except Exception as e:
+                logger.error(f"推送文件树增量失败: {e}")
+
+    def resync_payload(self) -> Dict[str, Any]:
+        version, tree = self.index.snapshot_with_version()
+        return {"version": version, "tree": tree}
+
+    def sync_messages(self, version: Optional[int]) -> List[Dict[str, Any]]:
+        """客户端报告本地版本后需要补发的事件：接得上时补发缺少的增量，否则完整同步"""
+        deltas = self.index.changes_since(version) if isinstance(version, int) else None
+        if deltas is None:
+            return [{"type": RESYNC_EVENT, "payload": self.resync_payload()}]
+        return [{"type": DELTA_EVENT, "payload": delta} for delta in deltas]
+
+    async def sync_client(self, websocket: WebSocket, version: Optional[int]):
+        """处理客户端的 file_tree_sync 请求"""
+        await self.index.ensure_loaded()
+        for message in self.sync_messages(version):
+            await websocket_manager.send_personal_event(message["type"], message["payload"], websocket)
+
+
+# 创建全局文件树增量推送实例
+file_tree_events = FileTreeEventPublisher(file_tree_index)
@@ -0,0 +1,544 @@
+"""
+文件树索引
+在内存中维护 novel 目录的文件树，启动时扫描一次，之后根据文件系统监听（watchfiles，不可用时轮询）
+和 file_event_manager 的文件事件增量更新。
+
+- 读取文件树直接返回缓存的快照；只有发生变化的目录（及其上级目录）在下次读取时重新排序
+- 每次结构或排序变化时版本号加一，客户端和系统提示词构建器可以据此判断缓存是否仍然有效
+- 每次变化生成一条结构化增量（节点新增/删除/移动/重新排序），保存在有限长度的日志中并通知监听者，
+  客户端据此更新本地文件树，不必重新获取整棵树
+- 隐藏条目（以 . 或 $ 开头）不进入文件树，与原来的递归读取规则一致
+
+增量格式：{"version": 新版本, "base_version": 基于的版本, "ops": [...]}，ops 按顺序应用：
+- {"op": "remove", "id": 路径}
+- {"op": "add", "parent": 上级目录, "after": 前一个兄弟节点的ID（None 表示第一个）, "node": 节点（含子树）}
+- {"op": "move", "from": 原路径, "parent", "after", "node"}：先删除原节点，再按 add 插入（文件夹移动后子节点ID随之变化）
+- {"op": "reorder", "parent": 目录, "order": [子节点ID...]}：目录的最终顺序
+displayPrefix 按文件夹、文件分别编号，随位置变化，客户端应用增量后按位置重新计算。
+完整重新扫描时发出 {"version", "base_version", "resync": True}，客户端需要重新获取整棵树。
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .event_manager import file_event_manager
+from .sort_config_manager import sort_config_manager
+from ..utils.async_fs import async_fs
+
+logger = logging.getLogger(__name__)
+
+# 文件变化的合并窗口（毫秒），同一批修改只触发一次更新
+WATCH_DEBOUNCE_MS = 200
+
+# watchfiles 不可用或监听失败时的轮询间隔（秒）
+POLL_INTERVAL = 2.0
+
+# 保留的增量条数，落后更多版本的客户端需要完整同步
+DELTA_LOG_SIZE = 256
+
+
+def is_hidden(name: str) -> bool:
+    """隐藏的文件和文件夹不显示在文件树中"""
+    return name.startswith('.') or name.startswith('$')
+
+
+class FileTreeIndex:
+    """增量维护的文件树"""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root
+        self._real_root = os.path.realpath(root) if root else None
+        self._lock = threading.RLock()
+        self._children: Dict[str, Dict[str, bool]] = {}  # 目录相对路径 -> {名称: 是否为文件夹}
+        self._sorted: Dict[str, List[Dict[str, Any]]] = {}  # 目录相对路径 -> 排序后的子节点
+        self._dirty: Set[str] = set()
+        self._loaded = False
+        # 起始版本取当前时间（毫秒），服务重启后版本号仍然递增，客户端不会把重启前的版本当成当前版本
+        self._version = int(time.time() * 1000)
+        self._sort_revision = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.watch_mode: Optional[str] = None  # watchfiles / polling
+        self.last_error: Optional[str] = None
+        self._deltas: deque = deque(maxlen=DELTA_LOG_SIZE)
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._stats = {"full_scans": 0, "incremental_updates": 0, "snapshot_builds": 0, "deltas": 0}
+
+    # ---- 路径工具 ----
+
+    def _relative(self, path: str) -> Optional[str]:
+        """把绝对路径或相对路径转换为 novel 目录下以 / 分隔的相对路径，不在目录内时返回 None"""
+        if os.path.isabs(path):
+            # 监听回调给出的是解析过符号链接的路径
+            relative = os.path.relpath(os.path.realpath(path), self._real_root)
+        else:
+            relative = path
+        relative = relative.replace("\\", "/").strip("/")
+        if relative in ("", "."):
+            return ""
+        if relative.startswith("./"):
+            relative = relative[2:]
+        if relative == ".." or relative.startswith("../"):
+            return None
+        return relative
+
+    def _full_path(self, relative: str) -> str:
+        return os.path.join(self.root, relative) if relative else self.root
+
+    @staticmethod
+    def _split(relative: str):
+        parent, _, name = relative.rpartition("/")
+        return parent, name
+
+    def _mark_dirty(self, relative: str):
+        """标记目录及其所有上级目录需要重新排序"""
+        while True:
+            self._dirty.add(relative)
+            if not relative:
+                return
+            relative = self._split(relative)[0]
+
+    # ---- 扫描 ----
+
+    def _scan_disk(self, relative: str) -> Dict[str, Dict[str, bool]]:
+        """读取一个目录及其子目录，返回 {目录相对路径: {名称: 是否为文件夹}}，不修改模型（在锁外调用）"""
+        scanned: Dict[str, Dict[str, bool]] = {}
+        pending = [relative]
+        while pending:
+            current = pending.pop()
+            entries: Dict[str, bool] = {}
+            try:
+                with os.scandir(self._full_path(current)) as it:
+                    for entry in it:
+                        if is_hidden(entry.name):
+                            continue
+                        try:
+                            entries[entry.name] = entry.is_dir()
+                        except OSError:
+                            entries[entry.name] = False
+            except OSError as e:
+                logger.warning(f"读取目录失败 {self._full_path(current)}: {e}")
+            scanned[current] = entries
+            pending.extend(f"{current}/{name}" if current else name
+                           for name, is_folder in entries.items() if is_folder)
+        return scanned
+
+    def _scan(self, relative: str, scanned: Optional[Dict[str, Dict[str, bool]]] = None):
+        """把一个目录及其子目录写入模型，优先使用锁外预先读取的结果"""
+        if scanned is None or relative not in scanned:
+            scanned = self._scan_disk(relative)
+        prefix = relative + "/" if relative else ""
+        for key, entries in scanned.items():
+            if key == relative or key.startswith(prefix):
+                self._children[key] = entries
+                self._mark_dirty(key)
+
+    def load(self):
+        """完整扫描一次 novel 目录"""
+        if self.root is None:
+            from config import settings
+            self.root = settings.NOVEL_DIR
+        os.makedirs(self.root, exist_ok=True)
+        self._real_root = os.path.realpath(self.root)
+        # 读取磁盘不持有锁，读取期间快照仍可用
+        scanned = self._scan_disk("")
+        with self._lock:
+            base_version = self._version
+            self._children.clear()
+            self._sorted.clear()
+            self._dirty.clear()
+            self._scan("", scanned)
+            self._loaded = True
+            self._sort_revision = sort_config_manager.revision
+            self._build("")
+            self._version += 1
+            self._stats["full_scans"] += 1
+            # 之前的增量不再能接上新的模型
+            self._deltas.clear()
+            self._notify({"version": self._version, "base_version": base_version, "resync": True})
+
+    # ---- 增量更新 ----
+
+    def _remove(self, relative: str) -> bool:
+        parent, name = self._split(relative)
+        siblings = self._children.get(parent)
+        if siblings is None or name not in siblings:
+            return False
+        is_folder = siblings.pop(name)
+        if is_folder:
+            prefix = relative + "/"
+            for key in [k for k in self._children if k == relative or k.startswith(prefix)]:
+                self._children.pop(key, None)
+                self._sorted.pop(key, None)
+                self._dirty.discard(key)
+        self._mark_dirty(parent)
+        return True
+
+    def _add(self, relative: str, is_folder: bool, scanned: Optional[Dict[str, Dict[str, bool]]] = None):
+        parent, name = self._split(relative)
+        if parent not in self._children:
+            # 上级目录也是新建的（如一次创建多级目录），先补上
+            self._add(parent, True, scanned)
+        self._children[parent][name] = is_folder
+        self._mark_dirty(parent)
+        if is_folder and relative not in self._children:
+            self._scan(relative, scanned)
+
+    def _missing_root(self, relative: str, is_folder: bool) -> Optional[str]:
+        """加入该路径时需要扫描的最上层目录（自身或尚未在模型中的上级目录），不需要扫描时返回 None"""
+        with self._lock:
+            top = relative if is_folder and relative not in self._children else None
+            parent = self._split(relative)[0]
+            while parent not in self._children:
+                top = parent
+                parent = self._split(parent)[0]
+            return top
+
+    def _probe(self, relatives: Iterable[str]) -> Tuple[Dict[str, Optional[bool]], Dict[str, Dict[str, bool]]]:
+        """在锁外读取磁盘：每个路径的当前类型（True 文件夹 / False 文件 / None 不存在），
+        以及需要新加入模型的目录子树"""
+        kinds: Dict[str, Optional[bool]] = {}
+        scanned: Dict[str, Dict[str, bool]] = {}
+        for relative in sorted(relatives, key=len):
+            full_path = self._full_path(relative)
+            kind = True if os.path.isdir(full_path) else (False if os.path.exists(full_path) else None)
+            kinds[relative] = kind
+            if kind is None:
+                continue
+            top = self._missing_root(relative, kind)
+            if top is not None and top not in scanned:
+                scanned.update(self._scan_disk(top))
+        return kinds, scanned
+
+    def _refresh(self, relative: str, kind: Optional[bool], scanned: Dict[str, Dict[str, bool]]) -> bool:
+        """按磁盘上的当前状态更新一个路径（新增、删除、文件与文件夹互换），返回模型是否变化
+
+        Args:
+            kind: _probe 读取的路径类型
+            scanned: _probe 预先读取的目录子树
+        """
+        parent, name = self._split(relative)
+        known = self._children.get(parent, {}).get(name)
+        if kind is True:
+            if known is True:
+                return False
+            if known is False:
+                self._remove(relative)
+            self._add(relative, True, scanned)
+        elif kind is False:
+            if known is False:
+                return False
+            if known is True:
+                self._remove(relative)
+            self._add(relative, False, scanned)
+        elif known is None or not self._remove(relative):
+            return False
+        self._version += 1
+        self._stats["incremental_updates"] += 1
+        return True
+
+    def refresh_path(self, path: str) -> bool:
+        """更新一个路径，返回文件树是否变化"""
+        return self.apply_changes([path])
+
+    def apply_changes(self, paths: Iterable[str], moves: Optional[Dict[str, str]] = None) -> bool:
+        """批量更新一组变化的路径，整批生成一条增量
+
+        Args:
+            paths: 变化的路径（绝对路径或 novel 目录下的相对路径）
+            moves: 已知的移动/重命名 {原路径: 新路径}，用于生成 move 操作
+        """
+        if not self._loaded:
+            return False
+        relatives = set()
+        for path in paths:
+            relative = self._relative(path)
+            if relative and not any(is_hidden(part) for part in relative.split("/")):
+                relatives.add(relative)
+        if not relatives:
+            return False
+        known_moves = {}
+        for old, new in (moves or {}).items():
+            old_relative, new_relative = self._relative(old), self._relative(new)
+            if old_relative and new_relative:
+                known_moves[old_relative] = new_relative
+        # 磁盘读取（包括新目录的整棵子树）在锁外完成，持有锁期间只修改内存中的模型
+        kinds, scanned = self._probe(relatives)
+        with self._lock:
+            base_version = self._version
+            # 先处理上级路径，新建目录时整棵子树只写入一次
+            for relative in sorted(relatives, key=len):
+                self._refresh(relative, kinds[relative], scanned)
+            self._commit(base_version, known_moves)
+            return self._version != base_version
+
+    # ---- 增量 ----
+
+    def _commit(self, base_version: int, moves: Optional[Dict[str, str]] = None):
+        """版本号变化后比较变化目录重新排序前后的子节点，生成并发布增量"""
+        if self._version == base_version:
+            return
+        before = {relative: self._sorted[relative] for relative in self._dirty
+                  if relative in self._sorted and relative in self._children}
+        self._build("")
+        self._stats["snapshot_builds"] += 1
+        delta = {
+            "version": self._version,
+            "base_version": base_version,
+            "ops": self._diff(before, moves or {}),
+        }
+        self._deltas.append(delta)
+        self._stats["deltas"] += 1
+        self._notify(delta)
+
+    def _diff(self, before: Dict[str, List[Dict[str, Any]]], moves: Dict[str, str]) -> List[Dict[str, Any]]:
+        removed: Dict[str, Dict[str, Any]] = {}
+        added: Dict[str, Tuple[str, Optional[str], Dict[str, Any]]] = {}  # ID -> (上级目录, 前一个兄弟, 节点)
+        reorders = []
+        for parent in sorted(before, key=lambda relative: (relative.count("/"), relative)):
+            old_items = before[parent]
+            new_items = self._sorted[parent]
+            old_ids = [item["id"] for item in old_items]
+            new_ids = [item["id"] for item in new_items]
+            if old_ids == new_ids:
+                continue
+            old_set, new_set = set(old_ids), set(new_ids)
+            for item in old_items:
+                if item["id"] not in new_set:
+                    removed[item["id"]] = item
+            for index, item in enumerate(new_items):
+                if item["id"] not in old_set:
+                    added[item["id"]] = (parent, new_ids[index - 1] if index else None, item)
+            # 删除和插入之后保留节点的相对顺序仍然不对时，发送最终顺序
+            if [i for i in old_ids if i in new_set] != [i for i in new_ids if i in old_set]:
+                reorders.append({"op": "reorder", "parent": parent, "order": new_ids})
+
+        # 配对移动：调用方给出的移动，以及同名同类型、唯一对应的一删一增（监听到的跨目录移动）
+        pairs = {old: new for old, new in moves.items() if old in removed and new in added}
+        by_name: Dict[Tuple[str, bool], List[str]] = {}
+        for node_id in added:
+            if node_id not in pairs.values():
+                node = added[node_id][2]
+                by_name.setdefault((node["title"], node["isFolder"]), []).append(node_id)
+        for node_id, node in removed.items():
+            candidates = by_name.get((node["title"], node["isFolder"]), [])
+            if node_id not in pairs and len(candidates) == 1:
+                pairs[node_id] = candidates.pop()
+        moved_to = {new: old for old, new in pairs.items()}
+
+        ops: List[Dict[str, Any]] = [{"op": "remove", "id": node_id} for node_id in removed if node_id not in pairs]
+        for node_id, (parent, after, node) in added.items():
+            op = {"op": "add", "parent": parent, "after": after, "node": node}
+            if node_id in moved_to:
+                op = {"op": "move", "from": moved_to[node_id], "parent": parent, "after": after, "node": node}
+            ops.append(op)
+        ops.extend(reorders)
+        return ops
+
+    def changes_since(self, version: int) -> Optional[List[Dict[str, Any]]]:
+        """从某个版本到当前版本的增量，日志已经接不上时返回 None（需要完整同步）"""
+        with self._lock:
+            self._check_sort_revision()
+            if version == self._version:
+                return []
+            deltas = list(self._deltas)
+            for index, delta in enumerate(deltas):
+                if delta["base_version"] == version:
+                    return deltas[index:]
+            return None
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """注册增量监听者。监听者在持有锁的情况下、在发生变化的线程中被调用，不能阻塞"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, delta: Dict[str, Any]):
+        for listener in list(self._listeners):
+            try:
+                listener(delta)
+            except Exception as e:
+                logger.warning(f"文件树增量监听者出错: {e}")
+
+    # ---- 读取 ----
+
+    def _check_sort_revision(self):
+        revision = sort_config_manager.revision
+        if self._loaded and revision != self._sort_revision:
+            # 排序配置变化，所有目录重新排序
+            base_version = self._version
+            self._sort_revision = revision
+            self._dirty.update(self._children.keys())
+            self._version += 1
+            self._commit(base_version)
+
+    def _build(self, relative: str) -> List[Dict[str, Any]]:
+        from ..utils.file_tree_builder import sort_items
+
+        if relative not in self._dirty and relative in self._sorted:
+            return self._sorted[relative]
+        items = []
+        for name, is_folder in self._children.get(relative, {}).items():
+            child = f"{relative}/{name}" if relative else name
+            if is_folder:
+                items.append({"id": child, "title": name, "isFolder": True, "children": self._build(child)})
+            else:
+                items.append({"id": child, "title": name, "isFolder": False})
+        self._sorted[relative] = sort_items(items, relative)
+        self._dirty.discard(relative)
+        return self._sorted[relative]
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """当前文件树（共享的只读快照，调用方不要修改）"""
+        with self._lock:
+            if not self._loaded:
+                self.load()
+            self._check_sort_revision()
+            if "" in self._dirty or "" not in self._sorted:
+                self._build("")
+                self._stats["snapshot_builds"] += 1
+            return self._sorted[""]
+
+    def snapshot_with_version(self) -> Tuple[int, List[Dict[str, Any]]]:
+        """同时获取版本号和对应的文件树"""
+        with self._lock:
+            tree = self.snapshot()
+            return self._version, tree
+
+    @property
+    def version(self) -> int:
+        """文件树版本号，结构或排序变化时递增"""
+        with self._lock:
+            self._check_sort_revision()
+            return self._version
+
+    async def ensure_loaded(self):
+        """首次调用时在文件系统线程池中完成扫描并启动监听（并发的首次调用只扫描一次）"""
+        if not self._loaded:
+            await async_fs.run("file_tree_load", self.start, key=self.root)
+
+    async def get_tree(self) -> List[Dict[str, Any]]:
+        """获取文件树"""
+        await self.ensure_loaded()
+        return self.snapshot()
+
+    async def get_tree_with_version(self) -> Tuple[int, List[Dict[str, Any]]]:
+        """获取文件树和对应的版本号（在同一次加锁中读取，版本号与内容一致）"""
+        await self.ensure_loaded()
+        return self.snapshot_with_version()
+
+    # ---- 文件监听 ----
+
+    def start(self):
+        """加载文件树并启动后台监听（重复调用无副作用）"""
+        with self._lock:
+            if not self._loaded:
+                self.load()
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch_loop, name="file-tree-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _watch_loop(self):
+        try:
+            from watchfiles import watch
+        except ImportError:
+            logger.info("watchfiles 不可用，文件树改为轮询更新")
+            self._poll_loop()
+            return
+
+        self.watch_mode = "watchfiles"
+        try:
+            for changes in watch(self.root, watch_filter=None, debounce=WATCH_DEBOUNCE_MS,
+                                 stop_event=self._stop, raise_interrupt=False, ignore_permission_denied=True):
+                self.apply_changes(path for _, path in changes)
+        except Exception as e:
+            # 如 inotify 监听数量达到上限
+            logger.warning(f"文件监听失败，文件树改为轮询更新: {e}")
+            self.last_error = str(e)
+            self._poll_loop()
+
+    def _poll_loop(self):
+        self.watch_mode = "polling"
+        while not self._stop.wait(POLL_INTERVAL):
+            try:
+                self._poll_once()
+            except Exception as e:
+                logger.warning(f"轮询文件树失败: {e}")
+                self.last_error = str(e)
+
+    def _poll_once(self):
+        """在锁外重新扫描，只有结构变化时才替换模型"""
+        scanned = self._scan_disk("")
+        with self._lock:
+            if scanned == self._children:
+                return
+            base_version = self._version
+            changed = {key for key in set(scanned) | set(self._children)
+                       if scanned.get(key) != self._children.get(key)}
+            self._children = scanned
+            for key in changed:
+                if key in self._children:
+                    self._mark_dirty(key)
+                else:
+                    self._sorted.pop(key, None)
+                    self._dirty.discard(key)
+            self._version += 1
+            self._stats["incremental_updates"] += 1
+            self._commit(base_version)
+
+    # ---- 文件服务事件 ----
+
+    async def on_file_event(self, data: Dict[str, Any]):
+        """file_event_manager 事件处理：立即反映本服务自己的文件操作，不等待监听回调
+
+        检查磁盘和扫描新目录在文件系统线程池中执行，不阻塞事件循环
+        """
+        paths = [data.get(key) for key in ("file_path", "old_path", "new_path", "source_path", "target_path")]
+        moves = {}
+        for old_key, new_key in (("old_path", "new_path"), ("source_path", "target_path")):
+            if data.get(old_key) and data.get(new_key):
+                moves[data[old_key]] = data[new_key]
+        await async_fs.run("file_tree_apply", self.apply_changes, [path for path in paths if path], moves)
+
+    def _resort(self):
+        with self._lock:
+            self._check_sort_revision()
+
+    async def on_sort_changed(self, data: Dict[str, Any]):
+        """排序配置保存后立即发布重新排序的增量（所有目录重新排序，在文件系统线程池中执行）"""
+        await async_fs.run("file_tree_resort", self._resort)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "version": self._version,
+                "delta_log": len(self._deltas),
+                "listeners": len(self._listeners),
+                "directories": len(self._children),
+                "entries": sum(len(children) for children in self._children.values()),
+                "watch_mode": self.watch_mode,
+                "last_error": self.last_error,
+            }
+
+
+# 创建全局文件树索引实例
+file_tree_index = FileTreeIndex()
+
+for _event_type in ("file_created", "file_deleted", "file_renamed", "file_moved"):
+    file_event_manager.register_handler(_event_type, file_tree_index.on_file_event)
+file_event_manager.register_handler("sort_changed", file_tree_index.on_sort_changed)
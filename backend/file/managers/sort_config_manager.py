@@ -18,6 +18,7 @@ class SortConfigManager:
             "sortEnabled": True,  # 是否启用排序
             "customOrders": {}   # 自定义排序配置 { [directoryPath]: { files: [fileId1, fileId2, ...], folders: [folderId1, folderId2, ...] } }
         }
+        self.revision = 0  # 每次保存配置后递增，文件树据此判断是否需要重新排序
 
     async def initialize(self, novel_dir_path: str):
         """初始化配置管理器"""
@@ -42,6 +43,7 @@ class SortConfigManager:
 
     async def save_config(self):
         """保存配置"""
+        self.revision += 1
         try:
             with open(self.config_path, 'w', encoding='utf-8') as f:
                 json.dump(self.config, f, indent=2, ensure_ascii=False)
@@ -184,8 +186,6 @@ class SortConfigManager:
         if not items or not isinstance(items, list):
             return []
 
-        print(f'[SortConfigManager] 开始默认排序，项目数量: {len(items)}')
-
         # 分离文件夹和文件，分别排序
         folders = [item for item in items if item.get("isFolder", False)]
         files = [item for item in items if not item.get("isFolder", False)]
@@ -199,8 +199,6 @@ class SortConfigManager:
         # 合并结果（文件夹在前，文件在后）
         sorted_items = sorted_folders + sorted_files
 
-        print(f'[SortConfigManager] 排序后项目列表: {[{"title": item["title"], "isFolder": item.get("isFolder", False), "id": item["id"]} for item in sorted_items]}')
-        
         return sorted_items
 
     def normalize_path(self, file_path: str) -> str:
@@ -2,7 +2,7 @@
 文件相关数据模型
 """
 
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel
 
@@ -24,4 +24,32 @@ class FileItem(BaseModel):
             data['created_at'] = self.created_at.isoformat()
         if self.updated_at:
             data['updated_at'] = self.updated_at.isoformat()
-        return data
\ No newline at end of file
+        return data
+
+class SearchSpan(BaseModel):
+    """匹配行中的一个匹配片段（字符偏移，左闭右开）"""
+    start: int
+    end: int
+    text: str
+
+
+class SearchLine(BaseModel):
+    """匹配前后的上下文行"""
+    line: int
+    text: str
+
+
+class SearchMatch(BaseModel):
+    """一条内容搜索结果（一行匹配）"""
+    type: str = "match"
+    path: str  # 相对于搜索根目录，使用 / 分隔
+    name: str
+    line: int
+    column: int  # 第一个匹配片段的列号（从1开始，按字符计）
+    text: str
+    submatches: List[SearchSpan] = []
+    before: List[SearchLine] = []
+    after: List[SearchLine] = []
+    size: Optional[int] = None
+    mtime: Optional[float] = None
+    ctime: Optional[float] = None
@@ -6,6 +6,7 @@ import base64
 from fastapi import UploadFile, HTTPException
 import aiofiles
 from config import settings
+from ..utils.async_fs import async_fs
 
 class ImageUploadService:
     def __init__(self):
@@ -135,27 +136,32 @@ class ImageUploadService:
     async def list_uploaded_files(self) -> List[Dict[str, Any]]:
         """列出已上传的文件"""
         try:
-            files = []
-            for file_path in self.upload_dir.glob("*"):
-                if file_path.is_file() and self.is_allowed_file(file_path.name):
-                    stat = file_path.stat()
+            return await async_fs.run("list_uploads", self._list_uploaded_files_sync, key=str(self.upload_dir))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"获取文件列表失败: {str(e)}")
+
+    def _list_uploaded_files_sync(self) -> List[Dict[str, Any]]:
+        """遍历上传目录（在文件系统线程池中执行）"""
+        files = []
+        with os.scandir(self.upload_dir) as it:
+            for entry in it:
+                if entry.is_file() and self.is_allowed_file(entry.name):
+                    stat = entry.stat()
                     files.append({
-                        "filename": file_path.name,
-                        "url": f"http://{settings.HOST}:{settings.PORT}/uploads/{file_path.name}",
-                        "path": str(file_path),
+                        "filename": entry.name,
+                        "url": f"http://{settings.HOST}:{settings.PORT}/uploads/{entry.name}",
+                        "path": entry.path,
                         "size": stat.st_size,
                         "created_time": stat.st_ctime
                     })
-            return files
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"获取文件列表失败: {str(e)}")
+        return files
 
     async def delete_file(self, filename: str) -> Dict[str, Any]:
         """删除上传的文件"""
         try:
             file_path = self.upload_dir / filename
-            if file_path.exists() and file_path.is_file():
-                file_path.unlink()
+            if await async_fs.run("isfile", file_path.is_file):
+                await async_fs.run("remove", file_path.unlink)
                 return {"success": True, "message": "文件删除成功"}
             else:
                 raise HTTPException(status_code=404, detail="文件不存在")
@@ -1,19 +1,51 @@
 """
 Ripgrep搜索服务
 基于ripgrep的文件内容搜索功能
+
+search() 直接解析 rg --json 的输出流，逐条产出结构化结果（SearchMatch），不再先格式化成文本再解析；
+每个文件的匹配数和文件大小限制交给 rg（--max-count、--max-filesize），达到 max_results 后立即结束 rg 进程。
+regex_search_files() 保留原来的文本格式输出。
 """
 
+import base64
+import json
+import logging
 import subprocess
 import os
+import time
+from collections import deque
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 import asyncio
 
+from ..models import SearchLine, SearchMatch, SearchSpan
+from ..managers.event_manager import file_event_manager
+from ..utils.async_fs import async_fs
+
+logger = logging.getLogger(__name__)
+
+# rg --json 单行输出的最大长度（asyncio 默认 64KB，长段落的匹配行会超出）
+MAX_JSON_LINE = 16 * 1024 * 1024
+
+# 文件 stat 缓存的有效期（秒），本服务的文件操作会立即清空缓存
+STAT_CACHE_TTL = 5.0
+STAT_CACHE_SIZE = 4096
+
+
+def _text(value: Dict[str, Any]) -> str:
+    """rg --json 的文本字段：UTF-8 内容在 text 中，其他编码在 bytes 中（Base64）"""
+    if "text" in value:
+        return value["text"]
+    return base64.b64decode(value.get("bytes", "")).decode("utf-8", errors="replace")
+
 
 class RipgrepService:
     def __init__(self):
         self.max_results = 300
         self.max_line_length = 500
+        self.max_count_per_file = 50  # 每个文件最多返回的匹配行数
+        self.max_filesize = "10M"  # 跳过超过该大小的文件
+        self._stat_cache: Dict[str, Tuple[float, Optional[Tuple[int, float, float]]]] = {}
 
     def _truncate_line(self, line: str, max_length: int = None) -> str:
         """截断行内容"""
@@ -100,6 +132,168 @@ class RipgrepService:
 
         return self._format_results(results, cwd)
 
+    async def search(
+        self,
+        cwd: str,
+        directory_path: str,
+        regex: str,
+        file_pattern: str = "*",
+        max_results: Optional[int] = None,
+        max_count_per_file: Optional[int] = None,
+        max_files: Optional[int] = None,
+        context: int = 1,
+    ) -> AsyncIterator[SearchMatch]:
+        """搜索文件内容，逐条产出匹配行
+
+        Args:
+            cwd: 结果路径相对的根目录
+            directory_path: 搜索目录
+            regex: 正则表达式（ripgrep 语法）
+            file_pattern: 文件 glob
+            max_results: 最多返回的匹配行数，达到后结束 rg 进程
+            max_count_per_file: 每个文件最多返回的匹配行数
+            max_files: 最多返回多少个文件的匹配，达到后结束 rg 进程（不传则不限制）
+            context: 匹配前后附带的上下文行数
+
+        Raises:
+            Exception: rg 无法执行，或在产出任何结果之前出错（如正则语法错误）
+        """
+        max_results = self.max_results if max_results is None else max_results
+        max_count_per_file = self.max_count_per_file if max_count_per_file is None else max_count_per_file
+        args = [
+            "--json", "-e", regex,
+            "--glob", file_pattern,
+            "--context", str(context),
+            "--max-count", str(max_count_per_file),
+            "--max-filesize", self.max_filesize,
+            directory_path
+        ]
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "rg", *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                limit=MAX_JSON_LINE
+            )
+        except Exception as e:
+            raise Exception(f"执行ripgrep失败: {e}")
+
+        # 同时读取 stderr，避免大量错误输出填满管道导致 rg 阻塞
+        stderr_task = asyncio.create_task(process.stderr.read())
+        count = 0
+        file_count = 0
+        files = 0
+        eof = False
+        pending: Optional[SearchMatch] = None
+        before: deque = deque(maxlen=max(context, 0) or None)
+        try:
+            while count < max_results:
+                raw = await process.stdout.readline()
+                if not raw:
+                    eof = True
+                    break
+                try:
+                    event = json.loads(raw)
+                except ValueError as e:
+                    logger.warning(f"解析ripgrep输出失败: {e}")
+                    continue
+                kind = event.get("type")
+                data = event.get("data", {})
+                if kind in ("begin", "end"):
+                    if pending is not None:
+                        yield pending
+                        count += 1
+                        pending = None
+                    before.clear()
+                    file_count = 0
+                    if kind == "begin":
+                        if max_files is not None and files >= max_files:
+                            break
+                        files += 1
+                elif kind == "context" or (kind == "match" and file_count >= max_count_per_file):
+                    # 达到 --max-count 后 rg 仍会把后续上下文中的匹配行标记为 match，按上下文处理
+                    context_line = SearchLine(line=data["line_number"],
+                                              text=self._truncate_line(_text(data["lines"]).rstrip("\r\n")))
+                    if pending is not None and context_line.line - pending.line <= context:
+                        pending.after.append(context_line)
+                    before.append(context_line)
+                elif kind == "match":
+                    if pending is not None:
+                        yield pending
+                        count += 1
+                        if count >= max_results:
+                            break
+                    pending = await self._build_match(cwd, data, before, context)
+                    file_count += 1
+                    before.clear()
+            if pending is not None and count < max_results:
+                yield pending
+                count += 1
+        finally:
+            if not eof and process.returncode is None:
+                # 达到数量上限或调用方提前结束，不再等待 rg 搜索剩余文件
+                try:
+                    process.kill()
+                except ProcessLookupError:
+                    pass
+            await process.wait()
+            stderr = (await stderr_task).decode("utf-8", errors="replace").strip()
+
+        # 退出码 1 表示没有匹配，2 表示出错（可能已经有部分结果）
+        if process.returncode == 2 and eof:
+            if count == 0:
+                raise Exception(f"ripgrep process error: {stderr}")
+            logger.warning(f"ripgrep部分搜索失败: {stderr}")
+
+    async def _build_match(self, cwd: str, data: Dict[str, Any], before: deque, context: int) -> SearchMatch:
+        full_path = _text(data["path"])
+        line_number = data["line_number"]
+        raw_line = _text(data["lines"])
+        line_bytes = raw_line.encode("utf-8")
+        text = raw_line.rstrip("\r\n")
+
+        # rg 给出的是字节偏移，转换为字符偏移
+        submatches = []
+        for submatch in data.get("submatches", []):
+            start = len(line_bytes[:submatch["start"]].decode("utf-8", errors="ignore"))
+            end = len(line_bytes[:submatch["end"]].decode("utf-8", errors="ignore"))
+            submatches.append(SearchSpan(start=start, end=end, text=_text(submatch["match"])))
+
+        stat = await self._cached_stat(full_path)
+        relative_path = os.path.relpath(full_path, cwd).replace("\\", "/")
+        return SearchMatch(
+            path=relative_path,
+            name=os.path.basename(full_path),
+            line=line_number,
+            column=submatches[0].start + 1 if submatches else 1,
+            text=self._truncate_line(text),
+            submatches=submatches,
+            before=[item for item in before if line_number - item.line <= context],
+            size=stat[0] if stat else None,
+            mtime=stat[1] if stat else None,
+            ctime=stat[2] if stat else None
+        )
+
+    async def _cached_stat(self, path: str) -> Optional[Tuple[int, float, float]]:
+        """文件大小、修改时间和创建时间，同一文件在有效期内只 stat 一次"""
+        now = time.monotonic()
+        cached = self._stat_cache.get(path)
+        if cached is not None and now - cached[0] < STAT_CACHE_TTL:
+            return cached[1]
+        try:
+            stat = await async_fs.run("stat", os.stat, path)
+            value = (stat.st_size, stat.st_mtime, stat.st_ctime)
+        except OSError:
+            value = None
+        if len(self._stat_cache) >= STAT_CACHE_SIZE:
+            self._stat_cache.clear()
+        self._stat_cache[path] = (now, value)
+        return value
+
+    def clear_stat_cache(self, data: Optional[Dict[str, Any]] = None):
+        """文件变更后清空 stat 缓存（file_event_manager 事件处理）"""
+        self._stat_cache.clear()
+
     def _format_results(self, file_results: List[Dict], cwd: str) -> str:
         """格式化搜索结果"""
         output = ""
@@ -154,4 +348,7 @@ class RipgrepService:
 
 
 # 创建单例实例
-ripgrep_service = RipgrepService()
\ No newline at end of file
+ripgrep_service = RipgrepService()
+
+for _event_type in ("file_created", "file_updated", "file_deleted", "file_renamed", "file_moved"):
+    file_event_manager.register_handler(_event_type, ripgrep_service.clear_stat_cache)
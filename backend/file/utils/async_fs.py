@@ -0,0 +1,186 @@
+"""
+异步文件系统操作
+目录遍历、stat、移动/复制/删除等同步文件系统调用统一在有界线程池中执行，不阻塞事件循环
+（聊天流式输出与文件接口共用同一个事件循环，一次慢扫描不应让 SSE 停顿）。
+
+- 线程池大小固定，大量并发请求排队而不是各占一个线程
+- 只读操作可以指定 key：相同 key 的并发请求只执行一次，共享结果（single-flight）
+- 按操作名记录调用次数、合并次数、排队和执行耗时
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 文件系统线程池大小
+DEFAULT_FS_WORKERS = 4
+
+# 每个操作保留的耗时样本数
+_LATENCY_SAMPLES = 512
+
+
+def _percentile(samples: List[float], ratio: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+class _OpStats:
+    """单个操作的统计"""
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.queue_wait: deque = deque(maxlen=_LATENCY_SAMPLES)
+        self.run_time: deque = deque(maxlen=_LATENCY_SAMPLES)
+
+
+class AsyncFS:
+    """在有界线程池中执行文件系统操作"""
+
+    def __init__(self, max_workers: int = DEFAULT_FS_WORKERS):
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._inflight: Dict[Tuple[int, str, Hashable], asyncio.Future] = {}
+        self._stats: Dict[str, _OpStats] = {}
+        self._stats_lock = threading.Lock()
+        self._running = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="async-fs")
+            return self._executor
+
+    def _op_stats(self, name: str) -> _OpStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats.setdefault(name, _OpStats())
+        return stats
+
+    def _timed(self, name: str, submitted: float, func: Callable, args, kwargs):
+        started = time.perf_counter()
+        with self._stats_lock:
+            self._running += 1
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            with self._stats_lock:
+                self._op_stats(name).errors += 1
+            raise
+        finally:
+            finished = time.perf_counter()
+            with self._stats_lock:
+                self._running -= 1
+                stats = self._op_stats(name)
+                stats.queue_wait.append(started - submitted)
+                stats.run_time.append(finished - started)
+
+    async def run(self, name: str, func: Callable, *args, key: Hashable = None, **kwargs) -> Any:
+        """在线程池中执行同步函数
+
+        Args:
+            name: 操作名，用于统计
+            func: 同步函数
+            key: 不为 None 时，相同 name 和 key 的并发调用共享同一次执行（只用于只读操作）
+        """
+        loop = asyncio.get_running_loop()
+        with self._stats_lock:
+            self._op_stats(name).calls += 1
+
+        if key is None:
+            return await loop.run_in_executor(
+                self._get_executor(), self._timed, name, time.perf_counter(), func, args, kwargs)
+
+        inflight_key = (id(loop), name, key)
+        future = self._inflight.get(inflight_key)
+        if future is not None:
+            with self._stats_lock:
+                self._op_stats(name).coalesced += 1
+            # 一个等待者被取消不影响其他等待者
+            return await asyncio.shield(future)
+
+        future = loop.run_in_executor(
+            self._get_executor(), self._timed, name, time.perf_counter(), func, args, kwargs)
+        self._inflight[inflight_key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(inflight_key, None))
+        return await asyncio.shield(future)
+
+    # ---- 常用操作 ----
+
+    async def exists(self, path: str) -> bool:
+        return await self.run("exists", os.path.exists, path)
+
+    async def isdir(self, path: str) -> bool:
+        return await self.run("isdir", os.path.isdir, path)
+
+    async def stat(self, path: str) -> os.stat_result:
+        return await self.run("stat", os.stat, path)
+
+    async def makedirs(self, path: str, exist_ok: bool = True):
+        await self.run("makedirs", os.makedirs, path, exist_ok=exist_ok)
+
+    async def rename(self, src: str, dst: str):
+        await self.run("rename", os.rename, src, dst)
+
+    async def move(self, src: str, dst: str):
+        await self.run("move", shutil.move, src, dst)
+
+    async def copy(self, src: str, dst: str):
+        """复制文件或整个目录"""
+        if await self.isdir(src):
+            await self.run("copytree", shutil.copytree, src, dst, dirs_exist_ok=True)
+        else:
+            await self.run("copy", shutil.copy2, src, dst)
+
+    async def remove(self, path: str):
+        """删除文件或整个目录"""
+        if await self.isdir(path):
+            await self.run("rmtree", shutil.rmtree, path)
+        else:
+            await self.run("remove", os.remove, path)
+
+    # ---- 统计 ----
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            operations = {}
+            for name, stats in self._stats.items():
+                run_time = list(stats.run_time)
+                queue_wait = list(stats.queue_wait)
+                operations[name] = {
+                    "calls": stats.calls,
+                    "coalesced": stats.coalesced,
+                    "errors": stats.errors,
+                    "run_ms_avg": round(sum(run_time) / len(run_time) * 1000, 3) if run_time else 0.0,
+                    "run_ms_p95": round(_percentile(run_time, 0.95) * 1000, 3),
+                    "run_ms_max": round(max(run_time) * 1000, 3) if run_time else 0.0,
+                    "queue_ms_p95": round(_percentile(queue_wait, 0.95) * 1000, 3),
+                }
+            return {
+                "max_workers": self.max_workers,
+                "running": self._running,
+                "inflight": len(self._inflight),
+                "operations": operations,
+            }
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# 创建全局文件系统操作实例
+async_fs = AsyncFS()
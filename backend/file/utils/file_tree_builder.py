@@ -5,12 +5,17 @@
 
 import os
 import asyncio
+import logging
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
 from ..managers.sort_config_manager import sort_config_manager
+from .async_fs import async_fs
+from .sampled_logger import SampledLogger
 
+logger = logging.getLogger(__name__)
+sampled_logger = SampledLogger(logger)
 
 # 检查排序配置管理器是否已初始化
 is_sort_config_initialized = False
@@ -48,95 +53,108 @@ def add_display_prefixes(items: List[Dict]) -> List[Dict]:
 def sort_items(items: List[Dict], directory_path: str = "") -> List[Dict]:
     """对项目列表进行排序（支持自定义排序）"""
     if not items or not isinstance(items, list):
-        print(f"[file-tree-builder] sortItems: 传入空数组或无效数据，返回空数组")
         return []
 
-    print(f"[file-tree-builder] sortItems: 开始排序目录 {directory_path}，项目数量: {len(items)}")
-    print(f"[file-tree-builder] sortItems: 原始项目: {[{'title': item['title'], 'isFolder': item.get('isFolder', False)} for item in items]}")
-
     # 首先应用自定义排序
     custom_sorted = sort_config_manager.apply_custom_order(items, directory_path)
-    
-    print(f"[file-tree-builder] sortItems: 自定义排序结果 === 原始项目: {custom_sorted is items}")
-    print(f"[file-tree-builder] sortItems: 排序是否启用: {sort_config_manager.is_sort_enabled()}")
-    
+
     # 如果没有自定义排序或排序被禁用，使用默认排序
     if custom_sorted is items or not sort_config_manager.is_sort_enabled():
-        print(f"[file-tree-builder] sortItems: 使用默认排序")
+        sampled_logger.debug("sort_items", "目录 %s 使用默认排序，项目数量: %d", directory_path, len(items))
         default_sorted = sort_config_manager.sort_items_default(custom_sorted)  # 使用 customSorted 而不是 items
-        result = add_display_prefixes(default_sorted)
-        print(f"[file-tree-builder] sortItems: 默认排序完成，结果数量: {len(result)}")
-        return result
-    
+        return add_display_prefixes(default_sorted)
+
     # 为自定义排序后的项目添加显示前缀
-    print(f"[file-tree-builder] sortItems: 使用自定义排序")
-    result = add_display_prefixes(custom_sorted)
-    print(f"[file-tree-builder] sortItems: 自定义排序完成，结果数量: {len(result)}")
-    return result
+    sampled_logger.debug("sort_items", "目录 %s 使用自定义排序，项目数量: %d", directory_path, len(items))
+    return add_display_prefixes(custom_sorted)
 
 
-async def read_directory_recursive(dir_path: str, base_dir_path: str) -> List[Dict]:
-    """递归读取目录结构"""
-    print(f"[file-tree-builder] readDirectoryRecursive: 正在读取目录: {dir_path}")
-    
-    try:
-        entries = os.listdir(dir_path)
-    except Exception as e:
-        print(f"[file-tree-builder] 读取目录失败 {dir_path}: {e}")
-        return []
+def walk_directory_tree(dir_path: str, base_dir_path: str) -> List[Dict]:
+    """单次遍历读取目录结构
 
-    print(f"[file-tree-builder] readDirectoryRecursive: 目录 {dir_path} 读取到的条目: {entries}")
-    result = []
+    使用 os.scandir 返回的条目类型判断文件夹，不再对每个条目单独 stat；每个目录只排序一次。
+    """
+    if os.path.realpath(dir_path) == os.path.realpath(base_dir_path):
+        relative_dir = ""
+    else:
+        relative_dir = os.path.relpath(dir_path, base_dir_path).replace("\\", "/")
+    return _walk_directory(dir_path, relative_dir)
 
-    for entry_name in entries:
-        # 忽略隐藏文件和文件夹
-        if entry_name.startswith('.') or entry_name.startswith('$'):
-            print(f"[file-tree-builder] readDirectoryRecursive: 忽略条目: {entry_name}")
-            continue
 
-        full_path = os.path.join(dir_path, entry_name)
-        relative_path = os.path.relpath(full_path, base_dir_path)
+def _walk_directory(dir_path: str, relative_dir: str) -> List[Dict]:
+    try:
+        with os.scandir(dir_path) as it:
+            entries = []
+            for entry in it:
+                # 忽略隐藏文件和文件夹
+                if entry.name.startswith('.') or entry.name.startswith('$'):
+                    continue
+                try:
+                    is_folder = entry.is_dir()
+                except OSError:
+                    is_folder = False
+                entries.append((entry.name, entry.path, is_folder))
+    except OSError as e:
+        logger.warning(f"读取目录失败 {dir_path}: {e}")
+        return []
 
-        if os.path.isdir(full_path):
-            children = await read_directory_recursive(full_path, base_dir_path)
+    result = []
+    for name, path, is_folder in entries:
+        relative_path = f"{relative_dir}/{name}" if relative_dir else name  # 统一使用 / 分隔
+        if is_folder:
             result.append({
-                "id": relative_path.replace("\\", "/"),  # 统一路径分隔符
-                "title": entry_name,
+                "id": relative_path,
+                "title": name,
                 "isFolder": True,
-                "children": sort_items(children, relative_path)  # 对子项进行排序
+                "children": _walk_directory(path, relative_path)  # 子目录在递归中已排序
             })
         else:
             result.append({
-                "id": relative_path.replace("\\", "/"),  # 统一路径分隔符
-                "title": entry_name,
+                "id": relative_path,
+                "title": name,
                 "isFolder": False
             })
 
-    # 对当前层级的项目进行排序
-    current_dir_path = "" if dir_path == base_dir_path else os.path.relpath(dir_path, base_dir_path).replace("\\", "/")
-    print(f"[file-tree-builder] readDirectoryRecursive: 准备排序目录 {current_dir_path}，项目数量: {len(result)}")
-    sorted_result = sort_items(result, current_dir_path)
-    print(f"[file-tree-builder] readDirectoryRecursive: 排序完成，返回项目数量: {len(sorted_result)}")
-    return sorted_result
+    sampled_logger.debug("walk_directory", "读取目录 %s，项目数量: %d", relative_dir, len(result))
+    return sort_items(result, relative_dir)
+
+
+async def read_directory_recursive(dir_path: str, base_dir_path: str) -> List[Dict]:
+    """递归读取目录结构"""
+    return walk_directory_tree(dir_path, base_dir_path)
+
+
+async def ensure_sort_config(absolute_path_to_dir: str):
+    """确保排序配置管理器已初始化"""
+    global is_sort_config_initialized
+    if not is_sort_config_initialized:
+        print(f"[file-tree-builder] getFileTree: 初始化排序配置管理器")
+        await sort_config_manager.initialize(absolute_path_to_dir)
+        is_sort_config_initialized = True
 
 
 async def get_file_tree(absolute_path_to_dir: str) -> Dict[str, Any]:
-    """获取指定目录的文件树"""
+    """获取指定目录的文件树
+
+    novel 目录使用增量维护的文件树索引（O(1) 返回快照，附带版本号），其他目录递归读取
+    """
     try:
-        print(f"[file-tree-builder] getFileTree: 开始构建文件树，路径: {absolute_path_to_dir}")
-        
-        global is_sort_config_initialized
+        from ..managers.file_tree_index import file_tree_index
+
         # 确保排序配置管理器已初始化
-        if not is_sort_config_initialized:
-            print(f"[file-tree-builder] getFileTree: 初始化排序配置管理器")
-            await sort_config_manager.initialize(absolute_path_to_dir)
-            is_sort_config_initialized = True
-        
+        await ensure_sort_config(absolute_path_to_dir)
+
+        index_root = file_tree_index.root
+        if index_root is None or os.path.realpath(index_root) == os.path.realpath(absolute_path_to_dir):
+            file_tree_index.root = absolute_path_to_dir
+            version, tree = await file_tree_index.get_tree_with_version()
+            return {"success": True, "tree": tree, "version": version}
+
         # 确保目录存在
-        os.makedirs(absolute_path_to_dir, exist_ok=True)
+        await async_fs.makedirs(absolute_path_to_dir, exist_ok=True)
         
-        tree = await read_directory_recursive(absolute_path_to_dir, absolute_path_to_dir)
-        print(f"[file-tree-builder] getFileTree: 文件树构建完成，根节点数量: {len(tree)}")
+        tree = await async_fs.run("walk_tree", walk_directory_tree, absolute_path_to_dir, absolute_path_to_dir,
+                                  key=os.path.realpath(absolute_path_to_dir))
         return {"success": True, "tree": tree}
     except Exception as error:
         print(f"[file-tree-builder] 获取文件树失败: {error}")
@@ -0,0 +1,30 @@
+"""
+采样调试日志
+文件树构建这类热路径每个目录都会产生调试信息，大项目逐条输出会产生大量日志并拖慢构建。
+SampledLogger 按调用点计数，只输出前 first 条和之后每 every 条中的一条；DEBUG 未启用时直接返回，不格式化消息。
+"""
+
+import logging
+from typing import Dict
+
+
+class SampledLogger:
+    """按调用点采样的调试日志"""
+
+    def __init__(self, logger: logging.Logger, every: int = 100, first: int = 10):
+        self.logger = logger
+        self.every = max(1, every)
+        self.first = first
+        self._counts: Dict[str, int] = {}
+
+    def debug(self, key: str, msg: str, *args):
+        """输出一条采样调试日志，msg 使用 % 格式化参数（只在真正输出时格式化）"""
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        count = self._counts.get(key, 0) + 1
+        self._counts[key] = count
+        if count <= self.first or count % self.every == 0:
+            self.logger.debug("[%s #%d] " + msg, key, count, *args)
+
+    def reset(self):
+        self._counts.clear()
@@ -127,11 +127,38 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def start_background_tasks():
+    """启动后台维护任务"""
+    from ai_agent.core.checkpoint_retention import checkpoint_retention
+    checkpoint_retention.start()
+    
+    # 扫描 novel 目录并启动文件树监听
+    from file.managers.file_tree_index import file_tree_index
+    from file.utils.async_fs import async_fs
+    await async_fs.run("file_tree_load", file_tree_index.start, key=file_tree_index.root)
+    
+    # 通过 WebSocket 推送文件树增量
+    from file.managers.file_tree_events import file_tree_events
+    file_tree_events.start()
+
 # 优雅关闭处理
 def cleanup_resources():
     """清理资源，确保数据库连接正确关闭"""
     logger.info("正在清理资源...")
     try:
+        # 停止后台维护任务
+        from ai_agent.core.checkpoint_retention import checkpoint_retention
+        checkpoint_retention.stop()
+        
+        from file.managers.file_tree_index import file_tree_index
+        from file.managers.file_tree_events import file_tree_events
+        file_tree_events.stop()
+        file_tree_index.stop()
+        
+        from file.utils.async_fs import async_fs
+        async_fs.shutdown()
+        
         # 关闭数据库连接
         from ai_agent.history_api import close_db_connection
         close_db_connection()
@@ -0,0 +1,147 @@
+"""
+store.json 配置服务
+所有模块共享同一份解析后的配置快照，文件修改时间变化或自身写入后才重新解析
+"""
+
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigStore:
+    """
+    store.json 的进程内缓存
+
+    - 读取：每次访问只做一次 stat，文件未变化时直接返回内存快照
+    - 写入：临时文件 + rename 原子替换，并通过锁串行化
+    """
+
+    def __init__(self, config_file: Path):
+        self._config_file = Path(config_file)
+        self._lock = threading.RLock()
+        self._snapshot: Dict[str, Any] = {}
+        self._stat_key: Optional[Tuple[int, int, int]] = None
+        self._load_error: Optional[str] = None
+        self.reload_count = 0
+
+    @property
+    def config_file(self) -> Path:
+        return self._config_file
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        """获取配置文件的 (mtime_ns, size, inode)，文件不存在时返回 None"""
+        try:
+            st = os.stat(self._config_file)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """获取当前配置快照（只读，调用方不得修改）"""
+        stat_key = self._stat()
+        if stat_key == self._stat_key:
+            return self._snapshot
+
+        with self._lock:
+            # 双重检查，避免并发时重复解析
+            stat_key = self._stat()
+            if stat_key == self._stat_key:
+                return self._snapshot
+
+            self._load_error = None
+            if stat_key is None:
+                config = {}
+            else:
+                try:
+                    with open(self._config_file, 'r', encoding='utf-8') as f:
+                        config = json.load(f)
+                    if not isinstance(config, dict):
+                        raise ValueError("配置文件顶层必须是JSON对象")
+                except (json.JSONDecodeError, Exception) as e:
+                    logger.error(f"加载配置文件失败: {e}")
+                    self._load_error = str(e)
+                    config = {}
+
+            self._snapshot = config
+            self._stat_key = stat_key
+            self.reload_count += 1
+            return self._snapshot
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """获取配置值（只读）"""
+        return self.snapshot().get(key, default)
+
+    def load(self) -> Dict[str, Any]:
+        """获取配置的深拷贝，用于修改后再保存
+
+        配置文件损坏时抛出异常，避免用空配置覆盖原文件
+        """
+        config = self.snapshot()
+        if self._load_error:
+            raise ValueError(f"配置文件解析失败: {self._load_error}")
+        return copy.deepcopy(config)
+
+    def save(self, config: Dict[str, Any]):
+        """原子写入配置文件并刷新快照"""
+        with self._lock:
+            self._config_file.parent.mkdir(parents=True, exist_ok=True)
+            data = json.dumps(config, ensure_ascii=False, indent=2)
+
+            fd, tmp_path = tempfile.mkstemp(
+                prefix=".store-", suffix=".json.tmp", dir=str(self._config_file.parent)
+            )
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self._config_file)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            # 使用写入的内容作为新快照，避免与调用方持有的字典共享引用
+            self._snapshot = json.loads(data)
+            self._stat_key = self._stat()
+            self._load_error = None
+
+    def set(self, key: str, value: Any):
+        """设置单个配置值"""
+        self.update(lambda config: config.__setitem__(key, value))
+
+    @contextmanager
+    def transaction(self):
+        """串行化的读取-修改-写入事务，退出时原子保存
+
+        用法::
+
+            with config_store.transaction() as config:
+                config["key"] = value
+        """
+        with self._lock:
+            config = self.load()
+            yield config
+            self.save(config)
+
+    def update(self, mutator: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        """串行化地读取-修改-写入配置
+
+        Args:
+            mutator: 接收配置字典并原地修改的函数
+        """
+        with self.transaction() as config:
+            mutator(config)
+        return config
+
+
+# 创建全局配置服务实例
+config_store = ConfigStore(Path(__file__).parent.parent / "config" / "store.json")
@@ -0,0 +1,31 @@
+"""
+JSON 编码
+安装了 orjson 时使用 orjson 编码（直接输出 UTF-8，速度约为标准库的数倍），否则回退到标准库 json。
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+
+def _default(obj: Any) -> Any:
+    # 与 json.dumps(default=str) 的行为一致：无法编码的对象使用字符串表示
+    return str(obj)
+
+
+def dumps_bytes(data: Any) -> bytes:
+    """编码为 UTF-8 JSON 字节串（紧凑格式，非 ASCII 字符不转义）"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def dumps(data: Any) -> str:
+    """编码为 JSON 字符串（紧凑格式，非 ASCII 字符不转义）"""
+    return dumps_bytes(data).decode("utf-8")
@@ -2,11 +2,12 @@
 WebSocket 管理器
 负责管理所有WebSocket连接和事件推送
 """
-import json
 import logging
 from typing import Dict, Set, Any
 from fastapi import WebSocket
 
+from services.json_codec import dumps
+
 logger = logging.getLogger(__name__)
 
 class WebSocketManager:
@@ -35,7 +36,7 @@ class WebSocketManager:
     async def send_personal_message(self, message: dict, websocket: WebSocket):
         """向特定WebSocket连接发送消息"""
         try:
-            await websocket.send_text(json.dumps(message))
+            await websocket.send_text(dumps(message))
         except Exception as e:
             logger.error(f"发送个人消息失败: {e}")
             self.disconnect(websocket)
@@ -45,7 +46,7 @@ class WebSocketManager:
         disconnected = []
         for connection in self.active_connections:
             try:
-                await connection.send_text(json.dumps(message))
+                await connection.send_text(dumps(message))
             except Exception as e:
                 logger.error(f"广播消息失败: {e}")
                 disconnected.append(connection)
@@ -63,6 +64,15 @@ class WebSocketManager:
         }
         await self.broadcast(event_message)
 
+    async def send_personal_event(self, event_type: str, payload: dict, websocket: WebSocket):
+        """向特定WebSocket连接发送事件（格式与 send_event 相同）"""
+        event_message = {
+            "type": event_type,
+            "payload": payload,
+            "timestamp": None
+        }
+        await self.send_personal_message(event_message, websocket)
+
     async def send_ai_response(self, response_type: str, payload: dict):
         """发送AI响应事件（兼容ai-response通道）"""
         import time